@@ -1,16 +1,41 @@
 from pydantic_settings import BaseSettings
 from typing import Optional
+import os
+
+# Directorio de datos empaquetados con la app (app/data)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
 
 
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str
+    DB_POOL_SIZE: int = 10  # Conexiones que el pool mantiene abiertas
+    DB_MAX_OVERFLOW: int = 20  # Conexiones extra temporales sobre DB_POOL_SIZE
+    DB_POOL_TIMEOUT: float = 30.0  # Segundos esperando una conexión libre antes de fallar
+    DB_POOL_RECYCLE: int = 1800  # Segundos; recicla conexiones antes del idle timeout del servidor
+    DB_POOL_PRE_PING: bool = True  # Verifica la conexión al sacarla del pool
+    DB_LIBERAR_CONEXION_EN_ESPERA: bool = False  # Devolver la conexión al pool durante llamadas a GPT
 
     # JWT
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 10080  # 7 días por defecto
 
+    # Contraseñas (bcrypt en un pool de hilos propio)
+    BCRYPT_ROUNDS: int = 12  # Costo; al cambiarlo los hashes se rehacen en el siguiente login
+    PASSWORD_HASH_WORKERS: int = 2  # Hashes simultáneos por proceso
+    PASSWORD_HASH_MAX_COLA: int = 64  # Hashes pendientes máximos antes de responder 503
+
+    # Límite de intentos de login (por proceso)
+    LOGIN_VENTANA_SEGUNDOS: int = 300
+    LOGIN_MAX_INTENTOS_IP: int = 30  # Intentos por IP en la ventana (exitosos o no)
+    LOGIN_MAX_FALLOS_EMAIL: int = 5  # Contraseñas incorrectas por email en la ventana
+
+    # Caché de usuarios autenticados (get_current_user sin SELECT en cada petición)
+    USUARIOS_CACHE_BACKEND: str = "memoria"  # "memoria" o "ninguno"
+    USUARIOS_CACHE_TTL_SEGUNDOS: int = 60  # Máximo que otro worker puede ver un usuario desactualizado
+    USUARIOS_CACHE_MAX_ENTRADAS: int = 5000
+
     # CORS
     FRONTEND_URL: str = "http://localhost:5173"
 
@@ -24,6 +49,63 @@ class Settings(BaseSettings):
 
     # OpenAI
     OPENAI_API_KEY: str
+    OPENAI_MAX_CONCURRENCIA: int = 8  # Llamadas simultáneas máximas a OpenAI por proceso
+    OPENAI_MAX_CONEXIONES: int = 20  # Tamaño del pool HTTP
+    OPENAI_MAX_CONEXIONES_KEEPALIVE: int = 10
+    OPENAI_TIMEOUT_CONEXION: float = 10.0  # Segundos
+    OPENAI_TIMEOUT_GENERACION: float = 180.0  # Segundos por llamada (tutelas / derechos de petición)
+    OPENAI_TIMEOUT_ANALISIS: float = 90.0  # Segundos por llamada (extracción y análisis)
+    OPENAI_MAX_REINTENTOS: int = 3  # Reintentos en 429 / 5xx / errores de red
+    OPENAI_BACKOFF_BASE: float = 1.0  # Segundos (se duplica por intento, con jitter)
+    OPENAI_BACKOFF_MAX: float = 20.0
+
+    # Transcripción enviada a GPT para extracción de datos
+    TRANSCRIPCION_PRESUPUESTO_TOKENS: int = 12000  # Tokens máximos de conversación por llamada
+    TRANSCRIPCION_ESTRATEGIA: str = "resumen"  # "resumen", "ventana" o "ninguna"
+    TRANSCRIPCION_TURNOS_RECIENTES: int = 8  # Últimos turnos que nunca se recortan
+
+    # Listado de casos (GET /casos/, paginado por cursor)
+    CASOS_PAGINA_DEFECTO: int = 50
+    CASOS_PAGINA_MAX: int = 100
+
+    # Webhook de mensajes del agente
+    MENSAJES_LOTE_MAX: int = 500  # Mensajes máximos por POST /mensajes/lote
+    MENSAJES_WRITE_BEHIND: bool = False  # Acumular POST /mensajes/ y escribirlos por lotes
+    MENSAJES_FLUSH_INTERVALO: float = 0.5  # Segundos entre escrituras del buffer
+    MENSAJES_FLUSH_MAX_LOTE: int = 200  # Escribir antes si se juntan tantos mensajes
+    MENSAJES_WAL_DIR: str = "cache/wal"  # Diario en disco del buffer (debe sobrevivir reinicios)
+
+    # Canal WebSocket de transcripciones (/mensajes/ws/{caso_id})
+    WS_LOTE_MAX: int = 20  # Mensajes por micro-lote
+    WS_LOTE_INTERVALO: float = 0.25  # Segundos máximos antes de escribir y confirmar
+    WS_INTERVALO_LIMITES: float = 30.0  # Segundos entre revisiones del tiempo de sesión
+    WS_AVISO_LIMITE_MINUTOS: float = 2.0  # Avisar al agente cuando queden estos minutos
+
+    # Caché en disco de PDFs renderizados (no debe quedar dentro de uploads/, que es público)
+    PDF_CACHE_DIR: str = "cache/pdf"
+    PDF_CACHE_TTL_DIAS: int = 30  # Se purgan los PDFs sin descargas en este tiempo
+
+    # Renderizado de PDFs ("proceso" = pool de procesos, "local" = hilo del mismo proceso)
+    PDF_RENDER_BACKEND: str = "proceso"
+    PDF_RENDER_PROCESOS: int = 2
+    PDF_RENDER_MAX_COLA: int = 32  # Renders pendientes máximos antes de responder 503
+    PDF_RENDER_TIMEOUT: float = 30.0  # Segundos por render
+    PDF_RENDER_MAX_TAREAS_POR_PROCESO: int = 200  # Reciclar cada proceso tras N renders
+
+    # Índice local de jurisprudencia (citas conocidas se validan sin llamar a GPT)
+    JURISPRUDENCIA_INDICE_PATH: str = os.path.join(DATA_DIR, "jurisprudencia.json.gz")
+
+    # Generación de documentos en segundo plano
+    GENERACION_MAX_WORKERS: int = 4  # Generaciones simultáneas contra OpenAI
+    GENERACION_TRABAJOS_TTL_MINUTOS: int = 60  # Cuánto se conserva el estado de un trabajo terminado
+
+    # Limpieza nocturna (app/cron/tareas_diarias.py)
+    LIMPIEZA_LOTE: int = 500  # Filas por DELETE; cada lote se confirma por separado
+
+    # Caché de documentos generados (evita repetir la llamada a GPT si el caso no cambió)
+    GENERACION_CACHE_BACKEND: str = "memoria"  # "memoria", "db" o "ninguno"
+    GENERACION_CACHE_TTL_MINUTOS: int = 1440
+    GENERACION_CACHE_MAX_ENTRADAS: int = 500  # Solo backend "memoria" (LRU)
 
     class Config:
         env_file = ".env"
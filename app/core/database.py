@@ -1,17 +1,232 @@
-from sqlalchemy import create_engine
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from app.core.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
+
+class _MetricasPool:
+    """
+    Contadores del pool de conexiones (checkouts, esperas, timeouts, uso máximo)
+    """
+
+    def __init__(self, muestras: int = 1000):
+        self._lock = threading.Lock()
+        self._esperas_ms = deque(maxlen=muestras)  # Últimas esperas por una conexión
+        self.checkouts = 0
+        self.timeouts = 0
+        self.en_uso_maximo = 0
+
+    def registrar_espera(self, milisegundos: float, timeout: bool = False):
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self._esperas_ms.append(milisegundos)
+
+    def registrar_checkout(self, en_uso: int):
+        with self._lock:
+            self.checkouts += 1
+            self.en_uso_maximo = max(self.en_uso_maximo, en_uso)
+
+    def esperas(self) -> list:
+        with self._lock:
+            return sorted(self._esperas_ms)
+
+
+class PoolMedido(QueuePool):
+    """
+    QueuePool que mide cuánto espera cada petición por una conexión libre
+    """
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except exc.TimeoutError:
+            _metricas.registrar_espera((time.perf_counter() - inicio) * 1000, timeout=True)
+            raise
+        _metricas.registrar_espera((time.perf_counter() - inicio) * 1000)
+        return conexion
+
+
+def _argumentos_engine(url: str) -> dict:
+    # SQLite en memoria usa su propio pool de un solo hilo; el resto usa el pool medido
+    if url.startswith("sqlite") and ":memory:" in url:
+        return {}
+
+    return {
+        "poolclass": PoolMedido,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+_metricas = _MetricasPool()
+
+engine = create_engine(settings.DATABASE_URL, **_argumentos_engine(settings.DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
+@event.listens_for(engine, "checkout")
+def _al_sacar_conexion(dbapi_connection, connection_record, connection_proxy):
+    _metricas.registrar_checkout(engine.pool.checkedout() if isinstance(engine.pool, QueuePool) else 1)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def es_error_transitorio(error: Exception) -> bool:
+    """
+    True si el error es de la conexión o del pool (reintentar tiene sentido) y
+    no de los datos enviados (tipos, FK, longitudes: reintentar falla igual)
+    """
+    if isinstance(error, (exc.OperationalError, exc.InterfaceError, exc.TimeoutError, ConnectionError)):
+        return True
+    return isinstance(error, exc.DBAPIError) and error.connection_invalidated
+
+
+# Capa async (asyncpg) para rutas calientes: misma BD y mismo tamaño de pool,
+# pero las consultas no bloquean el event loop. Se crea al primer uso.
+async_engine = None
+AsyncSessionLocal = None
+
+# Drivers async equivalentes a los de DATABASE_URL
+_DRIVERS_ASYNC = {"postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def url_async(url: str) -> str:
+    """
+    Convierte DATABASE_URL (psycopg2) en la URL equivalente para el driver async
+    """
+    url_parseada = make_url(url)
+    backend = url_parseada.get_backend_name()
+    if backend not in _DRIVERS_ASYNC:
+        raise ValueError(f"Base de datos sin driver async configurado: {backend}")
+
+    url_parseada = url_parseada.set(drivername=_DRIVERS_ASYNC[backend])
+
+    # asyncpg recibe "ssl" en lugar del "sslmode" de libpq
+    if "sslmode" in url_parseada.query:
+        query = dict(url_parseada.query)
+        query["ssl"] = query.pop("sslmode")
+        url_parseada = url_parseada.set(query=query)
+
+    return url_parseada.render_as_string(hide_password=False)
+
+
+def _obtener_async_sessionmaker() -> async_sessionmaker:
+    global async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        argumentos = _argumentos_engine(settings.DATABASE_URL)
+        argumentos.pop("poolclass", None)  # El engine async usa su propio pool (AsyncAdaptedQueuePool)
+
+        async_engine = create_async_engine(url_async(settings.DATABASE_URL), **argumentos)
+        # Sin expirar al confirmar: en async no hay lazy load implícito tras el commit
+        AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+    return AsyncSessionLocal
+
+
+async def get_async_db():
+    async with _obtener_async_sessionmaker()() as db:
+        yield db
+
+
+def nueva_sesion_async() -> AsyncSession:
+    """
+    AsyncSession fuera de una dependencia (tareas de larga duración, WebSockets)
+    """
+    return _obtener_async_sessionmaker()()
+
+
+@asynccontextmanager
+async def conexion_liberada(db: Session):
+    """
+    Devuelve la conexión de la sesión al pool mientras dura el bloque
+
+    Para envolver esperas largas (llamadas a GPT) dentro de un handler async: con
+    DB_LIBERAR_CONEXION_EN_ESPERA activo se confirma lo pendiente (commit, en un
+    hilo para no bloquear el event loop) sin expirar los objetos cargados, y la
+    sesión vuelve a tomar una conexión al siguiente acceso a la BD. Si está
+    desactivado no hace nada.
+    """
+    if settings.DB_LIBERAR_CONEXION_EN_ESPERA and db.in_transaction():
+        await asyncio.to_thread(_confirmar_sin_expirar, db)
+    yield
+
+
+def _confirmar_sin_expirar(db: Session):
+    expirar_original = db.expire_on_commit
+    db.expire_on_commit = False
+    try:
+        db.commit()
+    finally:
+        db.expire_on_commit = expirar_original
+
+
+def obtener_metricas_pool() -> dict:
+    """
+    Estado y contadores del pool de conexiones de este proceso
+    """
+    pool = engine.pool
+    esperas = _metricas.esperas()
+
+    def percentil(p: float) -> float:
+        if not esperas:
+            return 0.0
+        return round(esperas[min(len(esperas) - 1, int(len(esperas) * p))], 2)
+
+    metricas = {
+        "clase": type(pool).__name__,
+        "checkouts": _metricas.checkouts,
+        "timeouts": _metricas.timeouts,
+        "en_uso_maximo": _metricas.en_uso_maximo,
+        "espera_ms": {
+            "muestras": len(esperas),
+            "p50": percentil(0.50),
+            "p95": percentil(0.95),
+            "p99": percentil(0.99),
+            "max": round(esperas[-1], 2) if esperas else 0.0,
+        },
+        "liberar_conexion_en_espera": settings.DB_LIBERAR_CONEXION_EN_ESPERA,
+    }
+
+    if async_engine is not None:
+        pool_async = async_engine.pool
+        metricas["async"] = {
+            "clase": type(pool_async).__name__,
+            "tamano": pool_async.size(),
+            "en_uso": pool_async.checkedout(),
+            "disponibles": pool_async.checkedin(),
+            "overflow": max(0, pool_async.overflow()),
+        }
+
+    if isinstance(pool, QueuePool):
+        metricas.update({
+            "tamano": pool.size(),
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "en_uso": pool.checkedout(),
+            "disponibles": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "timeout_s": settings.DB_POOL_TIMEOUT,
+        })
+
+    return metricas
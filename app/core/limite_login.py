@@ -0,0 +1,99 @@
+"""
+Límite de intentos de login por IP y por email
+
+Se revisa antes de verificar la contraseña, así que una ráfaga de fuerza bruta
+recibe 429 sin gastar CPU en bcrypt:
+- Por IP: todos los intentos cuentan (LOGIN_MAX_INTENTOS_IP por ventana)
+- Por email: solo los fallidos (LOGIN_MAX_FALLOS_EMAIL por ventana); un login
+  correcto reinicia el contador
+
+Ventana deslizante de LOGIN_VENTANA_SEGUNDOS, en memoria de cada proceso (con N
+workers el límite efectivo es hasta N veces mayor). La IP es la del cliente
+según uvicorn: detrás de un proxy hay que arrancarlo con --proxy-headers y
+--forwarded-allow-ips para que sea la real y no la del proxy.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from .config import settings
+
+
+class LimitadorVentana:
+    """
+    Cuenta eventos por clave en una ventana deslizante (thread-safe)
+    """
+
+    def __init__(self, max_eventos: int, ventana_segundos: float, max_claves: int = 10000):
+        self.max_eventos = max(1, max_eventos)
+        self.ventana = ventana_segundos
+        self.max_claves = max_claves
+        self._eventos = OrderedDict()  # clave -> deque de instantes (time.monotonic)
+        self._lock = threading.Lock()
+
+    def espera(self, clave: str) -> Optional[float]:
+        """
+        Segundos hasta que la clave vuelva a tener cupo, o None si lo tiene
+        """
+        with self._lock:
+            eventos = self._vigentes(clave)
+            if eventos is None or len(eventos) < self.max_eventos:
+                return None
+            return max(0.0, eventos[0] + self.ventana - time.monotonic())
+
+    def registrar(self, clave: str):
+        with self._lock:
+            eventos = self._vigentes(clave)
+            if eventos is None:
+                eventos = self._eventos[clave] = deque(maxlen=self.max_eventos)
+            eventos.append(time.monotonic())
+            self._eventos.move_to_end(clave)
+            while len(self._eventos) > self.max_claves:
+                self._eventos.popitem(last=False)
+
+    def reiniciar(self, clave: str):
+        with self._lock:
+            self._eventos.pop(clave, None)
+
+    def _vigentes(self, clave: str) -> Optional[deque]:
+        eventos = self._eventos.get(clave)
+        if eventos is None:
+            return None
+
+        limite = time.monotonic() - self.ventana
+        while eventos and eventos[0] <= limite:
+            eventos.popleft()
+        if not eventos:
+            del self._eventos[clave]
+            return None
+        return eventos
+
+
+_por_ip = LimitadorVentana(settings.LOGIN_MAX_INTENTOS_IP, settings.LOGIN_VENTANA_SEGUNDOS)
+_por_email = LimitadorVentana(settings.LOGIN_MAX_FALLOS_EMAIL, settings.LOGIN_VENTANA_SEGUNDOS)
+
+
+def admitir(ip: str, email: str) -> Optional[int]:
+    """
+    Registra el intento de la IP y dice si se puede verificar la contraseña
+
+    Returns:
+        int: Segundos que hay que esperar (para Retry-After), o None si se admite
+    """
+    email = email.lower()
+    esperas = [espera for espera in (_por_email.espera(email), _por_ip.espera(ip)) if espera is not None]
+    if esperas:
+        return max(1, int(max(esperas) + 0.999))
+
+    _por_ip.registrar(ip)
+    return None
+
+
+def registrar_fallo(email: str):
+    _por_email.registrar(email.lower())
+
+
+def registrar_exito(email: str):
+    _por_email.reiniciar(email.lower())
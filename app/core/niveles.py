@@ -0,0 +1,39 @@
+"""
+Tabla de niveles de usuario y sus límites de sesión
+
+Única definición de los límites: User, nivel_service, sesion_service y
+/usuarios/beneficios-niveles los leen de aquí.
+"""
+
+NIVELES = {
+    0: {"nombre": "FREE", "sesiones_dia": 3, "min_sesion": 10, "min_totales": 30},
+    1: {"nombre": "BRONCE", "sesiones_dia": 5, "min_sesion": 10, "min_totales": 50},
+    2: {"nombre": "PLATA", "sesiones_dia": 7, "min_sesion": 10, "min_totales": 70},
+    3: {"nombre": "ORO", "sesiones_dia": 10, "min_sesion": 15, "min_totales": None},  # Sin límite total
+}
+
+# Valor que se reporta como "minutos disponibles" cuando el nivel no tiene límite diario
+MINUTOS_SIN_LIMITE = 999999
+
+
+def limites_nivel(nivel: int) -> dict:
+    """
+    Límites de sesión de un nivel (un nivel desconocido se trata como FREE)
+
+    Returns:
+        dict: {
+            "nivel": int,
+            "nombre_nivel": str,
+            "sesiones_dia": int,
+            "min_sesion": int,
+            "min_totales": int or None
+        }
+    """
+    datos = NIVELES.get(nivel, NIVELES[0])
+    return {
+        "nivel": nivel,
+        "nombre_nivel": datos["nombre"],
+        "sesiones_dia": datos["sesiones_dia"],
+        "min_sesion": datos["min_sesion"],
+        "min_totales": datos["min_totales"],
+    }
@@ -0,0 +1,162 @@
+"""
+Cliente OpenAI compartido por todos los servicios de IA
+
+Un solo AsyncOpenAI por event loop con:
+- Pool de conexiones HTTP ajustado (keep-alive entre llamadas)
+- Timeout por llamada (generación vs. análisis)
+- Reintentos acotados con backoff exponencial + jitter en 429, 5xx y errores de red
+- Semáforo global que limita las llamadas simultáneas a OpenAI, para que una
+  ráfaga de generaciones no agote el rate limit de la cuenta
+"""
+
+import asyncio
+import logging
+import random
+from typing import Optional
+
+import httpx
+from openai import (
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    RateLimitError,
+)
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_cliente: Optional[AsyncOpenAI] = None
+_semaforo: Optional[asyncio.Semaphore] = None
+_loop = None
+
+
+def obtener_cliente() -> AsyncOpenAI:
+    """
+    Retorna el cliente AsyncOpenAI del event loop actual (lo crea la primera vez)
+
+    Las conexiones del pool httpx quedan ligadas al loop que las abrió, por eso
+    se crea un cliente nuevo si cambia el loop (p. ej. en scripts o tests).
+    """
+    _asegurar_loop()
+    return _cliente
+
+
+def obtener_semaforo() -> asyncio.Semaphore:
+    """
+    Semáforo global de concurrencia hacia OpenAI (OPENAI_MAX_CONCURRENCIA)
+    """
+    _asegurar_loop()
+    return _semaforo
+
+
+async def crear_chat_completion(timeout: Optional[float] = None, **kwargs):
+    """
+    Ejecuta chat.completions.create respetando el semáforo global y con reintentos
+
+    Args:
+        timeout: Timeout total de la llamada en segundos (default: OPENAI_TIMEOUT_ANALISIS)
+        **kwargs: Parámetros de chat.completions.create (model, messages, ...)
+
+    Returns:
+        ChatCompletion de OpenAI
+    """
+    cliente = obtener_cliente()
+    timeout = timeout or settings.OPENAI_TIMEOUT_ANALISIS
+
+    async with obtener_semaforo():
+        return await _con_reintentos(
+            lambda: cliente.chat.completions.create(timeout=timeout, **kwargs)
+        )
+
+
+async def crear_chat_completion_stream(timeout: Optional[float] = None, **kwargs):
+    """
+    Igual que crear_chat_completion pero con stream=True
+
+    El cupo del semáforo se mantiene mientras dura el stream. Solo se reintenta
+    la apertura del stream: una vez llegan fragmentos, un error se propaga.
+
+    Yields:
+        ChatCompletionChunk de OpenAI
+    """
+    cliente = obtener_cliente()
+    timeout = timeout or settings.OPENAI_TIMEOUT_GENERACION
+
+    async with obtener_semaforo():
+        stream = await _con_reintentos(
+            lambda: cliente.chat.completions.create(timeout=timeout, stream=True, **kwargs)
+        )
+        async for chunk in stream:
+            yield chunk
+
+
+async def _con_reintentos(llamada):
+    intento = 0
+    while True:
+        try:
+            return await llamada()
+        except Exception as e:
+            if not _es_reintentable(e) or intento >= settings.OPENAI_MAX_REINTENTOS:
+                raise
+
+            espera = _calcular_espera(intento, e)
+            intento += 1
+            logger.warning(
+                f"⚠️ OpenAI {type(e).__name__} - Reintento {intento}/{settings.OPENAI_MAX_REINTENTOS} "
+                f"en {espera:.1f}s"
+            )
+            await asyncio.sleep(espera)
+
+
+def _es_reintentable(error: Exception) -> bool:
+    if isinstance(error, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def _calcular_espera(intento: int, error: Exception) -> float:
+    # Respetar Retry-After si OpenAI lo envía (429)
+    respuesta = getattr(error, "response", None)
+    if respuesta is not None:
+        retry_after = respuesta.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), settings.OPENAI_BACKOFF_MAX)
+            except ValueError:
+                pass
+
+    # Backoff exponencial con "full jitter"
+    tope = min(settings.OPENAI_BACKOFF_MAX, settings.OPENAI_BACKOFF_BASE * (2 ** intento))
+    return random.uniform(0, tope)
+
+
+def _asegurar_loop():
+    global _cliente, _semaforo, _loop
+
+    loop = asyncio.get_running_loop()
+    if _cliente is not None and _loop is loop:
+        return
+
+    _loop = loop
+    _semaforo = asyncio.Semaphore(max(1, settings.OPENAI_MAX_CONCURRENCIA))
+    _cliente = AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        max_retries=0,  # Los reintentos se manejan aquí (con jitter y semáforo)
+        timeout=settings.OPENAI_TIMEOUT_GENERACION,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONEXIONES,
+                max_keepalive_connections=settings.OPENAI_MAX_CONEXIONES_KEEPALIVE,
+                keepalive_expiry=30,
+            ),
+            timeout=httpx.Timeout(
+                settings.OPENAI_TIMEOUT_GENERACION,
+                connect=settings.OPENAI_TIMEOUT_CONEXION,
+            ),
+        ),
+    )
@@ -1,10 +1,27 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt__rounds también marca como desactualizados (needs_update) los hashes
+# con otro costo, así que cambiar BCRYPT_ROUNDS los rehace en el siguiente login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# bcrypt es CPU-bound (y suelta el GIL): corre en su propio pool acotado para no
+# ocupar el threadpool de las rutas ni bloquear el event loop
+_pool_hash: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pendientes = 0  # Hashes encolados o en curso (solo se toca desde el event loop)
+
+
+class ColaHashLlenaError(Exception):
+    """
+    Hay PASSWORD_HASH_MAX_COLA hashes pendientes (la ruta responde 503)
+    """
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -15,6 +32,53 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def get_password_hash_async(password: str) -> str:
+    return await _en_pool_hash(pwd_context.hash, password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica la contraseña en el pool de hash
+
+    Returns:
+        (válida, hash_nuevo): hash_nuevo viene cuando la contraseña es válida pero
+        el hash guardado usa otro costo o esquema y hay que reemplazarlo
+    """
+    return await _en_pool_hash(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+def cerrar_pool_hash():
+    global _pool_hash
+    with _pool_lock:
+        if _pool_hash is not None:
+            _pool_hash.shutdown(wait=False, cancel_futures=True)
+            _pool_hash = None
+
+
+async def _en_pool_hash(funcion, *args):
+    global _pendientes
+
+    if _pendientes >= settings.PASSWORD_HASH_MAX_COLA:
+        raise ColaHashLlenaError(f"Cola de hash de contraseñas llena ({_pendientes} pendientes)")
+
+    _pendientes += 1
+    try:
+        return await asyncio.wrap_future(_obtener_pool_hash().submit(funcion, *args))
+    finally:
+        _pendientes -= 1
+
+
+def _obtener_pool_hash() -> ThreadPoolExecutor:
+    global _pool_hash
+    with _pool_lock:
+        if _pool_hash is None:
+            _pool_hash = ThreadPoolExecutor(
+                max_workers=max(1, settings.PASSWORD_HASH_WORKERS),
+                thread_name_prefix="bcrypt",
+            )
+        return _pool_hash
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -48,9 +48,13 @@ def tarea_medianoche():
     try:
         # 1. Recalcular niveles de todos los usuarios
         logger.info("\n1/3: Recalculando niveles de usuarios...")
-        usuarios_actualizados = nivel_service.recalcular_todos_los_niveles(db)
-        logger.info(f"   OK: {usuarios_actualizados} usuarios actualizados")
-        resultados["usuarios_actualizados"] = usuarios_actualizados
+        recalculo = nivel_service.recalcular_todos_los_niveles(db)
+        logger.info(
+            f"   OK: {recalculo['usuarios']} usuarios actualizados "
+            f"({recalculo['cambios_nivel']} cambiaron de nivel)"
+        )
+        resultados["usuarios_actualizados"] = recalculo["usuarios"]
+        resultados["cambios_nivel"] = recalculo["cambios_nivel"]
 
         # 2. Resetear sesiones_extra_hoy
         logger.info("\n2/3: Reseteando sesiones extra...")
@@ -94,13 +98,14 @@ def tarea_limpieza():
     Tareas:
     1. Eliminar documentos GENERADOS vencidos (14+ días sin pagar)
     2. Eliminar casos TEMPORAL abandonados (1+ día sin completar)
+    3. Purgar PDFs cacheados sin descargas recientes
     """
     logger.info("=" * 60)
     logger.info("CRON: tarea_limpieza - INICIANDO")
     logger.info("=" * 60)
 
     from ..core.database import SessionLocal
-    from ..services import limpieza_service
+    from ..services import limpieza_service, pdf_cache_service
 
     db = SessionLocal()
     resultados = {
@@ -111,17 +116,23 @@ def tarea_limpieza():
 
     try:
         # 1. Eliminar documentos vencidos
-        logger.info("\n1/2: Eliminando documentos vencidos...")
+        logger.info("\n1/3: Eliminando documentos vencidos...")
         docs_eliminados = limpieza_service.eliminar_documentos_vencidos(db)
         logger.info(f"   OK: {docs_eliminados} documentos vencidos eliminados")
         resultados["documentos_eliminados"] = docs_eliminados
 
         # 2. Eliminar casos temporales antiguos
-        logger.info("\n2/2: Eliminando casos temporales abandonados (1+ día)...")
+        logger.info("\n2/3: Eliminando casos temporales abandonados (1+ día)...")
         casos_eliminados = limpieza_service.eliminar_casos_temporales_antiguos(db, dias_antiguedad=1)
         logger.info(f"   OK: {casos_eliminados} casos temporales eliminados")
         resultados["casos_temporales_eliminados"] = casos_eliminados
 
+        # 3. Purgar PDFs cacheados sin descargas recientes
+        logger.info("\n3/3: Purgando caché de PDFs...")
+        pdfs_purgados = pdf_cache_service.purgar_antiguos()
+        logger.info(f"   OK: {pdfs_purgados} PDFs cacheados eliminados")
+        resultados["pdfs_cache_purgados"] = pdfs_purgados
+
         resultados["exito"] = True
         resultados["fin"] = datetime.utcnow()
         duracion = (resultados["fin"] - resultados["inicio"]).total_seconds()
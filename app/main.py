@@ -6,7 +6,10 @@ from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from app.core.config import settings
 from app.core.database import engine, Base
+from app.core.security import cerrar_pool_hash
 from app.routes import auth, livekit, casos, referencias, sesiones, mensajes, perfil, migrations, usuarios, admin
+from app.services import mensajes_buffer_service, pdf_render_service
+from contextlib import asynccontextmanager
 import logging
 import os
 
@@ -17,10 +20,23 @@ logger = logging.getLogger(__name__)
 # Crear tablas en la base de datos
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Reinsertar mensajes de diarios huérfanos y arrancar el buffer write-behind
+    await mensajes_buffer_service.iniciar()
+    yield
+    # Vaciar el buffer antes de apagar y cerrar los pools de render de PDFs y de bcrypt
+    await mensajes_buffer_service.detener()
+    pdf_render_service.cerrar_pool()
+    cerrar_pool_hash()
+
+
 app = FastAPI(
     title="Abogadai API",
     description="API para la plataforma Abogadai - Generación de tutelas y derechos de petición con IA",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -54,6 +70,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
         status_code=exc.status_code,
         content={"detail": exc.detail},
         headers={
+            **(exc.headers or {}),  # Conservar headers de la excepción (Retry-After, WWW-Authenticate)
             "Access-Control-Allow-Origin": request.headers.get("origin", "*"),
             "Access-Control-Allow-Credentials": "true",
         }
@@ -3,6 +3,9 @@ from .caso import Caso, TipoDocumento, EstadoCaso
 from .mensaje import Mensaje
 from .sesion_diaria import SesionDiaria
 from .pago import Pago, EstadoPago, MetodoPago
+from .generacion_cache import GeneracionCache
+from .documento import Documento
+from .analisis import Analisis
 
 __all__ = [
     "User",
@@ -10,6 +13,9 @@ __all__ = [
     "Mensaje",
     "SesionDiaria",
     "Pago",
+    "GeneracionCache",
+    "Documento",
+    "Analisis",
     "TipoDocumento",
     "EstadoCaso",
     "EstadoPago",
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, JSON, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+
+from ..core.database import Base
+
+
+class Analisis(Base):
+    """
+    Análisis de IA de una versión del documento de un caso
+
+    Uno por (caso, versión del documento); volver a analizar la misma versión
+    reemplaza el resultado.
+    """
+    __tablename__ = "analisis"
+    __table_args__ = (
+        Index("uq_analisis_caso_version", "caso_id", "documento_version", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    caso_id = Column(Integer, ForeignKey("casos.id"), nullable=False, index=True)
+    documento_version = Column(Integer, nullable=False)  # Documento.version analizada
+
+    fortaleza = Column(JSON, nullable=True)  # Análisis de fortaleza del caso
+    calidad = Column(JSON, nullable=True)  # Análisis de calidad del documento
+    jurisprudencia = Column(JSON, nullable=True)  # Validación de jurisprudencia
+    sugerencias = Column(JSON, nullable=True)  # Sugerencias de mejora
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relaciones
+    caso = relationship("Caso", back_populates="analisis")
+
+    def __repr__(self):
+        return f"<Analisis(caso_id={self.caso_id}, documento_version={self.documento_version})>"
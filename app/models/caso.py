@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLEnum, JSON, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLEnum, JSON, Boolean, Index, text
+from sqlalchemy.orm import relationship, deferred, joinedload, undefer_group
+from typing import Optional
 from datetime import datetime
 import enum
 
@@ -22,8 +23,24 @@ class EstadoCaso(str, enum.Enum):
     ABANDONADO = "ABANDONADO"
 
 
+# Grupos de datos pesados que db.query(Caso) NO carga: se leen con una consulta
+# extra al primer acceso, o junto con el caso usando cargar_grupos(...)
+GRUPO_DOCUMENTO = "documento"  # documento_actual (tabla documentos)
+GRUPO_RELATO = "relato"  # hechos, fundamentos_derecho
+GRUPO_ANALISIS = "analisis"  # analisis_actual (tabla analisis)
+GRUPO_REEMBOLSOS = "reembolsos"  # historial_reembolsos
+GRUPO_EXTRACCION = "extraccion"  # extraccion_estado
+
+# Lo que serializa CasoResponse
+GRUPOS_RESPUESTA = (GRUPO_DOCUMENTO, GRUPO_RELATO, GRUPO_ANALISIS)
+
+
 class Caso(Base):
     __tablename__ = "casos"
+    __table_args__ = (
+        # Listado paginado por cursor: WHERE user_id = ? ORDER BY updated_at DESC, id
+        Index("ix_casos_user_updated_id", "user_id", text("updated_at DESC"), "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -51,15 +68,15 @@ class Caso(Base):
     direccion_entidad = Column(Text, nullable=True)
 
     # Contenido del caso
-    hechos = Column(Text, nullable=True)
+    hechos = deferred(Column(Text, nullable=True), group=GRUPO_RELATO)
     ciudad_de_los_hechos = Column(String(100), nullable=True)
     derechos_vulnerados = Column(Text, nullable=True)
     pretensiones = Column(Text, nullable=True)
-    fundamentos_derecho = Column(Text, nullable=True)
+    fundamentos_derecho = deferred(Column(Text, nullable=True), group=GRUPO_RELATO)
     pruebas = Column(Text, nullable=True)  # Documentos y pruebas anexas
 
-    # Documento generado
-    documento_generado = Column(Text, nullable=True)
+    # Documento generado: las versiones viven en la tabla documentos
+    documento_version = Column(Integer, nullable=True)  # Versión vigente (None = sin documento)
 
     # Sistema de paywall
     documento_desbloqueado = Column(Boolean, default=False, nullable=False)
@@ -73,7 +90,7 @@ class Caso(Base):
     evidencia_rechazo_url = Column(String(500), nullable=True)  # URL del documento de rechazo
     fecha_reembolso = Column(DateTime, nullable=True)
     comentario_admin_reembolso = Column(Text, nullable=True)
-    historial_reembolsos = Column(JSON, nullable=True)  # Historial de todas las solicitudes/decisiones
+    historial_reembolsos = deferred(Column(JSON, nullable=True), group=GRUPO_REEMBOLSOS)  # Historial de todas las solicitudes/decisiones
     visto_por_usuario = Column(Boolean, default=True, nullable=False)  # Notificación de respuesta de reembolso
 
     # Validación de subsidiariedad de la tutela (Art. 86 C.P.)
@@ -83,11 +100,9 @@ class Caso(Base):
     es_procedente_tutela = Column(Boolean, default=False, nullable=True)
     razon_improcedencia = Column(Text, nullable=True)
 
-    # Análisis de IA
-    analisis_fortaleza = Column(JSON, nullable=True)  # Análisis de fortaleza del caso
-    analisis_calidad = Column(JSON, nullable=True)    # Análisis de calidad del documento
-    analisis_jurisprudencia = Column(JSON, nullable=True)  # Validación de jurisprudencia
-    sugerencias_mejora = Column(JSON, nullable=True)  # Sugerencias de mejora
+    # Extracción incremental de la transcripción
+    extraccion_estado = deferred(Column(JSON, nullable=True), group=GRUPO_EXTRACCION)  # Último JSON extraído de la conversación
+    extraccion_ultimo_mensaje_id = Column(Integer, nullable=True)  # Último Mensaje.id ya procesado
 
     # Datos de sesión LiveKit (para integración con avatar)
     session_id = Column(String(100), nullable=True, index=True)  # UUID de la sesión
@@ -103,3 +118,69 @@ class Caso(Base):
     user = relationship("User", back_populates="casos")
     mensajes = relationship("Mensaje", back_populates="caso", cascade="all, delete-orphan")
     pagos = relationship("Pago", back_populates="caso", cascade="all, delete-orphan")
+    documentos = relationship("Documento", back_populates="caso", cascade="all, delete-orphan",
+                              order_by="Documento.version")
+    analisis = relationship("Analisis", back_populates="caso", cascade="all, delete-orphan")
+
+    # Versión vigente del documento y su análisis (solo lectura; se escriben con versiones_service)
+    documento_actual = relationship(
+        "Documento",
+        primaryjoin="and_(foreign(Documento.caso_id) == Caso.id, foreign(Documento.version) == Caso.documento_version)",
+        uselist=False,
+        viewonly=True,
+    )
+    analisis_actual = relationship(
+        "Analisis",
+        primaryjoin="and_(foreign(Analisis.caso_id) == Caso.id, foreign(Analisis.documento_version) == Caso.documento_version)",
+        uselist=False,
+        viewonly=True,
+    )
+
+    # Compatibilidad: los schemas y servicios leen estos atributos como antes
+    @property
+    def tiene_documento(self) -> bool:
+        return self.documento_version is not None
+
+    @property
+    def documento_generado(self) -> Optional[str]:
+        if self.documento_version is None or self.documento_actual is None:
+            return None
+        return self.documento_actual.contenido
+
+    @property
+    def analisis_fortaleza(self) -> Optional[dict]:
+        return self._analisis("fortaleza")
+
+    @property
+    def analisis_calidad(self) -> Optional[dict]:
+        return self._analisis("calidad")
+
+    @property
+    def analisis_jurisprudencia(self) -> Optional[dict]:
+        return self._analisis("jurisprudencia")
+
+    @property
+    def sugerencias_mejora(self) -> Optional[dict]:
+        return self._analisis("sugerencias")
+
+    def _analisis(self, campo: str) -> Optional[dict]:
+        if self.documento_version is None or self.analisis_actual is None:
+            return None
+        return getattr(self.analisis_actual, campo)
+
+
+def cargar_grupos(*grupos: str) -> list:
+    """
+    Opciones de consulta para traer grupos de datos diferidos en el mismo SELECT
+
+    Uso: db.query(Caso).options(*cargar_grupos(GRUPO_DOCUMENTO)).filter(...)
+    """
+    opciones = []
+    for grupo in grupos:
+        if grupo == GRUPO_DOCUMENTO:
+            opciones.append(joinedload(Caso.documento_actual))
+        elif grupo == GRUPO_ANALISIS:
+            opciones.append(joinedload(Caso.analisis_actual))
+        else:
+            opciones.append(undefer_group(grupo))
+    return opciones
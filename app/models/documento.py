@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+
+from ..core.database import Base
+
+
+class Documento(Base):
+    """
+    Versión de un documento generado (tutela o derecho de petición)
+
+    Solo se agregan filas: cada generación o edición crea una versión nueva y
+    Caso.documento_version apunta a la vigente (ver versiones_service).
+    """
+    __tablename__ = "documentos"
+    __table_args__ = (
+        Index("uq_documentos_caso_version", "caso_id", "version", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    caso_id = Column(Integer, ForeignKey("casos.id"), nullable=False, index=True)
+    version = Column(Integer, nullable=False)  # 1, 2, 3... por caso
+
+    contenido = Column(Text, nullable=False)
+    hash_contenido = Column(String(64), nullable=False)  # sha256 hex del contenido
+    origen = Column(String(20), nullable=False, default="generacion")  # generacion, edicion, migracion
+    metadatos_render = Column(JSON, nullable=True)  # Versiones de los renderizadores PDF / DOCX
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relaciones
+    caso = relationship("Caso", back_populates="documentos")
+
+    def __repr__(self):
+        return f"<Documento(caso_id={self.caso_id}, version={self.version}, hash={self.hash_contenido[:12]})>"
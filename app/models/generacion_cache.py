@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from datetime import datetime
+
+from ..core.database import Base
+
+
+class GeneracionCache(Base):
+    """
+    Caché persistente de documentos generados por GPT
+
+    La clave es un hash de los datos normalizados del caso + tipo de documento +
+    versión del prompt + modelo (ver cache_generacion_service).
+    """
+    __tablename__ = "generaciones_cache"
+
+    clave = Column(String(64), primary_key=True)  # sha256 hex
+    caso_id = Column(Integer, nullable=True, index=True)  # Sin FK: el caché no debe bloquear la limpieza de casos
+    tipo_documento = Column(String(30), nullable=False)
+    modelo = Column(String(100), nullable=False)
+    prompt_version = Column(String(50), nullable=False)
+    documento = Column(Text, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expira_en = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<GeneracionCache(clave={self.clave[:12]}, caso_id={self.caso_id}, tipo={self.tipo_documento})>"
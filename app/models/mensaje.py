@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -10,6 +10,10 @@ class Mensaje(Base):
     Modelo para almacenar mensajes de conversaciones con el avatar durante las sesiones
     """
     __tablename__ = "mensajes"
+    __table_args__ = (
+        # Un reenvío del canal WebSocket tras reconectar no duplica mensajes
+        Index("uq_mensajes_caso_seq", "caso_id", "seq", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     caso_id = Column(Integer, ForeignKey("casos.id"), nullable=False, index=True)
@@ -22,6 +26,7 @@ class Mensaje(Base):
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     duracion_audio = Column(Integer, nullable=True)  # En milisegundos
     confianza = Column(Integer, nullable=True)  # Confianza del STT (0-100)
+    seq = Column(Integer, nullable=True)  # Número de secuencia del agente (solo canal WebSocket)
 
     # Relación con caso
     caso = relationship("Caso", back_populates="mensajes")
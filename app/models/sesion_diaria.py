@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -11,6 +11,10 @@ class SesionDiaria(Base):
     Se resetea cada medianoche
     """
     __tablename__ = "sesiones_diarias"
+    __table_args__ = (
+        # Un registro por usuario y día: los contadores se actualizan con upsert
+        Index("uq_sesiones_diarias_user_fecha", "user_id", "fecha", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
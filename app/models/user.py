@@ -2,6 +2,7 @@ from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
+from app.core.niveles import limites_nivel
 
 
 class User(Base):
@@ -48,20 +49,9 @@ class User(Base):
 
     def obtener_nombre_nivel(self):
         """Retorna el nombre del nivel del usuario"""
-        niveles = {
-            0: "FREE",
-            1: "BRONCE",
-            2: "PLATA",
-            3: "ORO"
-        }
-        return niveles.get(self.nivel_usuario, "FREE")
+        return limites_nivel(self.nivel_usuario)["nombre_nivel"]
 
     def obtener_limites_sesion(self):
         """Retorna los límites de sesión según el nivel del usuario"""
-        limites = {
-            0: {"sesiones_dia": 3, "min_sesion": 10, "min_totales": 30},
-            1: {"sesiones_dia": 5, "min_sesion": 10, "min_totales": 50},
-            2: {"sesiones_dia": 7, "min_sesion": 10, "min_totales": 70},
-            3: {"sesiones_dia": 10, "min_sesion": 15, "min_totales": None}  # Sin límite total
-        }
-        return limites.get(self.nivel_usuario, limites[0])
+        limites = limites_nivel(self.nivel_usuario)
+        return {campo: limites[campo] for campo in ("sesiones_dia", "min_sesion", "min_totales")}
@@ -7,11 +7,11 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 
-from ..core.database import get_db
+from ..core.database import get_db, obtener_metricas_pool
 from ..models.user import User
 from ..models import Caso, Pago, EstadoCaso
 from .auth import get_current_user
-from ..services import pago_service, nivel_service
+from ..services import pago_service, nivel_service, cache_generacion_service, cache_usuarios_service, transcripcion_service, mensajes_buffer_service
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -322,6 +322,71 @@ async def obtener_metricas_completas(
         )
 
 
+@router.get("/metricas/cache-generacion")
+def obtener_metricas_cache_generacion(
+    current_user: User = Depends(get_admin_user)
+):
+    """
+    ♻️ Métricas del caché de documentos generados
+
+    Solo admin - Hits, misses, tasa de aciertos y entradas actuales del caché
+    (las cifras son del proceso que atiende la petición)
+    """
+    return cache_generacion_service.obtener_metricas()
+
+
+@router.get("/metricas/cache-usuarios")
+def obtener_metricas_cache_usuarios(
+    current_user: User = Depends(get_admin_user)
+):
+    """
+    👤 Métricas del caché de usuarios autenticados
+
+    Solo admin - Hits, misses, invalidaciones y entradas actuales del caché
+    (las cifras son del proceso que atiende la petición)
+    """
+    return cache_usuarios_service.obtener_metricas()
+
+
+@router.get("/metricas/extraccion")
+def obtener_metricas_extraccion(
+    current_user: User = Depends(get_admin_user)
+):
+    """
+    🔢 Tokens de prompt de las últimas extracciones de transcripción
+
+    Solo admin - Presupuesto y estrategia configurados, promedio/máximo de tokens
+    y cuántas llamadas tuvieron que recortarse (cifras del proceso actual)
+    """
+    return transcripcion_service.obtener_metricas()
+
+
+@router.get("/metricas/pool-bd")
+def obtener_metricas_pool_bd(
+    current_user: User = Depends(get_admin_user)
+):
+    """
+    🗄️ Estado del pool de conexiones a la base de datos
+
+    Solo admin - Conexiones en uso, disponibles y en overflow, checkouts,
+    timeouts y percentiles de espera por una conexión (cifras del proceso actual)
+    """
+    return obtener_metricas_pool()
+
+
+@router.get("/metricas/mensajes-buffer")
+def obtener_metricas_mensajes_buffer(
+    current_user: User = Depends(get_admin_user)
+):
+    """
+    📝 Estado del buffer write-behind del webhook de mensajes
+
+    Solo admin - Mensajes encolados y pendientes, vaciados, filas insertadas,
+    descartadas y recuperadas de diarios huérfanos (cifras del proceso actual)
+    """
+    return mensajes_buffer_service.obtener_metricas()
+
+
 @router.get("/reembolsos")
 async def listar_reembolsos_con_filtro(
     estado: str = "pendientes",
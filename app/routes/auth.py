@@ -1,28 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
+from app.core import limite_login
 from app.core.security import (
-    verify_password,
-    get_password_hash,
+    ColaHashLlenaError,
+    get_password_hash_async,
+    verify_and_update_password_async,
     create_access_token,
     decode_access_token
 )
 from app.core.config import settings
 from app.models.user import User
+from app.services import cache_usuarios_service
 from app.schemas.user import UserCreate, UserLogin, UserResponse, Token
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 security = HTTPBearer()
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    token = credentials.credentials
+def _payload_del_token(token: str) -> dict:
     payload = decode_access_token(token)
 
     if payload is None:
@@ -31,35 +32,86 @@ def get_current_user(
             detail="Token inválido o expirado",
         )
 
-    email: str = payload.get("sub")
-    if email is None:
+    if payload.get("uid") is None and payload.get("sub") is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido",
         )
 
-    user = db.query(User).filter(User.email == email).first()
+    return payload
+
+
+def _usuario_no_encontrado() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Usuario no encontrado",
+    )
+
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    payload = _payload_del_token(credentials.credentials)
+
+    if payload.get("uid") is not None:
+        # Por clave primaria y casi siempre sin ir a la BD (ver cache_usuarios_service)
+        user = cache_usuarios_service.obtener(db, payload["uid"])
+    else:
+        # Tokens emitidos antes de incluir "uid": búsqueda por email
+        user = db.query(User).filter(User.email == payload["sub"]).first()
+
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Usuario no encontrado",
-        )
+        raise _usuario_no_encontrado()
 
     return user
 
 
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """
+    Igual que get_current_user, para rutas que usan get_async_db
+    """
+    payload = _payload_del_token(credentials.credentials)
+
+    if payload.get("uid") is not None:
+        user = await cache_usuarios_service.obtener_async(db, payload["uid"])
+    else:
+        resultado = await db.execute(select(User).where(User.email == payload["sub"]))
+        user = resultado.scalar_one_or_none()
+
+    if user is None:
+        raise _usuario_no_encontrado()
+
+    return user
+
+
+def _cola_hash_llena() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Servicio ocupado, intenta de nuevo en unos segundos",
+        headers={"Retry-After": "2"},
+    )
+
+
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def signup(user_data: UserCreate, db: Session = Depends(get_db)):
+async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Verificar si el usuario ya existe
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
+    resultado = await db.execute(select(User.id).where(User.email == user_data.email))
+    if resultado.first() is not None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El email ya está registrado"
         )
 
-    # Crear nuevo usuario
-    hashed_password = get_password_hash(user_data.password)
+    # Crear nuevo usuario (bcrypt en el pool de hash, fuera del event loop)
+    try:
+        hashed_password = await get_password_hash_async(user_data.password)
+    except ColaHashLlenaError:
+        raise _cola_hash_llena()
+
     new_user = User(
         email=user_data.email,
         nombre=user_data.nombre,
@@ -68,33 +120,58 @@ def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return new_user
 
 
 @router.post("/login", response_model=Token)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    # Buscar usuario
-    user = db.query(User).filter(User.email == user_data.email).first()
+async def login(user_data: UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Límite por IP y por email antes de gastar CPU en bcrypt
+    espera = limite_login.admitir(request.client.host if request.client else "desconocida", user_data.email)
+    if espera is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos de inicio de sesión. Intenta más tarde.",
+            headers={"Retry-After": str(espera)},
+        )
 
-    if not user or not verify_password(user_data.password, user.hashed_password):
+    # Buscar usuario
+    resultado = await db.execute(select(User).where(User.email == user_data.email))
+    user = resultado.scalar_one_or_none()
+
+    valido, nuevo_hash = False, None
+    if user:
+        try:
+            valido, nuevo_hash = await verify_and_update_password_async(user_data.password, user.hashed_password)
+        except ColaHashLlenaError:
+            raise _cola_hash_llena()
+
+    if not valido:
+        limite_login.registrar_fallo(user_data.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email o contraseña incorrectos"
         )
 
+    limite_login.registrar_exito(user_data.email)
+
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Usuario inactivo"
         )
 
+    # El hash se hizo con otro costo (BCRYPT_ROUNDS cambió): guardarlo con el actual
+    if nuevo_hash:
+        user.hashed_password = nuevo_hash
+        await db.commit()
+
     # Crear token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email},
+        data={"sub": user.email, "uid": user.id},
         expires_delta=access_token_expires
     )
 
@@ -102,5 +179,5 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: User = Depends(get_current_user_async)):
     return current_user
@@ -1,17 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks, Header, Query
+from fastapi.responses import StreamingResponse, FileResponse, Response
+from sqlalchemy import and_, func, inspect, or_, select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
+import asyncio
+import base64
+import json
 import logging
 import os
 
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_db, conexion_liberada
 from ..models.user import User
-from ..models.caso import Caso, EstadoCaso, TipoDocumento
+from ..models.caso import (
+    Caso, EstadoCaso, TipoDocumento, cargar_grupos,
+    GRUPOS_RESPUESTA, GRUPO_DOCUMENTO, GRUPO_RELATO, GRUPO_REEMBOLSOS, GRUPO_EXTRACCION
+)
 from ..models.mensaje import Mensaje
-from ..schemas.caso import CasoCreate, CasoUpdate, CasoResponse, CasoListResponse
-from ..services import openai_service, document_service, pago_service
+from ..schemas.caso import CasoCreate, CasoUpdate, CasoResponse, CasoListResponse, DocumentoVersionResponse
+from ..services import (
+    openai_service, document_service, pago_service, generacion_service,
+    cache_generacion_service, analisis_caso_service, pdf_cache_service, pdf_render_service,
+    mensajes_buffer_service, versiones_service
+)
 from .auth import get_current_user
 
 router = APIRouter(prefix="/casos", tags=["Casos"])
@@ -59,15 +71,59 @@ def crear_caso(
     return nuevo_caso
 
 
+# Solo las columnas que serializa CasoListResponse (sin documento_generado, hechos ni análisis)
+_COLUMNAS_LISTADO = [getattr(Caso, campo) for campo in CasoListResponse.model_fields]
+
+
+def _codificar_cursor(updated_at: datetime, caso_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{updated_at.isoformat()}|{caso_id}".encode()).decode()
+
+
+def _decodificar_cursor(cursor: str):
+    try:
+        updated_at, caso_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(updated_at), int(caso_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
 @router.get("/", response_model=List[CasoListResponse])
 def listar_casos(
+    response: Response,
+    limite: Optional[int] = Query(None, ge=1, description="Casos por página (máximo CASOS_PAGINA_MAX)"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    estado: Optional[EstadoCaso] = None,
+    tipo_documento: Optional[TipoDocumento] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Lista todos los casos del usuario autenticado
+    Lista los casos del usuario autenticado, del más reciente al más antiguo
+
+    Paginado por cursor sobre (updated_at, id): si hay más casos, la respuesta
+    trae el header X-Siguiente-Cursor para pedir la página siguiente.
     """
-    casos = db.query(Caso).filter(Caso.user_id == current_user.id).order_by(Caso.updated_at.desc()).all()
+    limite = min(limite or settings.CASOS_PAGINA_DEFECTO, settings.CASOS_PAGINA_MAX)
+
+    # Mismo orden que el índice ix_casos_user_updated_id
+    consulta = select(*_COLUMNAS_LISTADO).where(Caso.user_id == current_user.id)
+    if estado:
+        consulta = consulta.where(Caso.estado == estado)
+    if tipo_documento:
+        consulta = consulta.where(Caso.tipo_documento == tipo_documento)
+    if cursor:
+        updated_at, caso_id = _decodificar_cursor(cursor)
+        consulta = consulta.where(or_(
+            Caso.updated_at < updated_at,
+            and_(Caso.updated_at == updated_at, Caso.id > caso_id)
+        ))
+
+    # Una fila de más indica si hay otra página
+    casos = db.execute(consulta.order_by(Caso.updated_at.desc(), Caso.id).limit(limite + 1)).all()
+    if len(casos) > limite:
+        casos = casos[:limite]
+        response.headers["X-Siguiente-Cursor"] = _codificar_cursor(casos[-1].updated_at, casos[-1].id)
+
     return casos
 
 
@@ -100,10 +156,10 @@ async def tiene_novedades(
     """
     try:
         # Contar casos del usuario que no han sido vistos
-        casos_sin_ver = db.query(Caso).filter(
+        casos_sin_ver = db.query(func.count(Caso.id)).filter(
             Caso.user_id == current_user.id,
             Caso.visto_por_usuario == False
-        ).count()
+        ).scalar()
 
         return {
             "tiene_novedades": casos_sin_ver > 0,
@@ -162,7 +218,7 @@ def obtener_caso(
     """
     Obtiene los detalles de un caso específico
     """
-    caso = db.query(Caso).filter(
+    caso = db.query(Caso).options(*cargar_grupos(*GRUPOS_RESPUESTA)).filter(
         Caso.id == caso_id,
         Caso.user_id == current_user.id
     ).first()
@@ -186,7 +242,7 @@ def actualizar_caso(
     """
     Actualiza un caso existente (autoguardado de borradores)
     """
-    caso = db.query(Caso).filter(
+    caso = db.query(Caso).options(*cargar_grupos(*GRUPOS_RESPUESTA)).filter(
         Caso.id == caso_id,
         Caso.user_id == current_user.id
     ).first()
@@ -199,11 +255,29 @@ def actualizar_caso(
 
     # Actualizar solo los campos que se enviaron
     update_data = caso_data.model_dump(exclude_unset=True)
+    campos_modificados = [
+        field for field, value in update_data.items()
+        if getattr(caso, field) != value
+    ]
+    documento_anterior = caso.documento_generado
     for field, value in update_data.items():
-        setattr(caso, field, value)
+        if field == 'documento_generado':
+            # Editar el documento agrega una versión nueva (no sobrescribe)
+            versiones_service.guardar_documento(db, caso, value, origen="edicion")
+        else:
+            setattr(caso, field, value)
 
     db.commit()
-    db.refresh(caso)
+    # Recargar con los mismos grupos: db.refresh dejaría el relato para otra consulta
+    caso = db.query(Caso).options(*cargar_grupos(*GRUPOS_RESPUESTA)).filter(Caso.id == caso_id).one()
+
+    # Si cambió un dato que alimenta el prompt, las generaciones cacheadas ya no aplican
+    if cache_generacion_service.requiere_invalidacion(campos_modificados):
+        cache_generacion_service.invalidar_caso(caso.id)
+
+    # El PDF cacheado del texto anterior ya no se va a servir
+    if 'documento_generado' in campos_modificados:
+        pdf_cache_service.invalidar(documento_anterior)
 
     return caso
 
@@ -217,7 +291,7 @@ def eliminar_caso(
     """
     Elimina un caso
     """
-    caso = db.query(Caso).filter(
+    caso = db.query(Caso).options(*cargar_grupos(GRUPO_DOCUMENTO)).filter(
         Caso.id == caso_id,
         Caso.user_id == current_user.id
     ).first()
@@ -228,9 +302,12 @@ def eliminar_caso(
             detail="Caso no encontrado"
         )
 
+    documento = caso.documento_generado
     db.delete(caso)
     db.commit()
 
+    pdf_cache_service.invalidar(documento)
+
     return None
 
 
@@ -366,7 +443,7 @@ def validar_caso(
     El frontend usa esto para mostrar advertencias visuales en tiempo real
     en el formulario.
     """
-    caso = db.query(Caso).filter(
+    caso = db.query(Caso).options(*cargar_grupos(GRUPO_RELATO)).filter(
         Caso.id == caso_id,
         Caso.user_id == current_user.id
     ).first()
@@ -391,23 +468,25 @@ def validar_caso(
 
 
 @router.post("/{caso_id}/procesar-transcripcion", response_model=CasoResponse)
-def procesar_transcripcion(
+async def procesar_transcripcion(
     caso_id: int,
+    completo: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Procesa la transcripción de la conversación con IA y extrae datos estructurados
     para autollenar los campos del caso (hechos, derechos vulnerados, entidad, pretensiones).
+
+    Es incremental: tras la primera extracción solo se envían a GPT los mensajes
+    nuevos junto con el estado ya extraído. Con ?completo=true se reprocesa
+    toda la conversación desde cero.
     """
     # 🔍 LOG: Inicio del procesamiento
     logger.info(f"🤖 POST /casos/{caso_id}/procesar-transcripcion - Iniciando procesamiento")
     logger.info(f"   Usuario: {current_user.email}")
 
-    caso = db.query(Caso).filter(
-        Caso.id == caso_id,
-        Caso.user_id == current_user.id
-    ).first()
+    caso = await asyncio.to_thread(_buscar_caso, db, caso_id, current_user.id, *GRUPOS_RESPUESTA, GRUPO_EXTRACCION)
 
     if not caso:
         logger.error(f"❌ Caso {caso_id} no encontrado o no pertenece al usuario {current_user.email}")
@@ -421,13 +500,28 @@ def procesar_transcripcion(
     # 🔍 LOG: Consulta de mensajes
     logger.info(f"🔍 Buscando mensajes del caso {caso_id}...")
 
-    # Obtener todos los mensajes del caso ordenados por timestamp
-    mensajes = db.query(Mensaje).filter(
-        Mensaje.caso_id == caso_id
-    ).order_by(Mensaje.timestamp.asc()).all()
+    # Los mensajes que aún estén en el buffer write-behind deben entrar en la extracción
+    await mensajes_buffer_service.vaciar_para_lectura()
+
+    # 🔁 Extracción incremental: solo los mensajes posteriores al último ya procesado
+    incremental = (
+        not completo
+        and bool(caso.extraccion_estado)
+        and caso.extraccion_ultimo_mensaje_id is not None
+    )
+
+    query = db.query(Mensaje).filter(Mensaje.caso_id == caso_id)
+    if incremental:
+        query = query.filter(Mensaje.id > caso.extraccion_ultimo_mensaje_id)
+    mensajes = await asyncio.to_thread(query.order_by(Mensaje.timestamp.asc(), Mensaje.id.asc()).all)
 
     # 🔍 LOG: Resultado de la consulta
-    logger.info(f"📊 Mensajes encontrados: {len(mensajes)}")
+    logger.info(f"📊 Mensajes encontrados: {len(mensajes)}{' (nuevos)' if incremental else ''}")
+
+    if not mensajes and incremental:
+        # Nada nuevo desde la última extracción: el caso ya está al día
+        logger.info(f"✅ Sin mensajes nuevos desde el mensaje {caso.extraccion_ultimo_mensaje_id}, no se llama a GPT")
+        return caso
 
     if not mensajes:
         logger.warning(f"⚠️ NO HAY MENSAJES EN EL CASO {caso_id}")
@@ -438,7 +532,7 @@ def procesar_transcripcion(
 
         # Marcar el caso como abandonado
         caso.estado = EstadoCaso.ABANDONADO
-        db.commit()
+        await asyncio.to_thread(db.commit)
 
         logger.info(f"✅ Caso {caso_id} marcado como ABANDONADO")
         logger.info(f"   Revisar logs del AGENTE para diagnóstico:")
@@ -469,10 +563,14 @@ def procesar_transcripcion(
             for msg in mensajes
         ]
 
-        logger.info(f"🧠 Llamando a GPT-4o para extraer datos...")
+        logger.info(f"🧠 Llamando a GPT para extraer datos ({'incremental' if incremental else 'completo'})...")
 
-        # Extraer datos con IA
-        datos_extraidos = openai_service.extraer_datos_conversacion(mensajes_formateados)
+        # Extraer datos con IA (sin retener la conexión a BD si está configurado)
+        async with conexion_liberada(db):
+            datos_extraidos = await openai_service.extraer_datos_conversacion(
+                mensajes_formateados,
+                estado_previo=caso.extraccion_estado if incremental else None
+            )
 
         # 🔍 LOG: Datos extraídos completos (para debugging)
         logger.info(f"✅ Datos extraídos exitosamente - DUMP COMPLETO:")
@@ -618,15 +716,18 @@ def procesar_transcripcion(
             caso.razon_improcedencia = datos_extraidos['razon_improcedencia']
             campos_actualizados.append('razon_improcedencia')
 
+        # 🔁 Guardar estado y watermark para la próxima extracción incremental
+        caso.extraccion_estado = datos_extraidos
+        caso.extraccion_ultimo_mensaje_id = max(msg.id for msg in mensajes)
+
         logger.info(f"💾 Guardando cambios en la base de datos...")
         logger.info(f"   Campos actualizados ({len(campos_actualizados)}): {', '.join(campos_actualizados) if campos_actualizados else 'Ninguno'}")
 
-        db.commit()
-        db.refresh(caso)
+        respuesta = await asyncio.to_thread(_confirmar_caso, db, caso)
 
         logger.info(f"✅ Caso {caso_id} actualizado exitosamente")
 
-        return caso
+        return respuesta
 
     except Exception as e:
         logger.error(f"❌ Error procesando transcripción: {str(e)}")
@@ -637,34 +738,42 @@ def procesar_transcripcion(
         )
 
 
-@router.post("/{caso_id}/generar", response_model=CasoResponse)
-def generar_documento(
-    caso_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+def _buscar_caso(db: Session, caso_id: int, user_id: int, *grupos: str) -> Optional[Caso]:
     """
-    Genera el documento legal usando GPT-4 basado en los datos del caso.
-    Incluye análisis automático de calidad y jurisprudencia.
+    Caso del usuario con los grupos diferidos indicados
 
-    VALIDACIÓN ESTRICTA: Este endpoint valida que todos los campos críticos
-    estén completos y con formato válido antes de generar el documento.
+    Los handlers async lo llaman con asyncio.to_thread: la Session es sync y sus
+    consultas (y la espera por una conexión del pool) no deben correr en el event loop.
     """
-    caso = db.query(Caso).filter(
+    return db.query(Caso).options(*cargar_grupos(*grupos)).filter(
         Caso.id == caso_id,
-        Caso.user_id == current_user.id
+        Caso.user_id == user_id
     ).first()
 
-    if not caso:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Caso no encontrado"
-        )
 
+def _confirmar_caso(db: Session, caso: Caso) -> CasoResponse:
+    """
+    Commit + refresh del caso y su CasoResponse ya serializado
+
+    Para llamarlo con asyncio.to_thread: tras el refresh, serializar puede volver
+    a cargar grupos diferidos.
+    """
+    db.commit()
+    db.refresh(caso)
+    return CasoResponse.model_validate(caso)
+
+
+def _preparar_generacion(caso: Caso, db: Session) -> str:
+    """
+    Valida subsidiariedad y campos críticos antes de generar el documento.
+
+    Si la tutela no cumple subsidiariedad, cambia el caso a DERECHO DE PETICIÓN.
+    Retorna el tipo de documento final o lanza HTTP 422 con los errores.
+    """
     # ⚖️ VALIDACIÓN DE SUBSIDIARIEDAD (Art. 86 C.P. - Decreto 2591/1991)
     # Si es tutela, validar subsidiariedad y cambiar a derecho de petición si no cumple
     if caso.tipo_documento and caso.tipo_documento.value == "TUTELA":
-        logger.info(f"⚖️ Validando subsidiariedad para tutela del caso {caso_id}...")
+        logger.info(f"⚖️ Validando subsidiariedad para tutela del caso {caso.id}...")
 
         # Verificar si es_procedente_tutela fue evaluado y es False
         if caso.es_procedente_tutela is False:
@@ -700,48 +809,47 @@ def generar_documento(
             }
         )
 
-    try:
-        # Preparar datos para GPT
-        datos_caso = {
-            'nombre_solicitante': caso.nombre_solicitante,
-            'identificacion_solicitante': caso.identificacion_solicitante,
-            'direccion_solicitante': caso.direccion_solicitante,
-            'telefono_solicitante': caso.telefono_solicitante,
-            'email_solicitante': caso.email_solicitante,
-            'actua_en_representacion': caso.actua_en_representacion,
-            'nombre_representado': caso.nombre_representado,
-            'identificacion_representado': caso.identificacion_representado,
-            'relacion_representado': caso.relacion_representado,
-            'tipo_representado': caso.tipo_representado,
-            'entidad_accionada': caso.entidad_accionada,
-            'direccion_entidad': caso.direccion_entidad,
-            'hechos': caso.hechos,
-            'ciudad_de_los_hechos': caso.ciudad_de_los_hechos,
-            'derechos_vulnerados': caso.derechos_vulnerados,
-            'pretensiones': caso.pretensiones,
-            'fundamentos_derecho': caso.fundamentos_derecho,
-            'pruebas': caso.pruebas,
-        }
+    return tipo_doc
 
-        # Generar documento según el tipo (usar tipo_doc ya validado)
-        if tipo_doc == 'TUTELA':
-            documento_generado = openai_service.generar_tutela(datos_caso)
-        else:
-            documento_generado = openai_service.generar_derecho_peticion(datos_caso)
 
-        # Actualizar caso con documento generado
-        caso.documento_generado = documento_generado
-        caso.estado = EstadoCaso.GENERADO
+@router.post("/{caso_id}/generar", response_model=CasoResponse)
+async def generar_documento(
+    caso_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Genera el documento legal usando GPT-4 basado en los datos del caso.
+    Incluye análisis automático de calidad y jurisprudencia.
 
-        # 📅 NUEVO - Calcular fecha de vencimiento (14 días desde ahora)
-        caso.fecha_vencimiento = datetime.utcnow() + timedelta(days=14)
+    VALIDACIÓN ESTRICTA: Este endpoint valida que todos los campos críticos
+    estén completos y con formato válido antes de generar el documento.
+    """
+    caso = await asyncio.to_thread(_buscar_caso, db, caso_id, current_user.id, *GRUPOS_RESPUESTA)
 
-        db.commit()
-        db.refresh(caso)
+    if not caso:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Caso no encontrado"
+        )
+
+    tipo_doc = await asyncio.to_thread(_preparar_generacion, caso, db)
+
+    try:
+        # Preparar datos para GPT y generar documento según el tipo (usar tipo_doc ya validado)
+        datos_caso = await asyncio.to_thread(generacion_service.construir_datos_caso, caso)
+        async with conexion_liberada(db):
+            documento_generado = await generacion_service.generar_texto_documento(tipo_doc, datos_caso, caso.id)
+
+        # Actualizar caso con documento generado
+        # 📅 Incluye fecha de vencimiento (14 días desde ahora)
+        await asyncio.to_thread(generacion_service.aplicar_documento_generado, caso, documento_generado, db)
+
+        respuesta = await asyncio.to_thread(_confirmar_caso, db, caso)
 
         logger.info(f"✅ Documento generado exitosamente - Vence: {caso.fecha_vencimiento}")
 
-        return caso
+        return respuesta
 
     except Exception as e:
         raise HTTPException(
@@ -750,6 +858,184 @@ def generar_documento(
         )
 
 
+@router.post("/{caso_id}/generar/async", status_code=status.HTTP_202_ACCEPTED)
+async def generar_documento_async(
+    caso_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    ⚙️ Encola la generación del documento y retorna inmediatamente (HTTP 202)
+
+    Aplica las mismas validaciones que POST /{caso_id}/generar. La generación corre
+    en el pool de workers de generacion_service, sin retener la conexión de BD
+    de esta petición. El progreso se consulta en GET /{caso_id}/generar/{trabajo_id}.
+    """
+    caso = await asyncio.to_thread(_buscar_caso, db, caso_id, current_user.id, GRUPO_RELATO)
+
+    if not caso:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Caso no encontrado"
+        )
+
+    tipo_doc = await asyncio.to_thread(_preparar_generacion, caso, db)
+    datos_caso = await asyncio.to_thread(generacion_service.construir_datos_caso, caso)
+
+    trabajo = generacion_service.encolar_generacion(caso.id, current_user.id, tipo_doc, datos_caso)
+
+    return generacion_service.serializar_trabajo(trabajo)
+
+
+@router.post("/{caso_id}/generar/stream")
+async def generar_documento_stream(
+    caso_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    📡 Genera el documento y lo transmite token a token como Server-Sent Events
+
+    Eventos emitidos:
+    - trabajo: datos del trabajo de generación (primer evento)
+    - fragmento: {"texto": "..."} a medida que OpenAI produce el documento
+    - fin: el documento quedó guardado como versión nueva del caso
+    - error: {"detail": "..."} si la generación falló
+
+    La generación corre en el pool de generacion_service: si el cliente se
+    desconecta, el trabajo continúa y el documento se guarda igual.
+    """
+    caso = await asyncio.to_thread(_buscar_caso, db, caso_id, current_user.id, GRUPO_RELATO)
+
+    if not caso:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Caso no encontrado"
+        )
+
+    tipo_doc = await asyncio.to_thread(_preparar_generacion, caso, db)
+    datos_caso = await asyncio.to_thread(generacion_service.construir_datos_caso, caso)
+
+    trabajo = generacion_service.encolar_generacion(
+        caso.id, current_user.id, tipo_doc, datos_caso, stream=True
+    )
+    cola = generacion_service.suscribir(trabajo)
+
+    async def eventos():
+        try:
+            yield _evento_sse("trabajo", generacion_service.serializar_trabajo(trabajo))
+
+            while True:
+                evento, dato = await cola.get()
+
+                if evento == "fragmento":
+                    yield _evento_sse("fragmento", {"texto": dato})
+                elif evento == "fin":
+                    yield _evento_sse("fin", generacion_service.serializar_trabajo(trabajo))
+                    break
+                else:
+                    yield _evento_sse("error", {"detail": f"Error generando documento: {dato}"})
+                    break
+        finally:
+            # Cliente desconectado o stream terminado: el trabajo sigue su curso
+            generacion_service.desuscribir(trabajo, cola)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Evitar buffering en proxies (nginx)
+        }
+    )
+
+
+def _evento_sse(evento: str, datos: dict) -> str:
+    """
+    Formatea un evento Server-Sent Events
+    """
+    return f"event: {evento}\ndata: {json.dumps(datos, default=str, ensure_ascii=False)}\n\n"
+
+
+@router.get("/{caso_id}/generar/{trabajo_id}")
+def obtener_estado_generacion(
+    caso_id: int,
+    trabajo_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Retorna el estado de un trabajo de generación (pendiente, en_proceso, completado, error)
+
+    Cuando el estado es "completado", el documento ya está en el caso
+    (GET /casos/{caso_id} o GET /casos/{caso_id}/documento).
+    """
+    trabajo = generacion_service.obtener_trabajo(trabajo_id)
+
+    if not trabajo or trabajo["caso_id"] != caso_id or trabajo["user_id"] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trabajo de generación no encontrado"
+        )
+
+    return generacion_service.serializar_trabajo(trabajo)
+
+
+@router.post("/{caso_id}/analizar", status_code=status.HTTP_202_ACCEPTED)
+async def analizar_documento(
+    caso_id: int,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    🔬 Lanza el análisis de IA del documento generado (HTTP 202)
+
+    Valida jurisprudencia, calidad del documento y fortaleza del caso en paralelo
+    y guarda el resultado en analisis_jurisprudencia, analisis_calidad,
+    analisis_fortaleza y sugerencias_mejora. Los resultados aparecen en
+    GET /casos/{caso_id} cuando termina.
+    """
+    caso = await asyncio.to_thread(_buscar_caso, db, caso_id, current_user.id)
+
+    if not caso:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Caso no encontrado"
+        )
+
+    if not caso.tiene_documento:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El caso no tiene documento generado para analizar"
+        )
+
+    if analisis_caso_service.esta_en_proceso(caso.id):
+        return {"caso_id": caso.id, "estado": "en_proceso", "mensaje": "El análisis ya está en curso"}
+
+    logger.info(f"🔬 POST /casos/{caso_id}/analizar - Análisis encolado")
+    background_tasks.add_task(analisis_caso_service.analizar_caso, caso.id)
+
+    return {"caso_id": caso.id, "estado": "en_proceso", "mensaje": "Análisis iniciado"}
+
+
+# Todos los grupos diferidos: lo que _caso_completo serializa
+GRUPOS_CASO_COMPLETO = (*GRUPOS_RESPUESTA, GRUPO_REEMBOLSOS, GRUPO_EXTRACCION)
+
+
+def _caso_completo(caso: Caso) -> dict:
+    """
+    Todas las columnas del caso más el documento y el análisis vigentes
+
+    Es la forma en que simular-pago devolvía el caso cuando el documento y el
+    análisis eran columnas de casos (la fila completa).
+    """
+    datos = {columna.key: getattr(caso, columna.key) for columna in inspect(Caso).column_attrs}
+    for campo in ("documento_generado", "analisis_fortaleza", "analisis_calidad",
+                  "analisis_jurisprudencia", "sugerencias_mejora"):
+        datos[campo] = getattr(caso, campo)
+    return datos
+
+
 @router.post("/{caso_id}/simular-pago")
 def simular_pago(
     caso_id: int,
@@ -770,10 +1056,7 @@ def simular_pago(
     """
     logger.info(f"🧪 POST /casos/{caso_id}/simular-pago - Usuario: {current_user.email}")
 
-    caso = db.query(Caso).filter(
-        Caso.id == caso_id,
-        Caso.user_id == current_user.id
-    ).first()
+    caso = _buscar_caso(db, caso_id, current_user.id, *GRUPOS_CASO_COMPLETO)
 
     if not caso:
         raise HTTPException(
@@ -781,7 +1064,7 @@ def simular_pago(
             detail="Caso no encontrado"
         )
 
-    if not caso.documento_generado:
+    if not caso.tiene_documento:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No hay documento generado para desbloquear"
@@ -793,7 +1076,7 @@ def simular_pago(
         return {
             "success": True,
             "message": "Documento ya estaba desbloqueado",
-            "caso": caso,
+            "caso": _caso_completo(caso),
             "pago_existente": True
         }
 
@@ -817,7 +1100,7 @@ def simular_pago(
         return {
             "success": True,
             "message": "Pago procesado exitosamente",
-            "caso": caso,
+            "caso": _caso_completo(caso),
             "pago": {
                 "id": pago.id,
                 "monto": float(pago.monto),
@@ -861,7 +1144,7 @@ def obtener_documento(
     - descarga_habilitada: Si puede descargar PDF
     - fecha_pago: Fecha de desbloqueo (si aplica)
     """
-    caso = db.query(Caso).filter(
+    caso = db.query(Caso).options(*cargar_grupos(GRUPO_DOCUMENTO)).filter(
         Caso.id == caso_id,
         Caso.user_id == current_user.id
     ).first()
@@ -916,20 +1199,104 @@ def obtener_documento(
         }
 
 
-@router.get("/{caso_id}/descargar/pdf")
-def descargar_pdf(
+@router.get("/{caso_id}/documento/versiones", response_model=List[DocumentoVersionResponse])
+def listar_versiones_documento(
     caso_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Descarga el documento generado como PDF
+    Lista las versiones del documento del caso (sin el texto), de la más antigua a la vigente
+    """
+    caso = db.query(Caso).filter(
+        Caso.id == caso_id,
+        Caso.user_id == current_user.id
+    ).first()
+
+    if not caso:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Caso no encontrado"
+        )
+
+    return [
+        DocumentoVersionResponse(
+            version=documento.version,
+            hash_contenido=documento.hash_contenido,
+            origen=documento.origen,
+            metadatos_render=documento.metadatos_render,
+            vigente=documento.version == caso.documento_version,
+            created_at=documento.created_at
+        )
+        for documento in versiones_service.listar_versiones(db, caso.id)
+    ]
+
+
+@router.get("/{caso_id}/documento/diff")
+def comparar_versiones_documento(
+    caso_id: int,
+    desde: int = Query(..., ge=1, description="Versión anterior"),
+    hasta: Optional[int] = Query(None, ge=1, description="Versión nueva (por defecto, la vigente)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Diff unificado (por líneas) entre dos versiones del documento
+
+    Muestra el texto del documento, así que exige el documento desbloqueado.
     """
     caso = db.query(Caso).filter(
         Caso.id == caso_id,
         Caso.user_id == current_user.id
     ).first()
 
+    if not caso:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Caso no encontrado"
+        )
+
+    # 🔒 VALIDACIÓN DE PAYWALL
+    if not caso.documento_desbloqueado:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="El documento está bloqueado. Debes realizar el pago para ver sus versiones."
+        )
+
+    hasta = hasta or caso.documento_version
+    anterior = versiones_service.obtener_version(db, caso.id, desde)
+    nuevo = versiones_service.obtener_version(db, caso.id, hasta) if hasta else None
+    if not anterior or not nuevo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Versión del documento no encontrada"
+        )
+
+    lineas = versiones_service.diferencia(anterior, nuevo)
+    return {
+        "caso_id": caso.id,
+        "desde": anterior.version,
+        "hasta": nuevo.version,
+        "sin_cambios": not lineas,
+        "diff": "\n".join(lineas)
+    }
+
+
+@router.get("/{caso_id}/descargar/pdf")
+async def descargar_pdf(
+    caso_id: int,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Descarga el documento generado como PDF
+
+    El PDF se renderiza una sola vez por texto de documento y se sirve desde el
+    caché en disco. Soporta If-None-Match (304) y descargas por rangos (Range).
+    """
+    caso = await asyncio.to_thread(_buscar_caso, db, caso_id, current_user.id, GRUPO_DOCUMENTO)
+
     if not caso:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -949,21 +1316,38 @@ def descargar_pdf(
             detail="El documento está bloqueado. Debes realizar el pago para descargarlo."
         )
 
+    # El navegador ya tiene esta versión exacta del PDF
+    etag = pdf_cache_service.calcular_etag(caso.documento_generado)
+    headers_cache = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in [valor.strip() for valor in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers_cache)
+
     try:
-        # Generar PDF
-        pdf_buffer = document_service.generar_pdf(
-            caso.documento_generado,
-            caso.nombre_solicitante or "documento"
-        )
+        # PDF desde el caché en disco (un miss se renderiza en el pool de procesos)
+        ruta_pdf, etag = await pdf_cache_service.obtener_pdf_async(caso.documento_generado)
 
         # Nombre del archivo según el tipo de documento
         tipo_doc_nombre = "tutela" if caso.tipo_documento.value == "TUTELA" else "derecho_peticion"
         filename = f"{tipo_doc_nombre}_{caso.nombre_solicitante or 'documento'}_{caso.id}.pdf"
 
-        return StreamingResponse(
-            pdf_buffer,
+        return FileResponse(
+            ruta_pdf,
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers={"Content-Disposition": f"attachment; filename={filename}", **headers_cache}
+        )
+
+    except pdf_render_service.ColaRenderLlenaError:
+        logger.warning(f"⚠️ Cola de render de PDF llena - Caso: {caso_id}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Hay muchas descargas en proceso. Intenta de nuevo en unos segundos.",
+            headers={"Retry-After": "5"}
+        )
+
+    except pdf_render_service.TimeoutRenderError as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
         )
 
     except Exception as e:
@@ -973,6 +1357,68 @@ def descargar_pdf(
         )
 
 
+@router.get("/{caso_id}/descargar/docx")
+async def descargar_docx(
+    caso_id: int,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Descarga el documento generado como Word (.docx)
+
+    Se renderiza desde los mismos bloques parseados que el PDF y se envía por
+    partes (streaming). Soporta If-None-Match (304).
+    """
+    caso = await asyncio.to_thread(_buscar_caso, db, caso_id, current_user.id, GRUPO_DOCUMENTO)
+
+    if not caso:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Caso no encontrado"
+        )
+
+    if not caso.documento_generado:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El caso no tiene un documento generado"
+        )
+
+    # 🔒 VALIDACIÓN DE PAYWALL
+    if not caso.documento_desbloqueado:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="El documento está bloqueado. Debes realizar el pago para descargarlo."
+        )
+
+    etag = document_service.calcular_etag_docx(caso.documento_generado)
+    headers_cache = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in [valor.strip() for valor in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers_cache)
+
+    try:
+        buffer = await asyncio.to_thread(document_service.generar_docx, caso.documento_generado)
+
+        tipo_doc_nombre = "tutela" if caso.tipo_documento.value == "TUTELA" else "derecho_peticion"
+        filename = f"{tipo_doc_nombre}_{caso.nombre_solicitante or 'documento'}_{caso.id}.docx"
+
+        return StreamingResponse(
+            document_service.iterar_buffer(buffer),
+            media_type=document_service.RenderizadorDOCX.MEDIA_TYPE,
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}",
+                "Content-Length": str(buffer.getbuffer().nbytes),
+                **headers_cache
+            }
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generando DOCX: {str(e)}"
+        )
+
+
 @router.post("/{caso_id}/solicitar-reembolso")
 async def solicitar_reembolso(
     caso_id: int,
@@ -995,7 +1441,7 @@ async def solicitar_reembolso(
     logger.info(f"💸 POST /casos/{caso_id}/solicitar-reembolso - Usuario: {current_user.email}")
 
     # Verificar que el caso existe y pertenece al usuario
-    caso = db.query(Caso).filter(
+    caso = db.query(Caso).options(*cargar_grupos(GRUPO_REEMBOLSOS)).filter(
         Caso.id == caso_id,
         Caso.user_id == current_user.id
     ).first()
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
 from typing import List
 import logging
 
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_async_db
 from ..models.mensaje import Mensaje
 from ..models.caso import Caso
-from ..schemas.mensaje import MensajeCreate, MensajeResponse
+from ..schemas.mensaje import MensajeCreate, MensajeResponse, MensajeLoteCreate, MensajeLoteResponse
+from ..services import mensajes_buffer_service, canal_mensajes_service
 
 router = APIRouter(prefix="/mensajes", tags=["Mensajes"])
 logger = logging.getLogger(__name__)
@@ -15,7 +20,7 @@ logger = logging.getLogger(__name__)
 @router.post("/", response_model=MensajeResponse)
 async def crear_mensaje(
     mensaje: MensajeCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     🎯 ENDPOINT CRÍTICO - Webhook para guardar mensajes
@@ -23,58 +28,118 @@ async def crear_mensaje(
     El agente llama este endpoint cada vez que hay:
     - Un mensaje del usuario (STT)
     - Una respuesta del asistente
+
+    Con MENSAJES_WRITE_BEHIND el mensaje se anota en el diario del buffer y se
+    inserta en el siguiente lote (responde 202, sin id).
     """
     # 🔍 LOG: Petición recibida
-    logger.info(f"📨 POST /mensajes/ - Nueva petición recibida")
-    logger.info(f"   Caso ID: {mensaje.caso_id}")
-    logger.info(f"   Remitente: {mensaje.remitente}")
-    logger.info(f"   Longitud texto: {len(mensaje.texto)} caracteres")
-    logger.info(f"   Texto preview: '{mensaje.texto[:100]}...'")
+    logger.info(f"📨 POST /mensajes/ - Caso {mensaje.caso_id} - {mensaje.remitente} - {len(mensaje.texto)} caracteres")
+    logger.debug(f"   Texto preview: '{mensaje.texto[:100]}...'")
 
-    # Verificar que el caso existe
-    caso = db.query(Caso).filter(Caso.id == mensaje.caso_id).first()
-    if not caso:
+    # Verificar que el caso existe (solo la clave, sin cargar la fila completa)
+    caso_user_id = await db.scalar(select(Caso.user_id).where(Caso.id == mensaje.caso_id))
+    if caso_user_id is None:
         logger.error(f"❌ Caso {mensaje.caso_id} no encontrado en la base de datos")
         raise HTTPException(status_code=404, detail="Caso no encontrado")
 
-    logger.info(f"✅ Caso {mensaje.caso_id} encontrado - User ID: {caso.user_id}")
+    if mensajes_buffer_service.esta_activo():
+        fila = await mensajes_buffer_service.encolar(mensaje.model_dump(exclude_none=True))
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"encolado": True, "caso_id": mensaje.caso_id, "timestamp": fila["timestamp"].isoformat()}
+        )
 
     try:
-        nuevo_mensaje = Mensaje(**mensaje.model_dump())
+        nuevo_mensaje = Mensaje(**mensaje.model_dump(exclude_none=True))
         db.add(nuevo_mensaje)
-        db.commit()
-        db.refresh(nuevo_mensaje)
+        await db.commit()
+        await db.refresh(nuevo_mensaje)
 
         logger.info(f"✅ Mensaje guardado exitosamente - ID: {nuevo_mensaje.id}")
-        logger.info(f"   Timestamp: {nuevo_mensaje.timestamp}")
-
-        # 🔍 LOG: Contar mensajes totales del caso
-        total_mensajes = db.query(Mensaje).filter(Mensaje.caso_id == mensaje.caso_id).count()
-        logger.info(f"📊 Total mensajes del caso {mensaje.caso_id}: {total_mensajes}")
 
         return nuevo_mensaje
 
     except Exception as e:
         logger.error(f"❌ Error al guardar mensaje en BD: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error al guardar mensaje: {str(e)}")
 
 
+@router.post("/lote", response_model=MensajeLoteResponse)
+async def crear_mensajes_lote(
+    lote: MensajeLoteCreate,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Webhook por lotes: guarda varios mensajes (de uno o varios casos) con un solo INSERT
+
+    Es todo o nada: si algún caso no existe no se guarda ninguno (404 con los ids faltantes).
+    """
+    if not lote.mensajes:
+        return {"insertados": 0, "ids": []}
+
+    if len(lote.mensajes) > settings.MENSAJES_LOTE_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo {settings.MENSAJES_LOTE_MAX} mensajes por lote"
+        )
+
+    casos_solicitados = {mensaje.caso_id for mensaje in lote.mensajes}
+    resultado = await db.execute(select(Caso.id).where(Caso.id.in_(casos_solicitados)))
+    faltantes = casos_solicitados - set(resultado.scalars())
+    if faltantes:
+        raise HTTPException(status_code=404, detail=f"Casos no encontrados: {sorted(faltantes)}")
+
+    # Timestamps crecientes dentro del lote para conservar el orden de la conversación
+    ahora = datetime.utcnow()
+    filas = [
+        {**mensaje.model_dump(exclude_none=True), "timestamp": mensaje.timestamp or ahora + timedelta(microseconds=i)}
+        for i, mensaje in enumerate(lote.mensajes)
+    ]
+
+    try:
+        ids = await db.run_sync(lambda sesion: mensajes_buffer_service.insertar_lote(sesion.connection(), filas))
+        await db.commit()
+    except Exception as e:
+        logger.error(f"❌ Error al guardar lote de mensajes: {str(e)}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al guardar mensajes: {str(e)}")
+
+    logger.info(f"📨 POST /mensajes/lote - {len(ids)} mensajes guardados en {len(casos_solicitados)} casos")
+
+    return {"insertados": len(ids), "ids": ids}
+
+
+@router.websocket("/ws/{caso_id}")
+async def canal_mensajes(websocket: WebSocket, caso_id: int):
+    """
+    Canal persistente del agente para un caso: recibe los mensajes de la
+    conversación con número de secuencia, los guarda en micro-lotes, los confirma
+    en orden y envía avisos de límite de sesión (ver canal_mensajes_service)
+    """
+    await websocket.accept()
+    await canal_mensajes_service.CanalMensajes(websocket, caso_id).ejecutar()
+
+
 @router.get("/caso/{caso_id}", response_model=List[MensajeResponse])
 async def obtener_mensajes_caso(
     caso_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtiene todos los mensajes de un caso ordenados por timestamp
     """
     # Verificar que el caso existe
-    caso = db.query(Caso).filter(Caso.id == caso_id).first()
-    if not caso:
+    caso_existe = await db.scalar(select(Caso.id).where(Caso.id == caso_id))
+    if caso_existe is None:
         raise HTTPException(status_code=404, detail="Caso no encontrado")
 
-    mensajes = db.query(Mensaje).filter(
-        Mensaje.caso_id == caso_id
-    ).order_by(Mensaje.timestamp).all()
+    # Incluir lo que aún esté en el buffer write-behind
+    await mensajes_buffer_service.vaciar_para_lectura()
+
+    resultado = await db.execute(
+        select(Mensaje).where(Mensaje.caso_id == caso_id).order_by(Mensaje.timestamp, Mensaje.id)
+    )
+    mensajes = resultado.scalars().all()
 
     return mensajes
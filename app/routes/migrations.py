@@ -4,9 +4,10 @@ Este endpoint se puede eliminar después de aplicar las migraciones
 """
 
 from fastapi import APIRouter, HTTPException, Header
-from sqlalchemy import text, inspect
+from sqlalchemy import JSON, DateTime, Integer, Text, column, insert, table, text, inspect, update
 from app.core.database import engine
 from app.core.config import settings
+from app.models import Analisis, Documento
 from typing import Dict, Any
 import logging
 
@@ -24,6 +25,96 @@ def column_exists(inspector, table_name: str, column_name: str) -> bool:
         return False
 
 
+def index_exists(inspector, table_name: str, index_name: str) -> bool:
+    """Verifica si un índice existe en una tabla"""
+    try:
+        return any(indice['name'] == index_name for indice in inspector.get_indexes(table_name))
+    except Exception:
+        return False
+
+
+# Columnas de casos que pasaron a las tablas documentos y analisis (migración 7)
+COLUMNAS_DOCUMENTO_LEGACY = [
+    'documento_generado', 'analisis_fortaleza', 'analisis_calidad',
+    'analisis_jurisprudencia', 'sugerencias_mejora'
+]
+
+_casos_legacy = table(
+    'casos',
+    column('id', Integer),
+    column('documento_generado', Text),
+    column('documento_version', Integer),
+    column('analisis_fortaleza', JSON),
+    column('analisis_calidad', JSON),
+    column('analisis_jurisprudencia', JSON),
+    column('sugerencias_mejora', JSON),
+    column('updated_at', DateTime),
+)
+
+
+def migrar_documentos_legacy(conn, lote: int = 200) -> Dict[str, int]:
+    """
+    Copia documento_generado y analisis_* de casos a las tablas versionadas como versión 1
+
+    Procesa por lotes y confirma cada lote; solo toma casos con documento y sin
+    documento_version, así que se puede repetir si se interrumpe.
+    """
+    from app.services.versiones_service import calcular_hash, metadatos_render
+
+    totales = {"documentos": 0, "analisis": 0}
+    while True:
+        filas = conn.execute(
+            _casos_legacy.select().where(
+                _casos_legacy.c.documento_generado.isnot(None),
+                _casos_legacy.c.documento_generado != '',
+                _casos_legacy.c.documento_version.is_(None)
+            ).order_by(_casos_legacy.c.id).limit(lote)
+        ).all()
+        if not filas:
+            return totales
+
+        conn.execute(insert(Documento.__table__), [
+            {
+                "caso_id": fila.id,
+                "version": 1,
+                "contenido": fila.documento_generado,
+                "hash_contenido": calcular_hash(fila.documento_generado),
+                "origen": "migracion",
+                "metadatos_render": metadatos_render(),
+                "created_at": fila.updated_at,
+            }
+            for fila in filas
+        ])
+
+        analisis = [
+            {
+                "caso_id": fila.id,
+                "documento_version": 1,
+                "fortaleza": fila.analisis_fortaleza,
+                "calidad": fila.analisis_calidad,
+                "jurisprudencia": fila.analisis_jurisprudencia,
+                "sugerencias": fila.sugerencias_mejora,
+                "created_at": fila.updated_at,
+                "updated_at": fila.updated_at,
+            }
+            for fila in filas
+            if any((fila.analisis_fortaleza, fila.analisis_calidad, fila.analisis_jurisprudencia, fila.sugerencias_mejora))
+        ]
+        if analisis:
+            conn.execute(insert(Analisis.__table__), analisis)
+
+        conn.execute(
+            update(_casos_legacy)
+            .where(_casos_legacy.c.id.in_([fila.id for fila in filas]))
+            .values(documento_version=1)
+        )
+        conn.commit()
+
+        totales["documentos"] += len(filas)
+        totales["analisis"] += len(analisis)
+        logger.info(f"Documentos migrados: {totales['documentos']} (análisis: {totales['analisis']})")
+
+
 @router.post("/apply")
 async def apply_migrations(
     x_migration_secret: str = Header(None, description="Clave secreta para autorizar migraciones")
@@ -38,6 +129,12 @@ async def apply_migrations(
     - Eliminar campo representante_legal
     - Agregar campo documento_desbloqueado
     - Agregar campo fecha_pago
+    - Agregar campo visto_por_usuario
+    - Agregar campos de extracción incremental (extraccion_estado, extraccion_ultimo_mensaje_id)
+    - Agregar campo mensajes.seq e índice único (caso_id, seq)
+    - Crear índice del listado de casos (user_id, updated_at DESC, id)
+    - Mover documentos y análisis a las tablas versionadas documentos / analisis
+    - Unificar registros duplicados de sesiones_diarias e índice único (user_id, fecha)
     """
 
     # Validar clave secreta (usando la SECRET_KEY del .env)
@@ -153,6 +250,212 @@ async def apply_migrations(
                 results["migrations_skipped"].append("visto_por_usuario ya existe")
                 logger.info("Campo 'visto_por_usuario' ya existe, saltando...")
 
+            # =========================================================
+            # MIGRACIÓN 4: Extracción incremental de transcripción (18-oct-2026)
+            # =========================================================
+
+            # 4.1. Agregar campo extraccion_estado
+            if not column_exists(inspector, 'casos', 'extraccion_estado'):
+                logger.info("Agregando campo 'extraccion_estado'...")
+                conn.execute(text("""
+                    ALTER TABLE casos
+                    ADD COLUMN extraccion_estado JSON
+                """))
+                conn.commit()
+                results["migrations_applied"].append("extraccion_estado agregado")
+                logger.info("Campo 'extraccion_estado' agregado exitosamente")
+                # Refrescar inspector
+                inspector = inspect(engine)
+            else:
+                results["migrations_skipped"].append("extraccion_estado ya existe")
+                logger.info("Campo 'extraccion_estado' ya existe, saltando...")
+
+            # 4.2. Agregar campo extraccion_ultimo_mensaje_id
+            if not column_exists(inspector, 'casos', 'extraccion_ultimo_mensaje_id'):
+                logger.info("Agregando campo 'extraccion_ultimo_mensaje_id'...")
+                conn.execute(text("""
+                    ALTER TABLE casos
+                    ADD COLUMN extraccion_ultimo_mensaje_id INTEGER
+                """))
+                conn.commit()
+                results["migrations_applied"].append("extraccion_ultimo_mensaje_id agregado")
+                logger.info("Campo 'extraccion_ultimo_mensaje_id' agregado exitosamente")
+                # Refrescar inspector
+                inspector = inspect(engine)
+            else:
+                results["migrations_skipped"].append("extraccion_ultimo_mensaje_id ya existe")
+                logger.info("Campo 'extraccion_ultimo_mensaje_id' ya existe, saltando...")
+
+            # =========================================================
+            # MIGRACIÓN 5: Número de secuencia de mensajes del canal WebSocket (18-oct-2026)
+            # =========================================================
+
+            # 5.1. Agregar campo seq a mensajes
+            if not column_exists(inspector, 'mensajes', 'seq'):
+                logger.info("Agregando campo 'mensajes.seq'...")
+                conn.execute(text("""
+                    ALTER TABLE mensajes
+                    ADD COLUMN seq INTEGER
+                """))
+                conn.commit()
+                results["migrations_applied"].append("mensajes.seq agregado")
+                logger.info("Campo 'mensajes.seq' agregado exitosamente")
+                # Refrescar inspector
+                inspector = inspect(engine)
+            else:
+                results["migrations_skipped"].append("mensajes.seq ya existe")
+                logger.info("Campo 'mensajes.seq' ya existe, saltando...")
+
+            # 5.2. Índice único (caso_id, seq): un reenvío tras reconexión no duplica mensajes
+            if not index_exists(inspector, 'mensajes', 'uq_mensajes_caso_seq'):
+                logger.info("Creando índice 'uq_mensajes_caso_seq'...")
+                conn.execute(text("""
+                    CREATE UNIQUE INDEX uq_mensajes_caso_seq
+                    ON mensajes (caso_id, seq)
+                """))
+                conn.commit()
+                results["migrations_applied"].append("uq_mensajes_caso_seq creado")
+                logger.info("Índice 'uq_mensajes_caso_seq' creado exitosamente")
+                inspector = inspect(engine)
+            else:
+                results["migrations_skipped"].append("uq_mensajes_caso_seq ya existe")
+                logger.info("Índice 'uq_mensajes_caso_seq' ya existe, saltando...")
+
+            # =========================================================
+            # MIGRACIÓN 6: Índice del listado de casos paginado por cursor (18-oct-2026)
+            # =========================================================
+
+            # 6.1. Índice compuesto (user_id, updated_at DESC, id) para GET /casos/
+            if not index_exists(inspector, 'casos', 'ix_casos_user_updated_id'):
+                logger.info("Creando índice 'ix_casos_user_updated_id'...")
+                conn.execute(text("""
+                    CREATE INDEX ix_casos_user_updated_id
+                    ON casos (user_id, updated_at DESC, id)
+                """))
+                conn.commit()
+                results["migrations_applied"].append("ix_casos_user_updated_id creado")
+                logger.info("Índice 'ix_casos_user_updated_id' creado exitosamente")
+                inspector = inspect(engine)
+            else:
+                results["migrations_skipped"].append("ix_casos_user_updated_id ya existe")
+                logger.info("Índice 'ix_casos_user_updated_id' ya existe, saltando...")
+
+            # =========================================================
+            # MIGRACIÓN 7: Documentos y análisis en tablas versionadas (18-oct-2026)
+            # =========================================================
+
+            # 7.1. Crear tablas documentos y analisis
+            for tabla in (Documento.__table__, Analisis.__table__):
+                if not inspector.has_table(tabla.name):
+                    logger.info(f"Creando tabla '{tabla.name}'...")
+                    tabla.create(bind=conn)
+                    conn.commit()
+                    results["migrations_applied"].append(f"tabla {tabla.name} creada")
+                    logger.info(f"Tabla '{tabla.name}' creada exitosamente")
+                    inspector = inspect(engine)
+                else:
+                    results["migrations_skipped"].append(f"tabla {tabla.name} ya existe")
+                    logger.info(f"Tabla '{tabla.name}' ya existe, saltando...")
+
+            # 7.2. Agregar campo documento_version (versión vigente del documento)
+            if not column_exists(inspector, 'casos', 'documento_version'):
+                logger.info("Agregando campo 'documento_version'...")
+                conn.execute(text("""
+                    ALTER TABLE casos
+                    ADD COLUMN documento_version INTEGER
+                """))
+                conn.commit()
+                results["migrations_applied"].append("documento_version agregado")
+                logger.info("Campo 'documento_version' agregado exitosamente")
+                inspector = inspect(engine)
+            else:
+                results["migrations_skipped"].append("documento_version ya existe")
+                logger.info("Campo 'documento_version' ya existe, saltando...")
+
+            # 7.3. Copiar documentos y análisis existentes a las tablas nuevas (versión 1)
+            if column_exists(inspector, 'casos', 'documento_generado'):
+                logger.info("Migrando documentos existentes a la tabla 'documentos'...")
+                totales = migrar_documentos_legacy(conn)
+                results["migrations_applied"].append(
+                    f"{totales['documentos']} documentos y {totales['analisis']} análisis migrados"
+                )
+
+                # 7.4. Eliminar las columnas anchas de casos, solo si todo quedó copiado
+                pendientes = conn.execute(text("""
+                    SELECT COUNT(*) FROM casos
+                    WHERE documento_generado IS NOT NULL
+                    AND documento_generado != ''
+                    AND documento_version IS NULL
+                """)).scalar()
+
+                if pendientes:
+                    results["errors"].append(f"{pendientes} casos sin migrar; columnas antiguas conservadas")
+                    logger.error(f"{pendientes} casos sin migrar, no se eliminan las columnas antiguas")
+                else:
+                    for columna in COLUMNAS_DOCUMENTO_LEGACY:
+                        if column_exists(inspector, 'casos', columna):
+                            logger.info(f"Eliminando campo '{columna}'...")
+                            conn.execute(text(f"ALTER TABLE casos DROP COLUMN {columna}"))
+                            conn.commit()
+                            results["migrations_applied"].append(f"{columna} eliminado")
+                            logger.info(f"Campo '{columna}' eliminado exitosamente")
+                    inspector = inspect(engine)
+            else:
+                results["migrations_skipped"].append("documentos ya migrados")
+                logger.info("Documentos ya migrados, saltando...")
+
+            # =========================================================
+            # MIGRACIÓN 8: Un registro de sesiones_diarias por usuario y día (18-oct-2026)
+            # =========================================================
+
+            if not index_exists(inspector, 'sesiones_diarias', 'uq_sesiones_diarias_user_fecha'):
+                # 8.1. Unificar duplicados (creados por finalizaciones concurrentes):
+                # la fila de menor id se queda con la suma de los contadores
+                logger.info("Unificando registros duplicados de 'sesiones_diarias'...")
+                conn.execute(text("""
+                    UPDATE sesiones_diarias
+                    SET sesiones_creadas = (
+                            SELECT SUM(s2.sesiones_creadas) FROM sesiones_diarias s2
+                            WHERE s2.user_id = sesiones_diarias.user_id AND s2.fecha = sesiones_diarias.fecha
+                        ),
+                        minutos_consumidos = (
+                            SELECT SUM(s2.minutos_consumidos) FROM sesiones_diarias s2
+                            WHERE s2.user_id = sesiones_diarias.user_id AND s2.fecha = sesiones_diarias.fecha
+                        ),
+                        sesiones_extra_bonus = (
+                            SELECT MAX(s2.sesiones_extra_bonus) FROM sesiones_diarias s2
+                            WHERE s2.user_id = sesiones_diarias.user_id AND s2.fecha = sesiones_diarias.fecha
+                        )
+                    WHERE id IN (
+                        SELECT MIN(id) FROM sesiones_diarias
+                        GROUP BY user_id, fecha
+                        HAVING COUNT(*) > 1
+                    )
+                """))
+                eliminados = conn.execute(text("""
+                    DELETE FROM sesiones_diarias
+                    WHERE id NOT IN (
+                        SELECT MIN(id) FROM sesiones_diarias
+                        GROUP BY user_id, fecha
+                    )
+                """)).rowcount
+
+                # 8.2. Índice único (user_id, fecha) para el upsert de contadores
+                logger.info("Creando índice 'uq_sesiones_diarias_user_fecha'...")
+                conn.execute(text("""
+                    CREATE UNIQUE INDEX uq_sesiones_diarias_user_fecha
+                    ON sesiones_diarias (user_id, fecha)
+                """))
+                conn.commit()
+                results["migrations_applied"].append(
+                    f"uq_sesiones_diarias_user_fecha creado ({eliminados} duplicados unificados)"
+                )
+                logger.info("Índice 'uq_sesiones_diarias_user_fecha' creado exitosamente")
+                inspector = inspect(engine)
+            else:
+                results["migrations_skipped"].append("uq_sesiones_diarias_user_fecha ya existe")
+                logger.info("Índice 'uq_sesiones_diarias_user_fecha' ya existe, saltando...")
+
             # Verificación final
             final_inspector = inspect(engine)
             final_columns = [col['name'] for col in final_inspector.get_columns('casos')]
@@ -185,15 +488,29 @@ async def get_migration_status() -> Dict[str, Any]:
         inspector = inspect(engine)
         columns = [col['name'] for col in inspector.get_columns('casos')]
 
+        columnas_mensajes = [col['name'] for col in inspector.get_columns('mensajes')]
+
         required_columns = {
             'ciudad_de_los_hechos': 'ciudad_de_los_hechos' in columns,
             'documento_desbloqueado': 'documento_desbloqueado' in columns,
             'fecha_pago': 'fecha_pago' in columns,
-            'visto_por_usuario': 'visto_por_usuario' in columns
+            'visto_por_usuario': 'visto_por_usuario' in columns,
+            'extraccion_estado': 'extraccion_estado' in columns,
+            'extraccion_ultimo_mensaje_id': 'extraccion_ultimo_mensaje_id' in columns,
+            'mensajes.seq': 'seq' in columnas_mensajes,
+            'mensajes.uq_mensajes_caso_seq': index_exists(inspector, 'mensajes', 'uq_mensajes_caso_seq'),
+            'casos.ix_casos_user_updated_id': index_exists(inspector, 'casos', 'ix_casos_user_updated_id'),
+            'documento_version': 'documento_version' in columns,
+            'tabla documentos': inspector.has_table('documentos'),
+            'tabla analisis': inspector.has_table('analisis'),
+            'sesiones_diarias.uq_sesiones_diarias_user_fecha': index_exists(
+                inspector, 'sesiones_diarias', 'uq_sesiones_diarias_user_fecha'
+            )
         }
 
         should_not_exist = {
-            'representante_legal': 'representante_legal' in columns
+            'representante_legal': 'representante_legal' in columns,
+            **{columna: columna in columns for columna in COLUMNAS_DOCUMENTO_LEGACY}
         }
 
         all_migrations_applied = (
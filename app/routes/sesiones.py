@@ -1,23 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from livekit import api
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta
 import uuid
 
 from ..core.config import settings
-from ..core.database import get_db
+from ..core.niveles import MINUTOS_SIN_LIMITE
+from ..core.database import get_db, get_async_db
 from ..models.user import User
 from ..models.caso import Caso, TipoDocumento, EstadoCaso
-from .auth import get_current_user
-from ..services import sesion_service, nivel_service
+from .auth import get_current_user, get_current_user_async
+from ..services import sesion_service
 
 router = APIRouter(prefix="/sesiones", tags=["Sesiones"])
 
 
 @router.post("/iniciar")
 async def iniciar_sesion(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     🎯 ENDPOINT MODIFICADO - Crea un caso pero NO genera token LiveKit
@@ -36,7 +39,9 @@ async def iniciar_sesion(
 
     try:
         # 🔒 VALIDAR LÍMITES DE SESIÓN
-        validacion = sesion_service.puede_crear_sesion(current_user.id, db)
+        # (la lógica de límites es síncrona; run_sync la ejecuta sobre la misma conexión async)
+        user_id = current_user.id
+        validacion = await db.run_sync(lambda sesion: sesion_service.puede_crear_sesion(user_id, sesion))
 
         if not validacion["permitido"]:
             raise HTTPException(
@@ -70,13 +75,11 @@ async def iniciar_sesion(
         )
 
         db.add(nuevo_caso)
-        db.commit()  # Commit para obtener el ID
-        db.refresh(nuevo_caso)
+        await db.flush()  # Flush para obtener el ID
 
         # Ahora que tenemos el ID, actualizar el room_name en formato esperado por el agente
         nuevo_caso.room_name = f"caso-{nuevo_caso.id}"  # ✅ Formato: caso-123
-        db.commit()
-        db.refresh(nuevo_caso)
+        await db.commit()
 
         # 2. ✅ NO generar token de LiveKit aquí
         # El token se generará cuando el usuario presione "Iniciar sesión"
@@ -91,7 +94,7 @@ async def iniciar_sesion(
         }
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error creando caso: {str(e)}"
@@ -101,8 +104,8 @@ async def iniciar_sesion(
 @router.post("/{caso_id}/conectar")
 async def conectar_sesion(
     caso_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     🎯 ENDPOINT NUEVO - Genera token de LiveKit para conectar a la sesión
@@ -115,10 +118,13 @@ async def conectar_sesion(
 
     Este endpoint separa la creación del caso (POST /iniciar) de la conexión a LiveKit
     """
-    caso = db.query(Caso).filter(
-        Caso.id == caso_id,
-        Caso.user_id == current_user.id
-    ).first()
+    resultado = await db.execute(
+        select(Caso).where(
+            Caso.id == caso_id,
+            Caso.user_id == current_user.id
+        )
+    )
+    caso = resultado.scalar_one_or_none()
 
     if not caso:
         raise HTTPException(status_code=404, detail="Caso no encontrado")
@@ -128,7 +134,7 @@ async def conectar_sesion(
         if not caso.fecha_inicio_sesion:
             caso.fecha_inicio_sesion = datetime.utcnow()
             caso.estado = EstadoCaso.TEMPORAL  # Cambiar a TEMPORAL (sesión activa)
-            db.commit()
+            await db.commit()
 
             # 📊 NO registrar en sesiones_diarias aquí - solo al finalizar/generar documento
             # Esto evita que sesiones abandonadas cuenten como sesión del día
@@ -171,7 +177,7 @@ async def conectar_sesion(
 @router.put("/{caso_id}/finalizar")
 async def finalizar_sesion(
     caso_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     🎯 ENDPOINT CRÍTICO - Finaliza una sesión con el avatar
@@ -183,7 +189,7 @@ async def finalizar_sesion(
     - Calcula duración real de la sesión
     - Registra minutos consumidos en sesiones_diarias
     """
-    caso = db.query(Caso).filter(Caso.id == caso_id).first()
+    caso = await db.get(Caso, caso_id)
     if not caso:
         raise HTTPException(status_code=404, detail="Caso no encontrado")
 
@@ -200,9 +206,11 @@ async def finalizar_sesion(
 
         # 📊 Registrar fin de sesión con minutos consumidos
         # Solo se contará como sesión si es la primera vez que se finaliza y duró >1 min
-        sesion_service.registrar_fin_sesion(caso.id, duracion_minutos, db, ya_fue_finalizada)
+        await db.run_sync(
+            lambda sesion: sesion_service.registrar_fin_sesion(caso_id, duracion_minutos, sesion, ya_fue_finalizada)
+        )
 
-    db.commit()
+    await db.commit()
 
     return {
         "message": "Sesión finalizada",
@@ -222,11 +230,9 @@ async def validar_limite_sesion(
     Retorna información de límites y disponibilidad
     El frontend puede usar esto para mostrar advertencias antes de iniciar
     """
-    validacion = sesion_service.puede_crear_sesion(current_user.id, db)
-
-    # Obtener uso actual del día
-    hoy = date.today()
-    uso = sesion_service.obtener_uso_diario(current_user.id, hoy, db)
+    # Validación y uso del día salen de la misma consulta
+    evaluacion = sesion_service.evaluar_limites(current_user.id, db)
+    validacion, uso = evaluacion["validacion"], evaluacion["uso"]
 
     # Campos compatibles con el frontend (ModalConfirmarSesion)
     return {
@@ -254,9 +260,8 @@ async def obtener_uso_diario_endpoint(
 
     Útil para mostrar estadísticas al usuario
     """
-    hoy = date.today()
-    uso = sesion_service.obtener_uso_diario(current_user.id, hoy, db)
-    limites = nivel_service.obtener_limites_usuario(current_user.id, db)
+    evaluacion = sesion_service.evaluar_limites(current_user.id, db)
+    uso, limites = evaluacion["uso"], evaluacion["limites"]
 
     # Calcular total de sesiones permitidas (base + extra)
     total_sesiones = uso["sesiones_base_permitidas"] + uso["sesiones_extra_bonus"]
@@ -266,7 +271,7 @@ async def obtener_uso_diario_endpoint(
     if minutos_disponibles is not None:
         minutos_disponibles = max(0, minutos_disponibles - uso["minutos_consumidos"])
     else:
-        minutos_disponibles = 999999  # Sin límite (nivel ORO)
+        minutos_disponibles = MINUTOS_SIN_LIMITE  # Sin límite (nivel ORO)
 
     # Formato compatible con frontend
     return {
@@ -3,20 +3,17 @@ Endpoints de Usuarios - Niveles y Beneficios
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
 
-from ..core.database import get_db
+from ..core.niveles import NIVELES, limites_nivel
 from ..models.user import User
 from .auth import get_current_user
-from ..services import nivel_service
 
 router = APIRouter(prefix="/usuarios", tags=["Usuarios"])
 
 
 @router.get("/mi-nivel")
 async def obtener_mi_nivel(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """
     📊 Retorna nivel actual del usuario y beneficios
@@ -30,7 +27,7 @@ async def obtener_mi_nivel(
     - Cantidad de pagos de la última semana
     - Sesiones extra disponibles hoy (+2 por cada pago del día)
     """
-    limites = nivel_service.obtener_limites_usuario(current_user.id, db)
+    limites = limites_nivel(current_user.nivel_usuario)
 
     # Calcular siguiente nivel
     nivel_actual = limites["nivel"]
@@ -94,9 +91,9 @@ async def obtener_beneficios_niveles():
                 "requisito": "Sin pagos en última semana (7 días)",
                 "color": "#9CA3AF",
                 "beneficios": {
-                    "sesiones_dia": 3,
-                    "min_sesion": 10,
-                    "min_totales": 30,
+                    "sesiones_dia": NIVELES[0]["sesiones_dia"],
+                    "min_sesion": NIVELES[0]["min_sesion"],
+                    "min_totales": NIVELES[0]["min_totales"],
                     "descripcion": "Perfecto para probar la plataforma"
                 }
             },
@@ -106,9 +103,9 @@ async def obtener_beneficios_niveles():
                 "requisito": "1 pago en última semana (7 días)",
                 "color": "#CD7F32",
                 "beneficios": {
-                    "sesiones_dia": 5,
-                    "min_sesion": 10,
-                    "min_totales": 50,
+                    "sesiones_dia": NIVELES[1]["sesiones_dia"],
+                    "min_sesion": NIVELES[1]["min_sesion"],
+                    "min_totales": NIVELES[1]["min_totales"],
                     "descripcion": "Para usuarios ocasionales"
                 }
             },
@@ -118,9 +115,9 @@ async def obtener_beneficios_niveles():
                 "requisito": "2 pagos en última semana (7 días)",
                 "color": "#C0C0C0",
                 "beneficios": {
-                    "sesiones_dia": 7,
-                    "min_sesion": 10,
-                    "min_totales": 70,
+                    "sesiones_dia": NIVELES[2]["sesiones_dia"],
+                    "min_sesion": NIVELES[2]["min_sesion"],
+                    "min_totales": NIVELES[2]["min_totales"],
                     "descripcion": "Para usuarios frecuentes"
                 }
             },
@@ -130,9 +127,9 @@ async def obtener_beneficios_niveles():
                 "requisito": "3+ pagos en última semana (7 días)",
                 "color": "#FFD700",
                 "beneficios": {
-                    "sesiones_dia": 10,
-                    "min_sesion": 15,
-                    "min_totales": None,
+                    "sesiones_dia": NIVELES[3]["sesiones_dia"],
+                    "min_sesion": NIVELES[3]["min_sesion"],
+                    "min_totales": NIVELES[3]["min_totales"],
                     "descripcion": "Libertad total - sin límite de minutos totales"
                 }
             }
@@ -112,3 +112,15 @@ class CasoListResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class DocumentoVersionResponse(BaseModel):
+    version: int
+    hash_contenido: str
+    origen: str
+    metadatos_render: Optional[Dict[str, Any]] = None
+    vigente: bool = False
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional
+from pydantic import BaseModel, field_validator
+from datetime import datetime, timezone
+from typing import List, Optional
 
 
 class MensajeBase(BaseModel):
@@ -12,6 +12,23 @@ class MensajeCreate(MensajeBase):
     caso_id: int
     duracion_audio: Optional[int] = None
     confianza: Optional[int] = None
+    timestamp: Optional[datetime] = None  # Momento del mensaje según el agente (por defecto, al recibirlo)
+
+    @field_validator('timestamp')
+    def normalizar_timestamp(cls, v):
+        # La columna guarda UTC sin zona: "10:00+05:00" se guarda como 05:00
+        if v is not None and v.tzinfo is not None:
+            return v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+
+class MensajeLoteCreate(BaseModel):
+    mensajes: List[MensajeCreate]  # Pueden ser de uno o varios casos
+
+
+class MensajeLoteResponse(BaseModel):
+    insertados: int
+    ids: List[int]  # En el mismo orden de los mensajes enviados
 
 
 class MensajeResponse(MensajeBase):
@@ -20,6 +37,7 @@ class MensajeResponse(MensajeBase):
     timestamp: datetime
     duracion_audio: Optional[int]
     confianza: Optional[int]
+    seq: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -12,10 +12,32 @@ from . import nivel_service
 from . import sesion_service
 from . import pago_service
 from . import limpieza_service
+from . import generacion_service
+from . import cache_generacion_service
+from . import transcripcion_service
+from . import analisis_caso_service
+from . import jurisprudencia_service
+from . import pdf_cache_service
+from . import pdf_render_service
+from . import mensajes_buffer_service
+from . import canal_mensajes_service
+from . import versiones_service
+from . import cache_usuarios_service
 
 __all__ = [
     "nivel_service",
     "sesion_service",
     "pago_service",
     "limpieza_service",
+    "generacion_service",
+    "cache_generacion_service",
+    "transcripcion_service",
+    "analisis_caso_service",
+    "jurisprudencia_service",
+    "pdf_cache_service",
+    "pdf_render_service",
+    "mensajes_buffer_service",
+    "canal_mensajes_service",
+    "versiones_service",
+    "cache_usuarios_service",
 ]
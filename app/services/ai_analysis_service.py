@@ -1,15 +1,16 @@
 """
 Servicio de análisis de calidad y validación de documentos legales generados con IA
 """
+import asyncio
 import re
 from typing import Dict, List, Tuple
-from openai import OpenAI
 from ..core.config import settings
+from ..core import openai_client
+from . import jurisprudencia_service
+from .openai_service import MODELO
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
-
-def validar_jurisprudencia(documento: str) -> Dict:
+async def validar_jurisprudencia(documento: str) -> Dict:
     """
     Valida que la jurisprudencia citada en el documento sea real y relevante.
 
@@ -51,12 +52,29 @@ def validar_jurisprudencia(documento: str) -> Dict:
             "año": año
         })
 
-    # Usar GPT-4 para validar si las sentencias son reales y relevantes
+    # Resolver primero con el índice local; solo las desconocidas van a GPT
+    conocidas, desconocidas = jurisprudencia_service.resolver_citas(sentencias)
+    referencias_desconocidas = list(dict.fromkeys(s['referencia'] for s in desconocidas))
+
+    resultado = {
+        "sentencias_citadas": sentencias,
+        "total_sentencias": len(sentencias),
+        "sentencias_verificadas": conocidas,
+        "sentencias_no_indexadas": referencias_desconocidas,
+        "es_valido": True
+    }
+
+    if not referencias_desconocidas:
+        resultado["validacion_ia"] = {}  # Nada que validar con GPT
+        resultado["advertencia"] = "Todas las sentencias citadas están en el índice local de jurisprudencia"
+        return resultado
+
+    # Usar GPT para validar si las sentencias no indexadas son reales y relevantes
     try:
         prompt = f"""Como experto en jurisprudencia de la Corte Constitucional de Colombia,
 analiza las siguientes sentencias citadas en un documento legal:
 
-{', '.join([s['referencia'] for s in sentencias])}
+{', '.join(referencias_desconocidas)}
 
 Para cada sentencia:
 1. Indica si es probable que exista (basándote en el formato y año)
@@ -80,8 +98,8 @@ Responde en formato JSON:
 }}
 """
 
-        response = client.chat.completions.create(
-            model="gpt-5.1-2025-11-13",
+        response = await openai_client.crear_chat_completion(
+            model=MODELO,
             messages=[
                 {
                     "role": "system",
@@ -93,31 +111,24 @@ Responde en formato JSON:
                 }
             ],
             temperature=0.3,  # Baja temperatura para respuestas más precisas
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            timeout=settings.OPENAI_TIMEOUT_ANALISIS
         )
 
         import json
         validacion_gpt = json.loads(response.choices[0].message.content)
 
-        return {
-            "sentencias_citadas": sentencias,
-            "total_sentencias": len(sentencias),
-            "validacion_ia": validacion_gpt,
-            "es_valido": True,
-            "advertencia": "Verifica manualmente las sentencias citadas antes de radicar el documento"
-        }
+        resultado["validacion_ia"] = validacion_gpt
+        resultado["advertencia"] = "Verifica manualmente las sentencias no indexadas antes de radicar el documento"
+        return resultado
 
     except Exception as e:
-        return {
-            "sentencias_citadas": sentencias,
-            "total_sentencias": len(sentencias),
-            "error": f"No se pudo validar con IA: {str(e)}",
-            "es_valido": True,
-            "advertencia": "IMPORTANTE: Verifica manualmente todas las sentencias citadas"
-        }
+        resultado["error"] = f"No se pudo validar con IA: {str(e)}"
+        resultado["advertencia"] = "IMPORTANTE: Verifica manualmente las sentencias no indexadas"
+        return resultado
 
 
-def analizar_calidad_documento(documento: str, datos_caso: dict, tipo_documento: str = "TUTELA") -> Dict:
+async def analizar_calidad_documento(documento: str, datos_caso: dict, tipo_documento: str = "TUTELA") -> Dict:
     """
     Analiza la calidad del documento generado.
 
@@ -226,8 +237,8 @@ Responde en formato JSON:
         else:
             system_message = "Eres un revisor experto de documentos legales en Colombia. Evalúas la calidad de acciones de tutela."
 
-        response = client.chat.completions.create(
-            model="gpt-5.1-2025-11-13",
+        response = await openai_client.crear_chat_completion(
+            model=MODELO,
             messages=[
                 {
                     "role": "system",
@@ -239,7 +250,8 @@ Responde en formato JSON:
                 }
             ],
             temperature=0.3,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            timeout=settings.OPENAI_TIMEOUT_ANALISIS
         )
 
         import json
@@ -257,7 +269,7 @@ Responde en formato JSON:
         }
 
 
-def analizar_fortaleza_caso(datos_caso: dict, tipo_documento: str = "TUTELA") -> Dict:
+async def analizar_fortaleza_caso(datos_caso: dict, tipo_documento: str = "TUTELA") -> Dict:
     """
     Analiza la fortaleza del caso antes de generar el documento.
 
@@ -374,8 +386,8 @@ Responde en formato JSON:
     try:
         system_message = "Eres un abogado constitucionalista experto que evalúa la viabilidad de acciones de tutela en Colombia." if tipo_documento == "TUTELA" else "Eres un abogado experto en derecho administrativo colombiano que evalúa la viabilidad de derechos de petición."
 
-        response = client.chat.completions.create(
-            model="gpt-5.1-2025-11-13",
+        response = await openai_client.crear_chat_completion(
+            model=MODELO,
             messages=[
                 {
                     "role": "system",
@@ -387,7 +399,8 @@ Responde en formato JSON:
                 }
             ],
             temperature=0.3,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            timeout=settings.OPENAI_TIMEOUT_ANALISIS
         )
 
         import json
@@ -466,7 +479,7 @@ def generar_sugerencias_mejora(documento: str, analisis_calidad: dict, analisis_
                 "accion": "Considera agregar jurisprudencia relevante para fortalecer el caso"
             })
         elif total_sentencias > 0:
-            validacion = analisis_jurisprudencia.get('validacion_ia', {})
+            validacion = analisis_jurisprudencia.get('validacion_ia') or {}
             if validacion.get('sentencias'):
                 for sent in validacion['sentencias']:
                     if sent.get('riesgo_alucinacion') == 'alto':
@@ -486,10 +499,13 @@ def generar_sugerencias_mejora(documento: str, analisis_calidad: dict, analisis_
     }
 
 
-def analisis_completo_documento(documento: str, datos_caso: dict, tipo_documento: str = "TUTELA") -> Dict:
+async def analisis_completo_documento(documento: str, datos_caso: dict, tipo_documento: str = "TUTELA") -> Dict:
     """
     Realiza un análisis completo del documento generado.
 
+    Jurisprudencia, calidad y fortaleza son llamadas independientes a GPT, así
+    que se lanzan en paralelo: el tiempo total es el de la más lenta.
+
     Args:
         documento: Documento generado
         datos_caso: Datos originales del caso
@@ -499,13 +515,15 @@ def analisis_completo_documento(documento: str, datos_caso: dict, tipo_documento
         Dict con análisis completo
     """
 
-    # 1. Validar jurisprudencia
-    validacion_jurisprudencia = validar_jurisprudencia(documento)
-
-    # 2. Analizar calidad (pasando el tipo de documento)
-    analisis_calidad = analizar_calidad_documento(documento, datos_caso, tipo_documento)
+    # 1. Jurisprudencia, calidad y fortaleza en paralelo
+    # (cada función captura sus propios errores y retorna es_valido=False)
+    validacion_jurisprudencia, analisis_calidad, analisis_fortaleza = await asyncio.gather(
+        validar_jurisprudencia(documento),
+        analizar_calidad_documento(documento, datos_caso, tipo_documento),
+        analizar_fortaleza_caso(datos_caso, tipo_documento)
+    )
 
-    # 3. Generar sugerencias
+    # 2. Generar sugerencias
     sugerencias = generar_sugerencias_mejora(documento, analisis_calidad, validacion_jurisprudencia)
 
     # Determinar si el documento está listo
@@ -529,11 +547,13 @@ def analisis_completo_documento(documento: str, datos_caso: dict, tipo_documento
     return {
         "jurisprudencia": validacion_jurisprudencia,
         "calidad": analisis_calidad,
+        "fortaleza": analisis_fortaleza,
         "sugerencias": sugerencias,
         "listo_para_radicar": listo_para_radicar,
         "razones_no_listo": razones_no_listo,
         "resumen": {
             "puntuacion_calidad": analisis_calidad.get('calidad', {}).get('puntuacion_total', 0) if analisis_calidad.get('es_valido') else 0,
+            "fortaleza_caso": analisis_fortaleza.get('fortaleza', {}).get('fortaleza_total') if analisis_fortaleza.get('es_valido') else None,
             "sentencias_citadas": validacion_jurisprudencia.get('total_sentencias', 0),
             "sugerencias_criticas": sugerencias.get('prioridad_critica', 0),
             "sugerencias_altas": sugerencias.get('prioridad_alta', 0),
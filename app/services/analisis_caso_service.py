@@ -0,0 +1,106 @@
+"""
+Análisis de IA del documento generado de un caso, en segundo plano
+
+Ejecuta ai_analysis_service.analisis_completo_documento (jurisprudencia, calidad
+y fortaleza en paralelo) y guarda el resultado en la tabla analisis, ligado a la
+versión del documento analizada. Las lecturas y escrituras de BD usan su propia
+sesión en un hilo, así que no se retiene ninguna conexión durante las llamadas a GPT.
+"""
+
+import asyncio
+import logging
+import time
+
+from ..core.database import SessionLocal
+from ..models import Caso
+from ..models.caso import cargar_grupos, GRUPO_DOCUMENTO, GRUPO_RELATO
+from . import ai_analysis_service, generacion_service, versiones_service
+
+logger = logging.getLogger(__name__)
+
+_en_proceso = set()  # caso_id con un análisis corriendo en este proceso
+
+
+def esta_en_proceso(caso_id: int) -> bool:
+    """
+    True si el caso ya tiene un análisis corriendo (evita lanzar dos a la vez)
+    """
+    return caso_id in _en_proceso
+
+
+async def analizar_caso(caso_id: int):
+    """
+    Analiza el documento generado del caso y persiste los resultados
+
+    Pensado para BackgroundTasks: nunca lanza excepciones, solo las registra.
+    """
+    if caso_id in _en_proceso:
+        logger.info(f"⏭️ Análisis del caso {caso_id} ya en proceso, se omite")
+        return
+
+    _en_proceso.add(caso_id)
+    inicio = time.monotonic()
+    try:
+        datos = await asyncio.to_thread(_cargar_datos, caso_id)
+        if datos is None:
+            logger.warning(f"⚠️ Caso {caso_id} sin documento generado, no se analiza")
+            return
+
+        version, documento, datos_caso, tipo_documento = datos
+        logger.info(f"🔬 Analizando documento del caso {caso_id} ({tipo_documento})...")
+
+        resultado = await ai_analysis_service.analisis_completo_documento(documento, datos_caso, tipo_documento)
+
+        guardado = await asyncio.to_thread(_guardar_resultado, caso_id, version, resultado)
+        if guardado:
+            logger.info(
+                f"✅ Análisis del caso {caso_id} guardado en {time.monotonic() - inicio:.1f}s - "
+                f"{resultado['resumen']['recomendacion']}"
+            )
+        else:
+            logger.info(f"⏭️ El documento del caso {caso_id} cambió durante el análisis, resultado descartado")
+
+    except Exception as e:
+        logger.error(f"❌ Error analizando caso {caso_id}: {str(e)}")
+
+    finally:
+        _en_proceso.discard(caso_id)
+
+
+def _cargar_datos(caso_id: int):
+    db = SessionLocal()
+    try:
+        caso = db.query(Caso).options(*cargar_grupos(GRUPO_DOCUMENTO, GRUPO_RELATO)).filter(Caso.id == caso_id).first()
+        if not caso or not caso.documento_generado:
+            return None
+
+        tipo_documento = caso.tipo_documento.value if caso.tipo_documento else "TUTELA"
+        return caso.documento_version, caso.documento_generado, generacion_service.construir_datos_caso(caso), tipo_documento
+    finally:
+        db.close()
+
+
+def _guardar_resultado(caso_id: int, version: int, resultado: dict) -> bool:
+    db = SessionLocal()
+    try:
+        vigente = db.query(Caso.documento_version).filter(Caso.id == caso_id).scalar()
+
+        # Si el documento se regeneró mientras tanto, el análisis ya no corresponde
+        if vigente != version:
+            return False
+
+        versiones_service.guardar_analisis(db, caso_id, version, {
+            "jurisprudencia": resultado["jurisprudencia"],
+            "calidad": resultado["calidad"],
+            "fortaleza": resultado["fortaleza"],
+            "sugerencias": {
+                **resultado["sugerencias"],
+                "listo_para_radicar": resultado["listo_para_radicar"],
+                "razones_no_listo": resultado["razones_no_listo"],
+                "resumen": resultado["resumen"],
+            },
+        })
+        db.commit()
+        return True
+    finally:
+        db.close()
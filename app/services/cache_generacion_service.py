@@ -0,0 +1,300 @@
+"""
+Caché de documentos generados por GPT
+
+Si el usuario vuelve a pulsar "generar" sin cambiar ningún dato del caso, el
+documento se sirve desde aquí en lugar de repetir la llamada a OpenAI.
+
+La clave es direccionada por contenido: sha256 de los datos del caso normalizados
++ tipo de documento + versión del prompt + modelo. Cambiar cualquiera de ellos
+produce otra clave, así que un dato editado nunca devuelve un documento viejo.
+Además, actualizar_caso invalida explícitamente las entradas del caso para no
+dejar documentos huérfanos ocupando espacio.
+
+Backends (GENERACION_CACHE_BACKEND):
+- "memoria": LRU con TTL por proceso (default)
+- "db": tabla generaciones_cache, compartida entre workers de uvicorn
+- "ninguno": desactivado
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models import GeneracionCache
+from . import openai_service
+
+logger = logging.getLogger(__name__)
+
+# Campos de Caso que alimentan el prompt (ver generacion_service.construir_datos_caso).
+# Si actualizar_caso cambia alguno, las generaciones del caso dejan de ser válidas.
+CAMPOS_RELEVANTES = {
+    'nombre_solicitante',
+    'identificacion_solicitante',
+    'direccion_solicitante',
+    'telefono_solicitante',
+    'email_solicitante',
+    'actua_en_representacion',
+    'nombre_representado',
+    'identificacion_representado',
+    'relacion_representado',
+    'tipo_representado',
+    'entidad_accionada',
+    'direccion_entidad',
+    'hechos',
+    'ciudad_de_los_hechos',
+    'derechos_vulnerados',
+    'pretensiones',
+    'fundamentos_derecho',
+    'pruebas',
+    'tipo_documento',
+}
+
+_metricas = {"hits": 0, "misses": 0, "guardados": 0, "invalidaciones": 0}
+_metricas_lock = threading.Lock()
+
+
+class CacheMemoria:
+    """
+    LRU en memoria con TTL por entrada (thread-safe)
+    """
+
+    def __init__(self, max_entradas: int, ttl_minutos: int):
+        self.max_entradas = max(1, max_entradas)
+        self.ttl = timedelta(minutes=ttl_minutos)
+        self._datos = OrderedDict()  # clave -> (documento, caso_id, expira_en)
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str) -> Optional[str]:
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+
+            documento, _, expira_en = entrada
+            if expira_en < datetime.utcnow():
+                del self._datos[clave]
+                return None
+
+            self._datos.move_to_end(clave)
+            return documento
+
+    def guardar(self, clave: str, documento: str, caso_id: Optional[int], **_):
+        with self._lock:
+            self._datos[clave] = (documento, caso_id, datetime.utcnow() + self.ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar_caso(self, caso_id: int) -> int:
+        with self._lock:
+            claves = [clave for clave, (_, cid, _) in self._datos.items() if cid == caso_id]
+            for clave in claves:
+                del self._datos[clave]
+            return len(claves)
+
+    def tamano(self) -> int:
+        return len(self._datos)
+
+
+class CacheDB:
+    """
+    Caché persistente en la tabla generaciones_cache (abre su propia sesión)
+    """
+
+    def __init__(self, ttl_minutos: int):
+        self.ttl = timedelta(minutes=ttl_minutos)
+
+    def obtener(self, clave: str) -> Optional[str]:
+        db = SessionLocal()
+        try:
+            entrada = db.query(GeneracionCache.documento).filter(
+                GeneracionCache.clave == clave,
+                GeneracionCache.expira_en > datetime.utcnow()
+            ).first()
+            return entrada.documento if entrada else None
+        finally:
+            db.close()
+
+    def guardar(self, clave: str, documento: str, caso_id: Optional[int], tipo_documento: str = ""):
+        db = SessionLocal()
+        try:
+            entrada = db.get(GeneracionCache, clave)
+            if entrada is None:
+                entrada = GeneracionCache(clave=clave)
+                db.add(entrada)
+
+            entrada.caso_id = caso_id
+            entrada.tipo_documento = tipo_documento
+            entrada.modelo = openai_service.MODELO
+            entrada.prompt_version = openai_service.PROMPT_VERSION
+            entrada.documento = documento
+            entrada.created_at = datetime.utcnow()
+            entrada.expira_en = datetime.utcnow() + self.ttl
+
+            # Aprovechar la escritura para barrer entradas vencidas
+            db.query(GeneracionCache).filter(
+                GeneracionCache.expira_en <= datetime.utcnow()
+            ).delete(synchronize_session=False)
+
+            db.commit()
+        finally:
+            db.close()
+
+    def invalidar_caso(self, caso_id: int) -> int:
+        db = SessionLocal()
+        try:
+            eliminadas = db.query(GeneracionCache).filter(
+                GeneracionCache.caso_id == caso_id
+            ).delete(synchronize_session=False)
+            db.commit()
+            return eliminadas
+        finally:
+            db.close()
+
+    def tamano(self) -> int:
+        db = SessionLocal()
+        try:
+            return db.query(GeneracionCache).count()
+        finally:
+            db.close()
+
+
+def _crear_backend():
+    backend = settings.GENERACION_CACHE_BACKEND.lower()
+    if backend == "memoria":
+        return CacheMemoria(settings.GENERACION_CACHE_MAX_ENTRADAS, settings.GENERACION_CACHE_TTL_MINUTOS)
+    if backend == "db":
+        return CacheDB(settings.GENERACION_CACHE_TTL_MINUTOS)
+    return None
+
+
+_backend = _crear_backend()
+
+
+def calcular_clave(tipo_documento: str, datos_caso: dict) -> str:
+    """
+    Clave del caché: sha256 de (datos normalizados, tipo, versión de prompt, modelo)
+
+    La normalización solo absorbe lo que no cambia el prompt: espacios al inicio
+    y al final, finales de línea (\r\n vs. \n), None vs. cadena vacía y el orden
+    de las claves. Los saltos de línea y párrafos internos sí cuentan: en hechos
+    o pretensiones cambian el documento que se genera.
+    """
+    datos_normalizados = {
+        campo: _normalizar_valor(valor)
+        for campo, valor in datos_caso.items()
+    }
+    contenido = json.dumps(
+        {
+            "datos": datos_normalizados,
+            "tipo": tipo_documento,
+            "prompt_version": openai_service.PROMPT_VERSION,
+            "modelo": openai_service.MODELO,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def obtener(tipo_documento: str, datos_caso: dict) -> Optional[str]:
+    """
+    Retorna el documento cacheado para esos datos o None (miss o caché desactivado)
+    """
+    if _backend is None:
+        return None
+
+    clave = calcular_clave(tipo_documento, datos_caso)
+    try:
+        documento = _backend.obtener(clave)
+    except Exception as e:
+        # Un fallo del caché nunca debe impedir generar el documento
+        logger.warning(f"⚠️ Error leyendo caché de generación: {str(e)}")
+        documento = None
+
+    _contar("hits" if documento is not None else "misses")
+    if documento is not None:
+        logger.info(f"♻️ Documento servido desde caché ({clave[:12]})")
+    return documento
+
+
+def guardar(tipo_documento: str, datos_caso: dict, documento: str, caso_id: Optional[int] = None):
+    """
+    Guarda un documento recién generado
+    """
+    if _backend is None or not documento:
+        return
+
+    clave = calcular_clave(tipo_documento, datos_caso)
+    try:
+        _backend.guardar(clave, documento, caso_id, tipo_documento=tipo_documento)
+        _contar("guardados")
+    except Exception as e:
+        logger.warning(f"⚠️ Error guardando en caché de generación: {str(e)}")
+
+
+def invalidar_caso(caso_id: int) -> int:
+    """
+    Elimina las generaciones cacheadas de un caso
+
+    Returns:
+        int: Número de entradas eliminadas
+    """
+    if _backend is None:
+        return 0
+
+    try:
+        eliminadas = _backend.invalidar_caso(caso_id)
+    except Exception as e:
+        logger.warning(f"⚠️ Error invalidando caché del caso {caso_id}: {str(e)}")
+        return 0
+
+    if eliminadas:
+        _contar("invalidaciones", eliminadas)
+        logger.info(f"🗑️ Caché de generación invalidado - Caso: {caso_id} ({eliminadas} entradas)")
+    return eliminadas
+
+
+def requiere_invalidacion(campos_actualizados) -> bool:
+    """
+    True si alguno de los campos actualizados alimenta el prompt de generación
+    """
+    return any(campo in CAMPOS_RELEVANTES for campo in campos_actualizados)
+
+
+def obtener_metricas() -> dict:
+    """
+    Hits, misses, guardados, invalidaciones y tasa de aciertos del caché
+    """
+    with _metricas_lock:
+        metricas = dict(_metricas)
+
+    consultas = metricas["hits"] + metricas["misses"]
+    metricas["tasa_aciertos"] = round(metricas["hits"] / consultas * 100, 2) if consultas > 0 else 0
+    metricas["backend"] = settings.GENERACION_CACHE_BACKEND if _backend is not None else "ninguno"
+
+    try:
+        metricas["entradas"] = _backend.tamano() if _backend is not None else 0
+    except Exception:
+        metricas["entradas"] = None
+
+    return metricas
+
+
+def _normalizar_valor(valor):
+    if isinstance(valor, str):
+        valor = valor.replace("\r\n", "\n").replace("\r", "\n").strip()
+        return valor or None
+    return valor
+
+
+def _contar(metrica: str, cantidad: int = 1):
+    with _metricas_lock:
+        _metricas[metrica] += cantidad
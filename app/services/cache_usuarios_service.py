@@ -0,0 +1,259 @@
+"""
+Caché de usuarios autenticados
+
+get_current_user resolvía el usuario con un SELECT por email en cada petición
+autenticada. Ahora el token lleva el id del usuario ("uid") y las columnas del
+usuario se guardan aquí por id durante USUARIOS_CACHE_TTL_SEGUNDOS; en un hit
+el usuario se adjunta a la sesión de la petición sin consultar la BD (merge con
+load=False), así que las rutas lo siguen modificando y haciendo commit igual.
+
+Invalidación: cualquier UPDATE o DELETE de un User hecho por el ORM (perfil,
+nivel, sesiones extra...) borra su entrada al hacer flush y otra vez después
+del commit, para que una lectura concurrente no deje la versión anterior en
+caché. Los UPDATE por conjunto de la app (recálculo nocturno de niveles) no
+pasan por el ORM y llaman a invalidar_todo() tras confirmar. Los cambios hechos
+por fuera de la app (SQL directo, p. ej. is_admin desde la consola de la BD)
+solo se ven al vencer el TTL.
+
+Backends (USUARIOS_CACHE_BACKEND):
+- "memoria": LRU con TTL por proceso (default). Con varios workers cada uno
+  invalida solo lo que él mismo escribe; el TTL acota cuánto puede ver otro
+  worker un usuario desactualizado
+- "ninguno": desactivado (una consulta por clave primaria en cada petición)
+
+Un backend compartido (p. ej. Redis) se conecta con configurar_backend():
+cualquier objeto con obtener / guardar / invalidar / limpiar / tamano sirve, y así
+todos los workers ven las mismas invalidaciones.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.session import make_transient_to_detached
+
+from ..core.config import settings
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+_COLUMNAS = [columna.key for columna in inspect(User).column_attrs]
+
+_metricas = {"hits": 0, "misses": 0, "invalidaciones": 0}
+_metricas_lock = threading.Lock()
+
+
+class CacheMemoria:
+    """
+    LRU en memoria con TTL por entrada (thread-safe)
+    """
+
+    def __init__(self, max_entradas: int, ttl_segundos: int):
+        self.max_entradas = max(1, max_entradas)
+        self.ttl = timedelta(seconds=ttl_segundos)
+        self._datos = OrderedDict()  # user_id -> (columnas, expira_en)
+        self._lock = threading.Lock()
+
+    def obtener(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            entrada = self._datos.get(user_id)
+            if entrada is None:
+                return None
+
+            columnas, expira_en = entrada
+            if expira_en < datetime.utcnow():
+                del self._datos[user_id]
+                return None
+
+            self._datos.move_to_end(user_id)
+            return columnas
+
+    def guardar(self, user_id: int, columnas: dict):
+        with self._lock:
+            self._datos[user_id] = (columnas, datetime.utcnow() + self.ttl)
+            self._datos.move_to_end(user_id)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, user_id: int) -> bool:
+        with self._lock:
+            return self._datos.pop(user_id, None) is not None
+
+    def limpiar(self) -> int:
+        with self._lock:
+            eliminadas = len(self._datos)
+            self._datos.clear()
+            return eliminadas
+
+    def tamano(self) -> int:
+        return len(self._datos)
+
+
+def _crear_backend():
+    if settings.USUARIOS_CACHE_BACKEND.lower() == "memoria":
+        return CacheMemoria(settings.USUARIOS_CACHE_MAX_ENTRADAS, settings.USUARIOS_CACHE_TTL_SEGUNDOS)
+    return None
+
+
+_backend = _crear_backend()
+
+
+def configurar_backend(backend):
+    """
+    Reemplaza el backend del caché (None lo desactiva)
+    """
+    global _backend
+    _backend = backend
+
+
+def obtener(db: Session, user_id: int) -> Optional[User]:
+    """
+    Usuario adjunto a la sesión db, desde caché si está y si no desde la BD
+
+    Returns:
+        User: El usuario, o None si no existe
+    """
+    columnas = _leer(user_id)
+    if columnas is not None:
+        return db.merge(_desde_columnas(columnas), load=False)
+
+    usuario = db.get(User, user_id)
+    if usuario is not None:
+        guardar(usuario)
+    return usuario
+
+
+async def obtener_async(db, user_id: int) -> Optional[User]:
+    """
+    Igual que obtener, con una AsyncSession
+    """
+    columnas = _leer(user_id)
+    if columnas is not None:
+        return await db.merge(_desde_columnas(columnas), load=False)
+
+    usuario = await db.get(User, user_id)
+    if usuario is not None:
+        guardar(usuario)
+    return usuario
+
+
+def guardar(usuario: User):
+    if _backend is None:
+        return
+
+    try:
+        _backend.guardar(usuario.id, {columna: getattr(usuario, columna) for columna in _COLUMNAS})
+    except Exception as e:
+        logger.warning(f"⚠️ Error guardando usuario {usuario.id} en caché: {str(e)}")
+
+
+def invalidar(user_id: int):
+    """
+    Borra el usuario del caché (la próxima petición lo lee de la BD)
+    """
+    if _backend is None:
+        return
+
+    try:
+        if _backend.invalidar(user_id):
+            _contar("invalidaciones")
+    except Exception as e:
+        logger.warning(f"⚠️ Error invalidando usuario {user_id} en caché: {str(e)}")
+
+
+def invalidar_todo():
+    """
+    Vacía el caché (tras UPDATE masivos de users hechos sin el ORM)
+    """
+    if _backend is None:
+        return
+
+    try:
+        eliminadas = _backend.limpiar()
+    except Exception as e:
+        logger.warning(f"⚠️ Error vaciando el caché de usuarios: {str(e)}")
+        return
+
+    if eliminadas:
+        _contar("invalidaciones", eliminadas)
+    logger.info(f"🗑️ Caché de usuarios vaciado ({eliminadas} entradas)")
+
+
+def obtener_metricas() -> dict:
+    """
+    Hits, misses, invalidaciones y tasa de aciertos del caché
+    """
+    with _metricas_lock:
+        metricas = dict(_metricas)
+
+    consultas = metricas["hits"] + metricas["misses"]
+    metricas["tasa_aciertos"] = round(metricas["hits"] / consultas * 100, 2) if consultas > 0 else 0
+    metricas["backend"] = type(_backend).__name__ if _backend is not None else "ninguno"
+    metricas["ttl_segundos"] = settings.USUARIOS_CACHE_TTL_SEGUNDOS
+
+    try:
+        metricas["entradas"] = _backend.tamano() if _backend is not None else 0
+    except Exception:
+        metricas["entradas"] = None
+
+    return metricas
+
+
+def _leer(user_id: int) -> Optional[dict]:
+    if _backend is None:
+        return None
+
+    try:
+        columnas = _backend.obtener(user_id)
+    except Exception as e:
+        # Un fallo del caché nunca debe impedir autenticar: se lee de la BD
+        logger.warning(f"⚠️ Error leyendo usuario {user_id} del caché: {str(e)}")
+        columnas = None
+
+    _contar("hits" if columnas is not None else "misses")
+    return columnas
+
+
+def _desde_columnas(columnas: dict) -> User:
+    # Instancia "detached" con los valores como ya confirmados: merge(load=False)
+    # la adjunta sin SELECT y el flush solo escribe lo que la ruta cambie después
+    usuario = User()
+    for columna, valor in columnas.items():
+        set_committed_value(usuario, columna, valor)
+    make_transient_to_detached(usuario)
+    return usuario
+
+
+def _contar(metrica: str, cantidad: int = 1):
+    with _metricas_lock:
+        _metricas[metrica] += cantidad
+
+
+# =========================================================
+# Invalidación automática en escrituras del ORM
+# =========================================================
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _al_escribir_usuario(mapper, connection, usuario):
+    invalidar(usuario.id)
+    pendientes = inspect(usuario).session.info.setdefault("usuarios_modificados", set())
+    pendientes.add(usuario.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _al_confirmar(session):
+    # Segunda invalidación: entre el flush y el commit otra petición pudo leer
+    # (y cachear) la fila anterior
+    for user_id in session.info.pop("usuarios_modificados", ()):
+        invalidar(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _al_revertir(session):
+    session.info.pop("usuarios_modificados", None)
@@ -0,0 +1,272 @@
+"""
+Canal WebSocket de transcripciones en vivo (agente → backend)
+
+En lugar de un POST /mensajes/ por frase, el agente abre un WebSocket por caso
+(/mensajes/ws/{caso_id}) y envía los mensajes por ahí. Protocolo (JSON):
+
+    servidor → {"tipo": "hola", "caso_id": 12, "ultimo_seq": 40}
+    agente   → {"seq": 41, "remitente": "usuario", "texto": "...",
+                "duracion_audio": 1200, "confianza": 93, "timestamp": "..."}
+    servidor → {"tipo": "ack", "seq": 41}            (acumulativo, en orden)
+    servidor → {"tipo": "error", "codigo": "secuencia", "esperado": 42}
+    servidor → {"tipo": "error", "codigo": "mensaje_invalido", "seq": 41, "errores": [...]}
+    servidor → {"tipo": "error", "codigo": "no_guardado", "seq": 41, "detalle": "..."}
+    servidor → {"tipo": "limite_proximo" | "limite_alcanzado", "minutos_restantes": 1.5, ...}
+
+- seq es consecutivo por caso y lo asigna el agente. Al reconectar, "hola" trae
+  el último seq guardado y el agente reenvía desde ahí; los repetidos se ignoran
+  (y el índice único (caso_id, seq) lo garantiza también en la BD).
+- Cada mensaje se valida con MensajeCreate (tipos y timestamp normalizado a UTC).
+  Uno inválido se responde con "mensaje_invalido" y no avanza la secuencia: el
+  agente debe reenviar ese seq corregido.
+- Los mensajes se escriben en micro-lotes (WS_LOTE_MAX o cada WS_LOTE_INTERVALO
+  segundos) con un solo INSERT; el ack llega cuando el lote está confirmado.
+  Solo un error transitorio de la BD devuelve el lote a la cola; si la BD rechaza
+  una fila por sus datos, se informa con "no_guardado" y el resto se guarda.
+- Cada WS_INTERVALO_LIMITES segundos se revisa el tiempo de sesión con
+  sesion_service y se avisa al agente antes de alcanzar el límite.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import List
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select
+
+from ..core.config import settings
+from ..core.database import es_error_transitorio, nueva_sesion_async
+from ..models.caso import Caso
+from ..models.mensaje import Mensaje
+from ..schemas.mensaje import MensajeCreate
+from . import sesion_service
+
+logger = logging.getLogger(__name__)
+
+CODIGO_CASO_NO_ENCONTRADO = 4404
+
+
+class CanalMensajes:
+    """
+    Estado de una conexión WebSocket del agente para un caso
+    """
+
+    def __init__(self, websocket: WebSocket, caso_id: int):
+        self.websocket = websocket
+        self.caso_id = caso_id
+        self.ultimo_recibido = 0  # Último seq aceptado (en memoria o en BD)
+        self.ultimo_confirmado = 0  # Último seq guardado en BD (y confirmado al agente)
+        self._lote: List[dict] = []
+        self._lote_lleno = asyncio.Event()
+        self._lock_envio = asyncio.Lock()
+        self._lock_vaciado = asyncio.Lock()
+        self._avisos_enviados = set()
+
+    async def ejecutar(self):
+        """
+        Atiende la conexión hasta que el agente se desconecta
+        """
+        if not await self._cargar_ultimo_seq():
+            await self.websocket.close(code=CODIGO_CASO_NO_ENCONTRADO, reason="Caso no encontrado")
+            return
+
+        await self._enviar({"tipo": "hola", "caso_id": self.caso_id, "ultimo_seq": self.ultimo_confirmado})
+        logger.info(f"🔌 Canal de mensajes abierto - Caso {self.caso_id} (último seq {self.ultimo_confirmado})")
+
+        tareas = [
+            asyncio.create_task(self._vaciar_periodicamente()),
+            asyncio.create_task(self._vigilar_limites()),
+        ]
+        try:
+            while True:
+                texto = await self.websocket.receive_text()
+                try:
+                    datos = json.loads(texto)
+                except ValueError:
+                    await self._enviar({"tipo": "error", "codigo": "json_invalido"})
+                    continue
+                await self._recibir(datos)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+
+            # Lo recibido se guarda aunque ya no se pueda confirmar: el agente lo
+            # reenviará al reconectar y el índice único evita duplicarlo
+            try:
+                await asyncio.shield(self._vaciar(confirmar=False))
+            except Exception as e:
+                logger.error(f"❌ Error guardando mensajes pendientes del caso {self.caso_id}: {str(e)}")
+
+            logger.info(f"🔌 Canal de mensajes cerrado - Caso {self.caso_id} (último seq {self.ultimo_confirmado})")
+
+    async def _recibir(self, datos: dict):
+        seq = datos.get("seq") if isinstance(datos, dict) else None
+        if not isinstance(seq, int):
+            await self._enviar({"tipo": "error", "codigo": "mensaje_invalido", "seq": seq})
+            return
+
+        # Reenvío de algo ya recibido (reconexión): confirmar lo que ya está guardado
+        if seq <= self.ultimo_recibido:
+            if seq <= self.ultimo_confirmado:
+                await self._enviar({"tipo": "ack", "seq": self.ultimo_confirmado})
+            return
+
+        if seq != self.ultimo_recibido + 1:
+            await self._enviar({"tipo": "error", "codigo": "secuencia", "esperado": self.ultimo_recibido + 1})
+            return
+
+        try:
+            mensaje = MensajeCreate.model_validate({**datos, "caso_id": self.caso_id})
+        except ValidationError as e:
+            errores = [{"campo": ".".join(str(parte) for parte in error["loc"]), "error": error["msg"]} for error in e.errors()]
+            await self._enviar({"tipo": "error", "codigo": "mensaje_invalido", "seq": seq, "errores": errores})
+            return
+
+        if not mensaje.remitente:
+            await self._enviar({
+                "tipo": "error", "codigo": "mensaje_invalido", "seq": seq,
+                "errores": [{"campo": "remitente", "error": "No puede estar vacío"}]
+            })
+            return
+
+        self._lote.append({
+            **mensaje.model_dump(),
+            "seq": seq,
+            "timestamp": mensaje.timestamp or datetime.utcnow(),
+        })
+        self.ultimo_recibido = seq
+
+        if len(self._lote) >= settings.WS_LOTE_MAX:
+            self._lote_lleno.set()
+
+    async def _vaciar_periodicamente(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._lote_lleno.wait(), timeout=settings.WS_LOTE_INTERVALO)
+            except asyncio.TimeoutError:
+                pass
+            self._lote_lleno.clear()
+
+            try:
+                await self._vaciar()
+            except Exception as e:
+                # Error transitorio: lo no guardado vuelve a la cola y se reintenta en el siguiente ciclo
+                logger.error(f"❌ Error escribiendo micro-lote del caso {self.caso_id}: {str(e)}")
+
+    async def _vaciar(self, confirmar: bool = True):
+        rechazados = []
+        async with self._lock_vaciado:
+            lote, self._lote = self._lote, []
+            if not lote:
+                return
+
+            try:
+                await _insertar(lote)
+            except Exception as e:
+                if es_error_transitorio(e):
+                    self._lote = lote + self._lote
+                    raise
+                logger.warning(
+                    f"⚠️ Micro-lote del caso {self.caso_id} rechazado ({type(e).__name__}), insertando fila por fila"
+                )
+                rechazados = await self._insertar_fila_por_fila(lote)
+
+            self.ultimo_confirmado = lote[-1]["seq"]
+
+        if confirmar:
+            for seq, detalle in rechazados:
+                await self._enviar({"tipo": "error", "codigo": "no_guardado", "seq": seq, "detalle": detalle})
+            await self._enviar({"tipo": "ack", "seq": self.ultimo_confirmado})
+
+    async def _insertar_fila_por_fila(self, lote: List[dict]) -> List[tuple]:
+        """
+        Guarda cada fila por separado y devuelve (seq, detalle) de las que la BD rechaza
+
+        Un error transitorio devuelve a la cola lo que falta y se propaga.
+        """
+        rechazados = []
+        for i, fila in enumerate(lote):
+            try:
+                await _insertar([fila])
+            except Exception as e:
+                if es_error_transitorio(e):
+                    self._lote = lote[i:] + self._lote
+                    if i > 0:
+                        self.ultimo_confirmado = lote[i - 1]["seq"]
+                    raise
+                detalle = str(getattr(e, "orig", None) or e)
+                logger.error(f"❌ Mensaje seq {fila['seq']} del caso {self.caso_id} no guardado: {detalle}")
+                rechazados.append((fila["seq"], detalle))
+        return rechazados
+
+    async def _vigilar_limites(self):
+        while True:
+            await asyncio.sleep(settings.WS_INTERVALO_LIMITES)
+            try:
+                async with nueva_sesion_async() as db:
+                    tiempo = await db.run_sync(
+                        lambda sesion: sesion_service.calcular_tiempo_restante(self.caso_id, sesion)
+                    )
+            except Exception as e:
+                logger.error(f"❌ Error calculando tiempo de sesión del caso {self.caso_id}: {str(e)}")
+                continue
+
+            if not tiempo:
+                continue
+
+            if tiempo["minutos_restantes"] <= 0:
+                await self._avisar("limite_alcanzado", tiempo)
+            elif tiempo["minutos_restantes"] <= settings.WS_AVISO_LIMITE_MINUTOS:
+                await self._avisar("limite_proximo", tiempo)
+
+    async def _avisar(self, tipo: str, tiempo: dict):
+        # Cada aviso se envía una sola vez por conexión
+        if tipo in self._avisos_enviados:
+            return
+        self._avisos_enviados.add(tipo)
+        logger.info(f"⏱️ Caso {self.caso_id}: {tipo} ({tiempo['minutos_restantes']} min restantes)")
+        await self._enviar({"tipo": tipo, **tiempo})
+
+    async def _cargar_ultimo_seq(self) -> bool:
+        async with nueva_sesion_async() as db:
+            existe = await db.scalar(select(Caso.id).where(Caso.id == self.caso_id))
+            if existe is None:
+                return False
+
+            ultimo = await db.scalar(select(func.max(Mensaje.seq)).where(Mensaje.caso_id == self.caso_id))
+
+        self.ultimo_recibido = self.ultimo_confirmado = ultimo or 0
+        return True
+
+    async def _enviar(self, datos: dict):
+        async with self._lock_envio:
+            try:
+                await self.websocket.send_json(datos)
+            except (WebSocketDisconnect, RuntimeError):
+                pass  # El agente ya se desconectó
+
+
+async def _insertar(filas: List[dict]):
+    async with nueva_sesion_async() as db:
+        await db.execute(_insert_sin_duplicados(db.bind.dialect.name, filas))
+        await db.commit()
+
+
+def _insert_sin_duplicados(dialecto: str, filas: List[dict]):
+    """
+    INSERT multi-fila que ignora (caso_id, seq) ya existentes
+    """
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+    elif dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+    else:
+        return insert(Mensaje).values(filas)
+
+    return insert_dialecto(Mensaje).values(filas).on_conflict_do_nothing(index_elements=["caso_id", "seq"])
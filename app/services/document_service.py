@@ -3,10 +3,77 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Pt, Inches
+from functools import lru_cache
+import hashlib
 from io import BytesIO
+from typing import Iterator, NamedTuple, Optional, Tuple
 import re
 
 
+# Patrones para detectar diferentes tipos de formato
+_PATRON_TITULO_PRINCIPAL = re.compile(r'^\*\*(ACCIÓN DE TUTELA|DERECHO DE PETICIÓN)\*\*$', re.IGNORECASE)
+_PATRON_TITULO_SECCION = re.compile(r'^\*\*([IVX]+\.|[IVX]+)\s*.+\*\*$')  # I., II., III. o I, II, III
+_PATRON_LINEA_NEGRITA = re.compile(r'^\*\*.+\*\*$')
+_PATRON_GUION_BAJO = re.compile(r'^_{3,}$')  # Líneas de firma ___________
+
+
+class Bloque(NamedTuple):
+    """
+    Línea del documento ya clasificada (representación intermedia compartida por PDF y DOCX)
+
+    tipo: "vacio", "titulo", "seccion", "subtitulo", "negrita", "firma" o "texto"
+    texto: contenido sin los ** de markdown
+    """
+    tipo: str
+    texto: str
+
+
+@lru_cache(maxsize=64)
+def parsear_documento(documento_texto: str) -> Tuple[Bloque, ...]:
+    """
+    Clasifica cada línea del documento generado (título, sección, negrita, firma, texto)
+
+    El resultado es inmutable y se cachea por texto: descargar el mismo documento
+    en PDF y en DOCX lo parsea una sola vez.
+    """
+    bloques = []
+
+    for linea in documento_texto.split('\n'):
+        linea_stripped = linea.strip()
+
+        if not linea_stripped:
+            bloques.append(Bloque("vacio", ""))
+
+        # Título principal (ACCIÓN DE TUTELA o DERECHO DE PETICIÓN)
+        elif _PATRON_TITULO_PRINCIPAL.match(linea_stripped):
+            bloques.append(Bloque("titulo", linea_stripped.replace('**', '').strip()))
+
+        # Títulos de sección con numeración romana (I. HECHOS, II. DERECHOS, etc.)
+        elif _PATRON_TITULO_SECCION.match(linea_stripped):
+            bloques.append(Bloque("seccion", linea_stripped.replace('**', '').strip()))
+
+        # Otras líneas en negrita: si está en mayúsculas o es corta, es subtítulo
+        elif _PATRON_LINEA_NEGRITA.match(linea_stripped):
+            texto_limpio = linea_stripped.replace('**', '').strip()
+            tipo = "subtitulo" if linea_stripped.isupper() or len(texto_limpio) < 80 else "negrita"
+            bloques.append(Bloque(tipo, texto_limpio))
+
+        # Líneas de firma (guiones bajos)
+        elif _PATRON_GUION_BAJO.match(linea_stripped):
+            bloques.append(Bloque("firma", linea_stripped))
+
+        # Texto normal (sin strip, para preservar listas y viñetas)
+        else:
+            bloques.append(Bloque("texto", linea))
+
+    return tuple(bloques)
+
+
 def _agregar_numero_pagina(canvas, doc):
     """
     Callback para agregar número de página al pie
@@ -19,128 +86,294 @@ def _agregar_numero_pagina(canvas, doc):
     canvas.restoreState()
 
 
+class RenderizadorPDF:
+    """
+    Renderizador de documentos legales a PDF
+
+    La hoja de estilos se construye una sola vez al crear el objeto; generar_pdf
+    reutiliza una instancia por proceso en lugar de reconstruirla en cada documento.
+    El texto se clasifica con parsear_documento.
+    """
+
+    # Subir cuando cambie el formato del PDF: invalida los PDFs cacheados en disco
+    VERSION = "1"
+
+    def __init__(self):
+        self.styles = self._crear_estilos()
+
+    def renderizar(self, documento_texto: str) -> BytesIO:
+        """
+        Renderiza el texto del documento y retorna el PDF en un buffer posicionado al inicio
+        """
+        buffer = BytesIO()
+
+        # Crear el documento PDF
+        doc = SimpleDocTemplate(
+            buffer,
+            pagesize=letter,
+            rightMargin=72,
+            leftMargin=72,
+            topMargin=72,
+            bottomMargin=54,  # Espacio para numeración
+        )
+
+        story = self._construir_story(documento_texto)
+
+        # Construir el PDF con numeración de páginas
+        doc.build(story, onFirstPage=_agregar_numero_pagina, onLaterPages=_agregar_numero_pagina)
+
+        buffer.seek(0)
+
+        return buffer
+
+    def _construir_story(self, documento_texto: str) -> list:
+        styles = self.styles
+        story = []
+
+        for bloque in parsear_documento(documento_texto):
+            if bloque.tipo == "vacio":
+                # Línea vacía - agregar espacio pequeño
+                story.append(Spacer(1, 0.15 * inch))
+
+            elif bloque.tipo == "titulo":
+                story.append(Paragraph(f"<b>{bloque.texto}</b>", styles['TituloPrincipal']))
+                story.append(Spacer(1, 0.2 * inch))
+
+            elif bloque.tipo == "seccion":
+                story.append(Paragraph(f"<b>{bloque.texto}</b>", styles['TituloSeccion']))
+                story.append(Spacer(1, 0.1 * inch))
+
+            elif bloque.tipo == "subtitulo":
+                story.append(Paragraph(f"<b>{bloque.texto}</b>", styles['Encabezado']))
+
+            elif bloque.tipo == "negrita":
+                story.append(Paragraph(f"<b>{bloque.texto}</b>", styles['Justify']))
+
+            elif bloque.tipo == "firma":
+                story.append(Paragraph(bloque.texto, styles['Encabezado']))
+
+            else:
+                story.append(Paragraph(bloque.texto, styles['Justify']))
+
+        return story
+
+    @staticmethod
+    def _crear_estilos():
+        styles = getSampleStyleSheet()
+
+        # Estilo para título principal (ACCIÓN DE TUTELA, DERECHO DE PETICIÓN)
+        styles.add(ParagraphStyle(
+            name='TituloPrincipal',
+            parent=styles['Heading1'],
+            alignment=TA_CENTER,
+            fontSize=14,
+            leading=18,
+            spaceAfter=12,
+            spaceBefore=0,
+            fontName='Times-Bold',
+        ))
+
+        # Estilo para títulos de secciones (I., II., III., etc.)
+        styles.add(ParagraphStyle(
+            name='TituloSeccion',
+            parent=styles['Heading2'],
+            alignment=TA_LEFT,
+            fontSize=12,
+            leading=16,
+            spaceAfter=8,
+            spaceBefore=12,
+            fontName='Times-Bold',
+        ))
+
+        # Estilo para texto justificado
+        styles.add(ParagraphStyle(
+            name='Justify',
+            parent=styles['BodyText'],
+            alignment=TA_JUSTIFY,
+            fontSize=11,
+            leading=14,
+            fontName='Times-Roman',
+            spaceAfter=6,
+        ))
+
+        # Estilo para encabezado formal (Señor, JUEZ, etc.)
+        styles.add(ParagraphStyle(
+            name='Encabezado',
+            parent=styles['BodyText'],
+            alignment=TA_LEFT,
+            fontSize=11,
+            leading=14,
+            fontName='Times-Roman',
+            spaceAfter=4,
+        ))
+
+        return styles
+
+
+_renderizador: Optional[RenderizadorPDF] = None
+
+
+def obtener_renderizador() -> RenderizadorPDF:
+    """
+    Renderizador compartido del proceso (se crea la primera vez)
+    """
+    global _renderizador
+    if _renderizador is None:
+        _renderizador = RenderizadorPDF()
+    return _renderizador
+
+
 def generar_pdf(documento_texto: str, nombre_solicitante: str = "Documento") -> BytesIO:
     """
     Genera un PDF del documento legal con formato profesional
     """
-    buffer = BytesIO()
-
-    # Crear el documento PDF
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=54,  # Espacio para numeración
-    )
-
-    # Estilos
-    styles = getSampleStyleSheet()
-
-    # Estilo para título principal (ACCIÓN DE TUTELA, DERECHO DE PETICIÓN)
-    styles.add(ParagraphStyle(
-        name='TituloPrincipal',
-        parent=styles['Heading1'],
-        alignment=TA_CENTER,
-        fontSize=14,
-        leading=18,
-        spaceAfter=12,
-        spaceBefore=0,
-        fontName='Times-Bold',
-    ))
-
-    # Estilo para títulos de secciones (I., II., III., etc.)
-    styles.add(ParagraphStyle(
-        name='TituloSeccion',
-        parent=styles['Heading2'],
-        alignment=TA_LEFT,
-        fontSize=12,
-        leading=16,
-        spaceAfter=8,
-        spaceBefore=12,
-        fontName='Times-Bold',
-    ))
-
-    # Estilo para texto justificado
-    styles.add(ParagraphStyle(
-        name='Justify',
-        parent=styles['BodyText'],
-        alignment=TA_JUSTIFY,
-        fontSize=11,
-        leading=14,
-        fontName='Times-Roman',
-        spaceAfter=6,
-    ))
-
-    # Estilo para encabezado formal (Señor, JUEZ, etc.)
-    styles.add(ParagraphStyle(
-        name='Encabezado',
-        parent=styles['BodyText'],
-        alignment=TA_LEFT,
-        fontSize=11,
-        leading=14,
-        fontName='Times-Roman',
-        spaceAfter=4,
-    ))
-
-    # Contenido
-    story = []
-
-    # Dividir el texto en párrafos
-    lineas = documento_texto.split('\n')
-
-    # Patrones para detectar diferentes tipos de formato
-    patron_titulo_principal = r'^\*\*(ACCIÓN DE TUTELA|DERECHO DE PETICIÓN)\*\*$'
-    patron_titulo_seccion = r'^\*\*([IVX]+\.|[IVX]+)\s*.+\*\*$'  # I., II., III. o I, II, III
-    patron_linea_negrita = r'^\*\*.+\*\*$'
-    patron_guion_bajo = r'^_{3,}$'  # Líneas de firma ___________
-
-    for i, linea in enumerate(lineas):
-        linea_stripped = linea.strip()
+    return obtener_renderizador().renderizar(documento_texto)
 
-        if not linea_stripped:
-            # Línea vacía - agregar espacio pequeño
-            story.append(Spacer(1, 0.15 * inch))
-            continue
 
-        # Detectar título principal (ACCIÓN DE TUTELA o DERECHO DE PETICIÓN)
-        if re.match(patron_titulo_principal, linea_stripped, re.IGNORECASE):
-            texto_limpio = linea_stripped.replace('**', '').strip()
-            p = Paragraph(f"<b>{texto_limpio}</b>", styles['TituloPrincipal'])
-            story.append(p)
-            story.append(Spacer(1, 0.2 * inch))
+class RenderizadorDOCX:
+    """
+    Renderizador de documentos legales a Word (.docx)
 
-        # Detectar títulos de sección con numeración romana (I. HECHOS, II. DERECHOS, etc.)
-        elif re.match(patron_titulo_seccion, linea_stripped):
-            texto_limpio = linea_stripped.replace('**', '').strip()
-            p = Paragraph(f"<b>{texto_limpio}</b>", styles['TituloSeccion'])
-            story.append(p)
-            story.append(Spacer(1, 0.1 * inch))
+    Usa los mismos bloques de parsear_documento que el PDF y replica sus estilos
+    (Times New Roman, títulos centrados, secciones en negrita, cuerpo justificado,
+    numeración de páginas). La plantilla con estilos, márgenes y pie de página se
+    arma una sola vez; cada documento parte de una copia de esos bytes.
+    """
+
+    # Subir cuando cambie el formato del DOCX (cambia el ETag de las descargas)
+    VERSION = "1"
+
+    MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+    # nombre -> (tamaño, negrita, alineación, espacio antes, espacio después)
+    _ESTILOS = {
+        "TituloPrincipal": (14, True, WD_ALIGN_PARAGRAPH.CENTER, 0, 12),
+        "TituloSeccion": (12, True, WD_ALIGN_PARAGRAPH.LEFT, 12, 8),
+        "Justify": (11, False, WD_ALIGN_PARAGRAPH.JUSTIFY, 0, 6),
+        "Encabezado": (11, False, WD_ALIGN_PARAGRAPH.LEFT, 0, 4),
+    }
+
+    def __init__(self):
+        self._plantilla = self._crear_plantilla()
+
+    def renderizar(self, documento_texto: str) -> BytesIO:
+        """
+        Renderiza el texto del documento y retorna el DOCX en un buffer posicionado al inicio
+        """
+        documento = Document(BytesIO(self._plantilla))
+
+        for bloque in parsear_documento(documento_texto):
+            if bloque.tipo == "vacio":
+                documento.add_paragraph(style="Espacio")
+
+            elif bloque.tipo == "titulo":
+                documento.add_paragraph(bloque.texto, style="TituloPrincipal")
+
+            elif bloque.tipo == "seccion":
+                documento.add_paragraph(bloque.texto, style="TituloSeccion")
+
+            elif bloque.tipo == "subtitulo":
+                documento.add_paragraph(style="Encabezado").add_run(bloque.texto).bold = True
+
+            elif bloque.tipo == "negrita":
+                documento.add_paragraph(style="Justify").add_run(bloque.texto).bold = True
+
+            elif bloque.tipo == "firma":
+                documento.add_paragraph(bloque.texto, style="Encabezado")
 
-        # Detectar otras líneas en negrita
-        elif re.match(patron_linea_negrita, linea_stripped):
-            texto_limpio = linea_stripped.replace('**', '').strip()
-            # Si está en mayúsculas o es corto, podría ser subtítulo
-            if linea_stripped.isupper() or len(texto_limpio) < 80:
-                p = Paragraph(f"<b>{texto_limpio}</b>", styles['Encabezado'])
             else:
-                p = Paragraph(f"<b>{texto_limpio}</b>", styles['Justify'])
-            story.append(p)
+                documento.add_paragraph(bloque.texto, style="Justify")
 
-        # Detectar líneas de firma (guiones bajos)
-        elif re.match(patron_guion_bajo, linea_stripped):
-            p = Paragraph(linea_stripped, styles['Encabezado'])
-            story.append(p)
+        buffer = BytesIO()
+        documento.save(buffer)
+        buffer.seek(0)
 
-        # Texto normal
-        else:
-            # Preservar formato de listas y viñetas
-            p = Paragraph(linea, styles['Justify'])
-            story.append(p)
+        return buffer
+
+    def _crear_plantilla(self) -> bytes:
+        documento = Document()
+
+        # Mismos márgenes que el PDF (1" y 0.75" abajo para la numeración)
+        for seccion in documento.sections:
+            seccion.page_width, seccion.page_height = Inches(8.5), Inches(11)
+            seccion.left_margin = seccion.right_margin = seccion.top_margin = Inches(1)
+            seccion.bottom_margin = Inches(0.75)
+            self._agregar_numero_pagina(seccion.footer.paragraphs[0])
+
+        normal = documento.styles["Normal"]
+        normal.font.name = "Times New Roman"
+        normal.font.size = Pt(11)
+        normal.element.rPr.rFonts.set(qn("w:eastAsia"), "Times New Roman")
+
+        for nombre, (tamano, negrita, alineacion, antes, despues) in self._ESTILOS.items():
+            estilo = documento.styles.add_style(nombre, 1)  # 1 = WD_STYLE_TYPE.PARAGRAPH
+            estilo.base_style = normal
+            estilo.font.size = Pt(tamano)
+            estilo.font.bold = negrita
+            estilo.paragraph_format.alignment = alineacion
+            estilo.paragraph_format.space_before = Pt(antes)
+            estilo.paragraph_format.space_after = Pt(despues)
+
+        # Línea vacía del documento ≈ Spacer de 0.15" del PDF
+        espacio = documento.styles.add_style("Espacio", 1)
+        espacio.base_style = normal
+        espacio.font.size = Pt(6)
+        espacio.paragraph_format.space_after = Pt(0)
+
+        buffer = BytesIO()
+        documento.save(buffer)
+        return buffer.getvalue()
 
-    # Construir el PDF con numeración de páginas
-    doc.build(story, onFirstPage=_agregar_numero_pagina, onLaterPages=_agregar_numero_pagina)
-    buffer.seek(0)
+    @staticmethod
+    def _agregar_numero_pagina(parrafo):
+        """
+        Pie "Página N" con un campo PAGE (Word calcula el número al abrir)
+        """
+        parrafo.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        parrafo.add_run("Página ").font.size = Pt(9)
 
-    return buffer
+        campo = OxmlElement("w:fldSimple")
+        campo.set(qn("w:instr"), "PAGE")
+        run = parrafo.add_run()
+        run.font.size = Pt(9)
+        campo.append(run._r)
+        parrafo._p.append(campo)
+
+
+_renderizador_docx: Optional[RenderizadorDOCX] = None
+
+
+def obtener_renderizador_docx() -> RenderizadorDOCX:
+    """
+    Renderizador DOCX compartido del proceso (se crea la primera vez)
+    """
+    global _renderizador_docx
+    if _renderizador_docx is None:
+        _renderizador_docx = RenderizadorDOCX()
+    return _renderizador_docx
+
+
+def generar_docx(documento_texto: str) -> BytesIO:
+    """
+    Genera un documento Word del documento legal con el mismo formato del PDF
+    """
+    return obtener_renderizador_docx().renderizar(documento_texto)
+
+
+def calcular_etag_docx(documento_texto: str) -> str:
+    """
+    ETag fuerte del DOCX de un documento (hash del texto + versión del renderizador)
+    """
+    contenido = f"docx{RenderizadorDOCX.VERSION}\0{documento_texto}".encode("utf-8")
+    return f'"{hashlib.sha256(contenido).hexdigest()}"'
+
+
+def iterar_buffer(buffer: BytesIO, tamano_bloque: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Recorre un buffer en bloques de tamaño fijo (para StreamingResponse)
+    """
+    while True:
+        bloque = buffer.read(tamano_bloque)
+        if not bloque:
+            break
+        yield bloque
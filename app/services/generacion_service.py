@@ -0,0 +1,329 @@
+"""
+Servicio de generación de documentos en segundo plano
+
+Mantiene una cola de trabajos en proceso atendida por un pool de workers asyncio.
+El endpoint solo valida y encola; el worker llama a OpenAI sin retener conexiones
+de BD y al terminar guarda el resultado como versión nueva del documento del caso.
+
+Los trabajos en modo stream publican cada fragmento de texto a sus suscriptores
+(colas asyncio, una por cliente SSE). Si un cliente se desconecta solo se retira
+su cola: el trabajo continúa y el documento se persiste igual.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models import Caso, EstadoCaso
+from ..models.caso import cargar_grupos, GRUPO_DOCUMENTO
+from . import openai_service, cache_generacion_service, pdf_cache_service, versiones_service
+
+logger = logging.getLogger(__name__)
+
+# Estados de un trabajo de generación
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+COMPLETADO = "completado"
+ERROR = "error"
+
+_trabajos = {}  # trabajo_id -> dict con el estado del trabajo
+_cola: Optional[asyncio.Queue] = None
+_workers = []
+_loop = None
+
+
+def construir_datos_caso(caso: Caso) -> dict:
+    """
+    Arma el diccionario de datos que se envía a GPT para generar el documento
+
+    Args:
+        caso: Caso con los campos ya validados
+
+    Returns:
+        dict: Datos del caso en el formato esperado por openai_service
+    """
+    return {
+        'nombre_solicitante': caso.nombre_solicitante,
+        'identificacion_solicitante': caso.identificacion_solicitante,
+        'direccion_solicitante': caso.direccion_solicitante,
+        'telefono_solicitante': caso.telefono_solicitante,
+        'email_solicitante': caso.email_solicitante,
+        'actua_en_representacion': caso.actua_en_representacion,
+        'nombre_representado': caso.nombre_representado,
+        'identificacion_representado': caso.identificacion_representado,
+        'relacion_representado': caso.relacion_representado,
+        'tipo_representado': caso.tipo_representado,
+        'entidad_accionada': caso.entidad_accionada,
+        'direccion_entidad': caso.direccion_entidad,
+        'hechos': caso.hechos,
+        'ciudad_de_los_hechos': caso.ciudad_de_los_hechos,
+        'derechos_vulnerados': caso.derechos_vulnerados,
+        'pretensiones': caso.pretensiones,
+        'fundamentos_derecho': caso.fundamentos_derecho,
+        'pruebas': caso.pruebas,
+    }
+
+
+async def generar_texto_documento(tipo_doc: str, datos_caso: dict, caso_id: Optional[int] = None) -> str:
+    """
+    Genera el texto del documento según su tipo (TUTELA o DERECHO_PETICION)
+
+    Si ya se generó un documento con exactamente los mismos datos, lo retorna
+    desde el caché sin llamar a OpenAI.
+    """
+    documento = await asyncio.to_thread(cache_generacion_service.obtener, tipo_doc, datos_caso)
+    if documento is not None:
+        return documento
+
+    if tipo_doc == 'TUTELA':
+        documento = await openai_service.generar_tutela(datos_caso)
+    else:
+        documento = await openai_service.generar_derecho_peticion(datos_caso)
+
+    await asyncio.to_thread(cache_generacion_service.guardar, tipo_doc, datos_caso, documento, caso_id)
+    return documento
+
+
+def aplicar_documento_generado(caso: Caso, documento: str, db: Session):
+    """
+    Guarda el documento como versión nueva del caso, lo marca como GENERADO y fija
+    el vencimiento (14 días)
+    """
+    if caso.documento_generado and caso.documento_generado != documento:
+        pdf_cache_service.invalidar(caso.documento_generado)
+
+    versiones_service.guardar_documento(db, caso, documento, origen="generacion")
+    caso.estado = EstadoCaso.GENERADO
+    caso.fecha_vencimiento = datetime.utcnow() + timedelta(days=14)
+
+
+def encolar_generacion(caso_id: int, user_id: int, tipo_doc: str, datos_caso: dict, stream: bool = False) -> dict:
+    """
+    Encola un trabajo de generación para el caso
+
+    Si el caso ya tiene un trabajo pendiente o en proceso, retorna ese mismo trabajo
+    en lugar de crear uno nuevo (evita generaciones duplicadas por doble clic).
+
+    Debe llamarse desde el event loop (endpoint async).
+
+    Args:
+        caso_id: ID del caso
+        user_id: ID del dueño del caso
+        tipo_doc: "TUTELA" o "DERECHO_PETICION"
+        datos_caso: Datos ya validados (ver construir_datos_caso)
+        stream: Si True, el documento se pide a OpenAI con stream=True y cada
+                fragmento se publica a los suscriptores a medida que llega
+
+    Returns:
+        dict: Trabajo encolado
+    """
+    _asegurar_workers()
+    _purgar_trabajos_antiguos()
+
+    for trabajo in _trabajos.values():
+        if trabajo["caso_id"] == caso_id and trabajo["estado"] in (PENDIENTE, EN_PROCESO):
+            if stream and trabajo["estado"] == PENDIENTE:
+                trabajo["stream"] = True
+            return trabajo
+
+    trabajo = {
+        "id": uuid.uuid4().hex,
+        "caso_id": caso_id,
+        "user_id": user_id,
+        "tipo_documento": tipo_doc,
+        "datos_caso": datos_caso,
+        "stream": stream,
+        "texto": "",  # Texto acumulado (para suscriptores que llegan tarde)
+        "suscriptores": [],
+        "estado": PENDIENTE,
+        "error": None,
+        "creado": datetime.utcnow(),
+        "iniciado": None,
+        "finalizado": None,
+    }
+    _trabajos[trabajo["id"]] = trabajo
+    _cola.put_nowait(trabajo["id"])
+
+    logger.info(f"📥 Generación encolada - Caso: {caso_id}, Trabajo: {trabajo['id']} (en cola: {_cola.qsize()})")
+
+    return trabajo
+
+
+def obtener_trabajo(trabajo_id: str) -> Optional[dict]:
+    """
+    Retorna el trabajo con ese ID o None si no existe (o ya fue purgado)
+    """
+    return _trabajos.get(trabajo_id)
+
+
+def suscribir(trabajo: dict) -> asyncio.Queue:
+    """
+    Suscribe una cola a los eventos del trabajo
+
+    La cola recibe tuplas (evento, dato):
+    - ("fragmento", str): texto nuevo del documento
+    - ("fin", None): documento generado y guardado en el caso
+    - ("error", str): la generación falló
+
+    Si el trabajo ya produjo texto, la cola recibe primero todo lo acumulado.
+    """
+    cola = asyncio.Queue()
+
+    if trabajo["texto"]:
+        cola.put_nowait(("fragmento", trabajo["texto"]))
+
+    if trabajo["estado"] == COMPLETADO:
+        cola.put_nowait(("fin", None))
+    elif trabajo["estado"] == ERROR:
+        cola.put_nowait(("error", trabajo["error"]))
+    else:
+        trabajo["suscriptores"].append(cola)
+
+    return cola
+
+
+def desuscribir(trabajo: dict, cola: asyncio.Queue):
+    """
+    Retira la cola de los suscriptores (cliente desconectado); el trabajo sigue corriendo
+    """
+    if cola in trabajo["suscriptores"]:
+        trabajo["suscriptores"].remove(cola)
+
+
+def serializar_trabajo(trabajo: dict) -> dict:
+    """
+    Formato público de un trabajo (sin los datos del caso)
+    """
+    return {
+        "trabajo_id": trabajo["id"],
+        "caso_id": trabajo["caso_id"],
+        "tipo_documento": trabajo["tipo_documento"],
+        "estado": trabajo["estado"],
+        "error": trabajo["error"],
+        "creado": trabajo["creado"],
+        "iniciado": trabajo["iniciado"],
+        "finalizado": trabajo["finalizado"],
+    }
+
+
+def _asegurar_workers():
+    """
+    Crea la cola y arranca los workers en el event loop actual (solo la primera vez)
+    """
+    global _cola, _workers, _loop
+
+    loop = asyncio.get_running_loop()
+    if _cola is not None and _loop is loop:
+        return
+
+    _loop = loop
+    _cola = asyncio.Queue()
+    _workers = [
+        loop.create_task(_worker(n))
+        for n in range(max(1, settings.GENERACION_MAX_WORKERS))
+    ]
+    logger.info(f"⚙️ Pool de generación iniciado con {len(_workers)} workers")
+
+
+async def _worker(numero: int):
+    while True:
+        trabajo_id = await _cola.get()
+        try:
+            trabajo = _trabajos.get(trabajo_id)
+            if trabajo:
+                await _ejecutar_trabajo(trabajo, numero)
+        finally:
+            _cola.task_done()
+
+
+async def _ejecutar_trabajo(trabajo: dict, numero: int):
+    trabajo["estado"] = EN_PROCESO
+    trabajo["iniciado"] = datetime.utcnow()
+    logger.info(f"🧠 Worker {numero} generando documento - Caso: {trabajo['caso_id']}")
+
+    try:
+        # La llamada a OpenAI es async (cliente compartido) y no retiene ninguna conexión de BD
+        if trabajo["stream"]:
+            documento = await _generar_con_stream(trabajo)
+        else:
+            documento = await generar_texto_documento(
+                trabajo["tipo_documento"], trabajo["datos_caso"], trabajo["caso_id"]
+            )
+            _publicar(trabajo, "fragmento", documento)
+
+        await asyncio.to_thread(_guardar_documento, trabajo["caso_id"], documento)
+
+        trabajo["estado"] = COMPLETADO
+        _publicar(trabajo, "fin", None)
+        logger.info(f"✅ Trabajo {trabajo['id']} completado - Caso: {trabajo['caso_id']}")
+
+    except Exception as e:
+        trabajo["estado"] = ERROR
+        trabajo["error"] = str(e)
+        _publicar(trabajo, "error", str(e))
+        logger.error(f"❌ Error en trabajo {trabajo['id']} (caso {trabajo['caso_id']}): {str(e)}")
+
+    finally:
+        trabajo["finalizado"] = datetime.utcnow()
+        trabajo["datos_caso"] = None  # Liberar memoria
+        trabajo["texto"] = ""
+        trabajo["suscriptores"] = []
+
+
+async def _generar_con_stream(trabajo: dict) -> str:
+    """
+    Consume el stream de OpenAI y publica cada fragmento a los suscriptores
+
+    Con un hit de caché el documento completo se publica como un solo fragmento.
+    """
+    tipo_doc, datos_caso = trabajo["tipo_documento"], trabajo["datos_caso"]
+
+    documento = await asyncio.to_thread(cache_generacion_service.obtener, tipo_doc, datos_caso)
+    if documento is not None:
+        _publicar(trabajo, "fragmento", documento)
+        return documento
+
+    fragmentos = []
+    async for fragmento in openai_service.generar_documento_stream(tipo_doc, datos_caso):
+        fragmentos.append(fragmento)
+        _publicar(trabajo, "fragmento", fragmento)
+
+    documento = "".join(fragmentos)
+    await asyncio.to_thread(cache_generacion_service.guardar, tipo_doc, datos_caso, documento, trabajo["caso_id"])
+    return documento
+
+
+def _publicar(trabajo: dict, evento: str, dato):
+    if evento == "fragmento":
+        trabajo["texto"] += dato
+    for cola in trabajo["suscriptores"]:
+        cola.put_nowait((evento, dato))
+
+
+def _guardar_documento(caso_id: int, documento: str):
+    db = SessionLocal()
+    try:
+        caso = db.query(Caso).options(*cargar_grupos(GRUPO_DOCUMENTO)).filter(Caso.id == caso_id).first()
+        if not caso:
+            raise ValueError(f"Caso {caso_id} no encontrado")
+
+        aplicar_documento_generado(caso, documento, db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _purgar_trabajos_antiguos():
+    limite = datetime.utcnow() - timedelta(minutes=settings.GENERACION_TRABAJOS_TTL_MINUTOS)
+    antiguos = [
+        trabajo_id for trabajo_id, trabajo in _trabajos.items()
+        if trabajo["finalizado"] is not None and trabajo["finalizado"] < limite
+    ]
+    for trabajo_id in antiguos:
+        del _trabajos[trabajo_id]
@@ -0,0 +1,228 @@
+"""
+Índice local de sentencias de la Corte Constitucional
+
+Permite verificar citas como "Sentencia T-760/2008" sin llamar a GPT: las que
+están en el índice se resuelven localmente y solo las desconocidas se envían al
+modelo (ver ai_analysis_service.validar_jurisprudencia).
+
+Formato en disco: JSON comprimido con gzip
+    {"version": 1, "sentencias": {"T-760/2008": {"tema": "...", "etiquetas": [...]}}}
+Se carga una sola vez en un dict, así que cada consulta es O(1).
+
+El índice se construye desde un CSV (tipo,numero,anio,tema,etiquetas separadas
+por ";") o desde un JSON (lista de objetos con esas mismas claves).
+
+Uso:
+    python -m app.services.jurisprudencia_service construir app/data/jurisprudencia_semilla.csv
+    python -m app.services.jurisprudencia_service info
+    python -m app.services.jurisprudencia_service buscar T-760/2008
+"""
+
+import csv
+import gzip
+import json
+import logging
+import os
+import re
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+VERSION_INDICE = 1
+
+_PATRON_REFERENCIA = re.compile(r'^\s*(?:Sentencia\s+)?([TCS]U?)-(\d+)[/-](\d{4})\s*$', re.IGNORECASE)
+
+_indice: Optional[Dict[str, dict]] = None
+_lock = threading.Lock()
+
+
+def normalizar_clave(tipo: str, numero, anio) -> str:
+    """
+    Clave canónica de una sentencia: "T-760/2008" (sin ceros a la izquierda)
+    """
+    return f"{str(tipo).strip().upper()}-{int(numero)}/{int(anio)}"
+
+
+def clave_desde_referencia(referencia: str) -> Optional[str]:
+    """
+    Convierte "Sentencia T-0760-2008", "t-760/2008", etc. en la clave canónica (o None)
+    """
+    match = _PATRON_REFERENCIA.match(referencia)
+    if not match:
+        return None
+    return normalizar_clave(*match.groups())
+
+
+def buscar(tipo: str, numero, anio) -> Optional[dict]:
+    """
+    Busca una sentencia en el índice
+
+    Returns:
+        dict con tema y etiquetas, o None si no está indexada
+    """
+    return obtener_indice().get(normalizar_clave(tipo, numero, anio))
+
+
+def resolver_citas(sentencias: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """
+    Separa las citas en conocidas (resueltas con el índice) y desconocidas
+
+    Args:
+        sentencias: Lista de {"referencia", "tipo", "numero", "año"}
+
+    Returns:
+        tuple: (conocidas, desconocidas). Las conocidas incluyen tema y etiquetas.
+    """
+    conocidas, desconocidas = [], []
+    for sentencia in sentencias:
+        entrada = buscar(sentencia["tipo"], sentencia["numero"], sentencia["año"])
+        if entrada:
+            conocidas.append({**sentencia, "tema": entrada.get("tema", ""), "etiquetas": entrada.get("etiquetas", [])})
+        else:
+            desconocidas.append(sentencia)
+    return conocidas, desconocidas
+
+
+def obtener_indice() -> Dict[str, dict]:
+    """
+    Retorna el índice en memoria (lo carga desde JURISPRUDENCIA_INDICE_PATH la primera vez)
+
+    Si el archivo no existe o está corrupto se usa un índice vacío: todas las
+    citas se escalan a GPT, igual que sin índice.
+    """
+    global _indice
+    if _indice is None:
+        with _lock:
+            if _indice is None:
+                _indice = cargar_indice(settings.JURISPRUDENCIA_INDICE_PATH)
+    return _indice
+
+
+def cargar_indice(ruta: str) -> Dict[str, dict]:
+    """
+    Lee un índice .json.gz del disco
+    """
+    if not os.path.exists(ruta):
+        logger.warning(f"⚠️ Índice de jurisprudencia no encontrado en {ruta}; se validará todo con IA")
+        return {}
+
+    try:
+        with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+            contenido = json.load(archivo)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Índice de jurisprudencia inválido ({ruta}): {str(e)}")
+        return {}
+
+    if contenido.get("version") != VERSION_INDICE:
+        logger.error(f"❌ Versión de índice no soportada: {contenido.get('version')}")
+        return {}
+
+    sentencias = contenido.get("sentencias", {})
+    logger.info(f"📚 Índice de jurisprudencia cargado: {len(sentencias)} sentencias")
+    return sentencias
+
+
+def recargar_indice():
+    """
+    Descarta el índice en memoria; la próxima consulta lo vuelve a leer del disco
+    """
+    global _indice
+    with _lock:
+        _indice = None
+
+
+def construir_indice(origen: str, destino: str) -> int:
+    """
+    Construye el índice comprimido desde un CSV o JSON
+
+    Columnas / claves: tipo, numero, anio (o año), tema, etiquetas
+    (etiquetas separadas por ";" en CSV, lista en JSON). Filas inválidas se omiten.
+
+    Returns:
+        int: Número de sentencias indexadas
+    """
+    if origen.lower().endswith(".json"):
+        with open(origen, encoding="utf-8") as archivo:
+            filas = json.load(archivo)
+    else:
+        with open(origen, encoding="utf-8", newline="") as archivo:
+            filas = list(csv.DictReader(archivo))
+
+    sentencias = {}
+    omitidas = 0
+    for fila in filas:
+        try:
+            clave = normalizar_clave(fila["tipo"], fila["numero"], fila.get("anio") or fila.get("año"))
+        except (KeyError, TypeError, ValueError):
+            omitidas += 1
+            continue
+
+        etiquetas = fila.get("etiquetas") or []
+        if isinstance(etiquetas, str):
+            etiquetas = [etiqueta.strip() for etiqueta in etiquetas.split(";") if etiqueta.strip()]
+
+        sentencias[clave] = {"tema": (fila.get("tema") or "").strip(), "etiquetas": etiquetas}
+
+    directorio = os.path.dirname(destino)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+
+    contenido = {"version": VERSION_INDICE, "sentencias": dict(sorted(sentencias.items()))}
+    with gzip.open(destino, "wt", encoding="utf-8") as archivo:
+        json.dump(contenido, archivo, ensure_ascii=False, separators=(",", ":"))
+
+    if omitidas:
+        logger.warning(f"⚠️ {omitidas} filas inválidas omitidas")
+    logger.info(f"✅ Índice construido: {len(sentencias)} sentencias → {destino}")
+    return len(sentencias)
+
+
+# CLI Entry Point
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    if len(sys.argv) < 2:
+        print("\nUso: python -m app.services.jurisprudencia_service [comando]")
+        print("\nComandos disponibles:")
+        print("  construir <origen.csv|origen.json> [destino.json.gz]  - Construir el índice")
+        print("  info [indice.json.gz]                                  - Resumen del índice")
+        print("  buscar <T-760/2008>                                    - Consultar una sentencia")
+        sys.exit(1)
+
+    comando = sys.argv[1].lower()
+
+    if comando == "construir" and len(sys.argv) >= 3:
+        destino = sys.argv[3] if len(sys.argv) >= 4 else settings.JURISPRUDENCIA_INDICE_PATH
+        construir_indice(sys.argv[2], destino)
+
+    elif comando == "info":
+        ruta = sys.argv[2] if len(sys.argv) >= 3 else settings.JURISPRUDENCIA_INDICE_PATH
+        indice = cargar_indice(ruta)
+        por_tipo = {}
+        for clave in indice:
+            tipo = clave.split("-")[0]
+            por_tipo[tipo] = por_tipo.get(tipo, 0) + 1
+        print(f"\nÍndice: {ruta}")
+        print(f"Sentencias: {len(indice)}")
+        for tipo, cantidad in sorted(por_tipo.items()):
+            print(f"  {tipo}: {cantidad}")
+
+    elif comando == "buscar" and len(sys.argv) >= 3:
+        clave = clave_desde_referencia(sys.argv[2])
+        if not clave:
+            print(f"Referencia inválida: {sys.argv[2]}")
+            sys.exit(1)
+        entrada = obtener_indice().get(clave)
+        if entrada:
+            print(f"{clave}: {entrada['tema']} [{', '.join(entrada['etiquetas'])}]")
+        else:
+            print(f"{clave}: no está en el índice")
+            sys.exit(2)
+
+    else:
+        print(f"Comando inválido: {' '.join(sys.argv[1:])}")
+        sys.exit(1)
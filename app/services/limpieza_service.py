@@ -2,104 +2,150 @@
 Servicio para limpieza automática de datos (CRON jobs)
 """
 
+import logging
 from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, select, text
 from sqlalchemy.orm import Session
 
-from ..models import Caso, SesionDiaria, EstadoCaso
+from ..core.config import settings
+from ..models import Analisis, Caso, Documento, EstadoCaso, Mensaje, Pago, SesionDiaria
+
+logger = logging.getLogger(__name__)
 
+# Tablas con caso_id (antes las borraba el cascade "all, delete-orphan" de Caso)
+TABLAS_HIJAS_CASO = (Mensaje, Pago, Documento, Analisis)
 
-def eliminar_documentos_vencidos(db: Session) -> int:
+
+def eliminar_documentos_vencidos(db: Session, lote: Optional[int] = None) -> int:
     """
     Elimina casos GENERADOS sin pagar que vencieron (14 días desde creación)
 
     Args:
         db: Sesión de base de datos
+        lote: Casos por lote (default: LIMPIEZA_LOTE)
 
     Returns:
         int: Cantidad de casos eliminados
     """
     ahora = datetime.utcnow()
 
-    # Buscar casos generados vencidos
+    # Casos generados vencidos
     # NOTA: En PostgreSQL, el enum tiene 'GENERADO' en mayúsculas (legacy)
-    from sqlalchemy import text
-    casos_vencidos = db.query(Caso).filter(
-        text("estado = 'GENERADO'"),
-        Caso.documento_desbloqueado == False,
-        Caso.fecha_vencimiento != None,
-        Caso.fecha_vencimiento < ahora
-    ).all()
-
-    cantidad = len(casos_vencidos)
-
-    # Eliminar casos
-    for caso in casos_vencidos:
-        db.delete(caso)
-
-    db.commit()
-
-    return cantidad
-
-
-def eliminar_casos_temporales_antiguos(db: Session, dias_antiguedad: int = 1) -> int:
+    return _eliminar_casos_por_lotes(
+        db,
+        [
+            text("estado = 'GENERADO'"),
+            Caso.documento_desbloqueado == False,
+            Caso.fecha_vencimiento != None,
+            Caso.fecha_vencimiento < ahora
+        ],
+        "documentos vencidos",
+        lote
+    )
+
+
+def eliminar_casos_temporales_antiguos(db: Session, dias_antiguedad: int = 1, lote: Optional[int] = None) -> int:
     """
     Elimina casos TEMPORAL abandonados (sin completar) después de N días
 
     Args:
         db: Sesión de base de datos
         dias_antiguedad: Días de antigüedad para considerar abandonado (default: 1)
+        lote: Casos por lote (default: LIMPIEZA_LOTE)
 
     Returns:
         int: Cantidad de casos eliminados
     """
     limite = datetime.utcnow() - timedelta(days=dias_antiguedad)
 
-    # Buscar casos temporales antiguos
+    # Casos temporales antiguos
     # NOTA: En PostgreSQL, el enum tiene 'temporal' en minúsculas (nuevo)
-    from sqlalchemy import text
-    casos_temporales = db.query(Caso).filter(
-        text("estado = 'temporal'"),
-        Caso.created_at < limite
-    ).all()
-
-    cantidad = len(casos_temporales)
-
-    # Eliminar casos
-    for caso in casos_temporales:
-        db.delete(caso)
-
-    db.commit()
-
-    return cantidad
-
-
-def limpiar_sesiones_diarias_antiguas(db: Session, dias_antiguedad: int = 90) -> int:
+    return _eliminar_casos_por_lotes(
+        db,
+        [
+            text("estado = 'temporal'"),
+            Caso.created_at < limite
+        ],
+        "casos temporales",
+        lote
+    )
+
+
+def limpiar_sesiones_diarias_antiguas(db: Session, dias_antiguedad: int = 90, lote: Optional[int] = None) -> int:
     """
     Elimina registros de sesiones_diarias mayores a N días
 
     Args:
         db: Sesión de base de datos
         dias_antiguedad: Días de antigüedad para eliminar (default: 90)
+        lote: Registros por lote (default: LIMPIEZA_LOTE)
 
     Returns:
         int: Cantidad de registros eliminados
     """
     limite = datetime.utcnow() - timedelta(days=dias_antiguedad)
+    lote = lote or settings.LIMPIEZA_LOTE
+    total = 0
 
-    # Buscar sesiones antiguas
-    sesiones_antiguas = db.query(SesionDiaria).filter(
-        SesionDiaria.fecha < limite.date()
-    ).all()
+    # DELETE ... WHERE id IN (SELECT id ... LIMIT lote), un commit por lote
+    while True:
+        ids_lote = select(SesionDiaria.id).where(
+            SesionDiaria.fecha < limite.date()
+        ).order_by(SesionDiaria.id).limit(lote).scalar_subquery()
+
+        eliminadas = db.execute(
+            delete(SesionDiaria).where(SesionDiaria.id.in_(ids_lote)),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+        db.commit()
 
-    cantidad = len(sesiones_antiguas)
+        if not eliminadas:
+            break
 
-    # Eliminar sesiones
-    for sesion in sesiones_antiguas:
-        db.delete(sesion)
+        total += eliminadas
+        logger.info(f"🗑️ Sesiones diarias antiguas eliminadas: {total}")
 
-    db.commit()
+    return total
 
-    return cantidad
+
+def _eliminar_casos_por_lotes(db: Session, condiciones: list, descripcion: str, lote: Optional[int]) -> int:
+    """
+    Elimina por lotes los casos que cumplen las condiciones, con sus filas hijas
+
+    Cada lote: SELECT de hasta LOTE ids, DELETE explícito de las tablas hijas
+    (en lugar del cascade del ORM, que cargaba cada caso y cada hijo en memoria)
+    y DELETE de los casos; se confirma por lote para no mantener transacciones
+    largas.
+
+    Returns:
+        int: Cantidad de casos eliminados
+    """
+    lote = lote or settings.LIMPIEZA_LOTE
+    total = 0
+
+    while True:
+        ids = db.execute(
+            select(Caso.id).where(*condiciones).order_by(Caso.id).limit(lote)
+        ).scalars().all()
+        if not ids:
+            break
+
+        for modelo in TABLAS_HIJAS_CASO:
+            db.execute(
+                delete(modelo).where(modelo.caso_id.in_(ids)),
+                execution_options={"synchronize_session": False}
+            )
+        total += db.execute(
+            delete(Caso).where(Caso.id.in_(ids)),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+        db.commit()
+
+        logger.info(f"🗑️ Limpieza de {descripcion}: {total} casos eliminados")
+
+    return total
 
 
 def ejecutar_limpieza_completa(db: Session) -> dict:
@@ -0,0 +1,409 @@
+"""
+Buffer write-behind para el webhook de mensajes del agente
+
+Con MENSAJES_WRITE_BEHIND activo, POST /mensajes/ no inserta en la BD: el mensaje
+se anota en un diario en disco (una línea JSON, con fsync antes de responder) y
+queda en memoria hasta el siguiente vaciado, que inserta todo lo pendiente con
+un solo INSERT multi-fila cada MENSAJES_FLUSH_INTERVALO segundos (o antes, si se
+juntan MENSAJES_FLUSH_MAX_LOTE).
+
+Garantías:
+- Un mensaje confirmado al agente ya está en el diario (fsync)
+- Tras insertar un lote, solo se recorta del diario lo que quedó en la BD
+- Al arrancar se reinsertan los diarios huérfanos (procesos que murieron sin
+  vaciar), omitiendo filas que ya estaban en la BD; al apagar se vacía todo
+- Solo los errores transitorios (conexión, pool) devuelven el lote a la cola; una
+  fila que la BD rechaza por sus datos se aparta a mensajes-descartados.jsonl
+  (en MENSAJES_WAL_DIR) y no bloquea al resto
+- Cada proceso de uvicorn usa su propio diario, bloqueado con flock desde antes
+  de aparecer con su nombre definitivo
+
+Las lecturas que necesitan ver los mensajes recientes (GET /mensajes/caso/{id},
+procesar_transcripcion) llaman antes a vaciar_para_lectura(). vaciar() solo
+inserta lo pendiente de este proceso: con un único worker la lectura ve todo lo
+confirmado al agente. Con varios workers, lo que recibió otro worker se ve tras
+su siguiente vaciado; la lectura espera un intervalo si algún otro diario tiene
+entradas, pero si ese INSERT falla o tarda más la lectura no lo verá todavía.
+"""
+
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import and_, insert, select
+
+from ..core.config import settings
+from ..core.database import engine, es_error_transitorio
+from ..models.mensaje import Mensaje
+
+logger = logging.getLogger(__name__)
+
+# Columnas que puede traer una fila; las que falten se insertan como NULL
+_COLUMNAS_INSERTABLES = ("caso_id", "seq", "remitente", "texto", "duracion_audio", "confianza", "timestamp")
+
+_lock = threading.Lock()  # Protege diario + pendientes (se usan desde hilos)
+_pendientes: List[dict] = []
+_diario = None  # Archivo abierto del diario de este proceso
+_ruta_diario: Optional[str] = None
+_tarea: Optional[asyncio.Task] = None
+_lote_lleno: Optional[asyncio.Event] = None
+_lock_vaciado: Optional[asyncio.Lock] = None
+_metricas = {"encolados": 0, "vaciados": 0, "filas_insertadas": 0, "filas_descartadas": 0, "recuperados": 0}
+
+
+def esta_activo() -> bool:
+    return settings.MENSAJES_WRITE_BEHIND and _tarea is not None
+
+
+async def iniciar():
+    """
+    Recupera diarios huérfanos y arranca el vaciado periódico (startup de la app)
+    """
+    global _tarea, _lote_lleno, _lock_vaciado
+    if not settings.MENSAJES_WRITE_BEHIND or _tarea is not None:
+        return
+
+    os.makedirs(settings.MENSAJES_WAL_DIR, exist_ok=True)
+    await asyncio.to_thread(_recuperar_huerfanos)
+    await asyncio.to_thread(_abrir_diario)
+
+    _lote_lleno = asyncio.Event()
+    _lock_vaciado = asyncio.Lock()
+    _tarea = asyncio.create_task(_bucle_vaciado())
+    logger.info(
+        f"📝 Write-behind de mensajes activo (cada {settings.MENSAJES_FLUSH_INTERVALO}s, "
+        f"lotes de hasta {settings.MENSAJES_FLUSH_MAX_LOTE})"
+    )
+
+
+async def detener():
+    """
+    Detiene el vaciado periódico y vacía lo pendiente (shutdown de la app)
+    """
+    global _tarea, _diario
+    if _tarea is None:
+        return
+
+    _tarea.cancel()
+    try:
+        await _tarea
+    except asyncio.CancelledError:
+        pass
+    _tarea = None
+
+    await vaciar()
+
+    with _lock:
+        if _diario is not None and not _pendientes:
+            _diario.close()
+            _diario = None
+            os.remove(_ruta_diario)  # Todo quedó en la BD
+
+
+async def encolar(datos: dict) -> dict:
+    """
+    Anota un mensaje en el diario (durable al retornar) y lo deja pendiente de insertar
+
+    Args:
+        datos: Campos de Mensaje (caso_id, remitente, texto, duracion_audio, confianza, timestamp)
+
+    Returns:
+        dict: Los datos con el timestamp asignado
+    """
+    fila = {**datos, "timestamp": datos.get("timestamp") or datetime.utcnow()}
+    await asyncio.to_thread(_anotar, fila)
+
+    _metricas["encolados"] += 1
+    if len(_pendientes) >= settings.MENSAJES_FLUSH_MAX_LOTE:
+        _lote_lleno.set()
+
+    return fila
+
+
+async def vaciar() -> int:
+    """
+    Inserta ya todo lo pendiente
+
+    Returns:
+        int: Filas insertadas
+    """
+    if _lock_vaciado is None:
+        return 0
+
+    async with _lock_vaciado:
+        return await asyncio.to_thread(_vaciar_sincrono)
+
+
+async def vaciar_para_lectura():
+    """
+    Vacía lo pendiente antes de una lectura que debe ver los mensajes recientes
+
+    Si otro worker tiene entradas en su diario, espera un intervalo de vaciado
+    (lo que tarda ese worker en insertarlas).
+    """
+    if _lock_vaciado is None:
+        return
+
+    await vaciar()
+    if await asyncio.to_thread(_otros_diarios_con_entradas):
+        await asyncio.sleep(settings.MENSAJES_FLUSH_INTERVALO)
+
+
+def obtener_metricas() -> dict:
+    return {
+        **_metricas,
+        "activo": esta_activo(),
+        "pendientes": len(_pendientes),
+        "intervalo_s": settings.MENSAJES_FLUSH_INTERVALO,
+        "max_lote": settings.MENSAJES_FLUSH_MAX_LOTE,
+    }
+
+
+def insertar_lote(conexion, filas: List[dict]) -> List[int]:
+    """
+    Inserta varias filas de mensajes con un solo INSERT multi-fila
+
+    Las filas pueden traer distintos campos opcionales (model_dump(exclude_none=True)):
+    se completan todas con el mismo juego de columnas, porque el INSERT multi-fila
+    toma la lista de columnas de la primera.
+
+    Returns:
+        list: ids asignados, en el mismo orden de las filas
+    """
+    if not filas:
+        return []
+    ahora = datetime.utcnow()
+    completas = [
+        {**{columna: fila.get(columna) for columna in _COLUMNAS_INSERTABLES}, "timestamp": fila.get("timestamp") or ahora}
+        for fila in filas
+    ]
+    resultado = conexion.execute(insert(Mensaje).values(completas).returning(Mensaje.id))
+    return [fila.id for fila in resultado]
+
+
+async def _bucle_vaciado():
+    while True:
+        try:
+            await asyncio.wait_for(_lote_lleno.wait(), timeout=settings.MENSAJES_FLUSH_INTERVALO)
+        except asyncio.TimeoutError:
+            pass
+        _lote_lleno.clear()
+
+        try:
+            await vaciar()
+        except Exception as e:
+            # Error transitorio: lo no insertado sigue en memoria y en el diario; se
+            # reintenta en el siguiente ciclo
+            logger.error(f"❌ Error vaciando buffer de mensajes: {str(e)}")
+
+
+def _anotar(fila: dict):
+    linea = json.dumps({**fila, "timestamp": fila["timestamp"].isoformat()}, ensure_ascii=False) + "\n"
+    with _lock:
+        _diario.write(linea)
+        _diario.flush()
+        os.fsync(_diario.fileno())
+        _pendientes.append(fila)
+
+
+def _vaciar_sincrono() -> int:
+    global _pendientes
+
+    with _lock:
+        lote, _pendientes = _pendientes, []
+        fin_lote = _diario.tell()  # Todo lo anotado hasta aquí está en el lote
+
+    if not lote:
+        return 0
+
+    try:
+        insertadas = _insertar_tolerante(lote)
+    except Exception:
+        # _insertar_tolerante dejó en el lote solo lo que falta. El diario no se
+        # recorta: si el proceso muere, la recuperación omite lo que ya está en la BD
+        with _lock:
+            _pendientes = lote + _pendientes
+        raise
+
+    with _lock:
+        _recortar_diario(fin_lote)
+
+    _metricas["vaciados"] += 1
+    _metricas["filas_insertadas"] += insertadas
+    logger.info(f"📝 Buffer de mensajes vaciado: {insertadas} filas")
+    return insertadas
+
+
+def _insertar_tolerante(filas: List[dict]) -> int:
+    """
+    Inserta el lote completo; si la BD lo rechaza por los datos (FK de un caso
+    eliminado, un valor inválido...), reintenta fila por fila y aparta solo las
+    inválidas en el archivo de descartados
+
+    Un error transitorio se propaga. Las filas ya resueltas (insertadas o
+    descartadas) se van quitando de `filas`, así que lo que queda en la lista es
+    lo que hay que reintentar.
+    """
+    try:
+        with engine.begin() as conexion:
+            insertadas = len(insertar_lote(conexion, filas))
+        filas.clear()
+        return insertadas
+    except Exception as e:
+        if es_error_transitorio(e):
+            raise
+        logger.warning(f"⚠️ Lote de {len(filas)} mensajes rechazado ({type(e).__name__}), insertando fila por fila")
+
+    insertadas = 0
+    while filas:
+        try:
+            with engine.begin() as conexion:
+                insertar_lote(conexion, filas[:1])
+            insertadas += 1
+        except Exception as e:
+            if es_error_transitorio(e):
+                raise
+            _descartar(filas[0], e)
+        filas.pop(0)
+    return insertadas
+
+
+def _descartar(fila: dict, error: Exception):
+    """
+    Aparta una fila que la BD rechaza, para revisarla a mano en lugar de reintentarla
+    """
+    _metricas["filas_descartadas"] += 1
+    motivo = str(getattr(error, "orig", None) or error)
+    logger.error(f"❌ Mensaje descartado (caso {fila.get('caso_id')}): {motivo}")
+
+    linea = json.dumps(
+        {**fila, "error": motivo},
+        ensure_ascii=False,
+        default=lambda valor: valor.isoformat() if isinstance(valor, datetime) else str(valor),
+    )
+    try:
+        with open(os.path.join(settings.MENSAJES_WAL_DIR, "mensajes-descartados.jsonl"), "a", encoding="utf-8") as archivo:
+            archivo.write(linea + "\n")
+    except OSError as e:
+        logger.error(f"❌ No se pudo guardar el mensaje descartado: {str(e)} - {linea}")
+
+
+def _recortar_diario(fin_lote: int):
+    # Llamar con _lock tomado. Conserva solo lo anotado después del lote ya insertado.
+    global _diario
+
+    _diario.seek(fin_lote)
+    resto = _diario.read()
+
+    if not resto:
+        _diario.seek(0)
+        _diario.truncate()
+        _diario.flush()
+        os.fsync(_diario.fileno())
+        return
+
+    # Reescritura atómica: nuevo archivo (ya bloqueado) que reemplaza al actual
+    nuevo = _crear_bloqueado(_ruta_diario, resto)
+    _diario.close()
+    _diario = nuevo
+
+
+def _abrir_diario():
+    global _diario, _ruta_diario
+    _ruta_diario = os.path.join(settings.MENSAJES_WAL_DIR, f"mensajes-{os.getpid()}.wal")
+    _diario = _crear_bloqueado(_ruta_diario)
+
+
+def _crear_bloqueado(ruta: str, contenido: str = ""):
+    """
+    Crea (o reemplaza) un diario que aparece en ruta ya bloqueado con flock
+
+    Se crea con O_EXCL bajo un nombre temporal que _recuperar_huerfanos no
+    recorre y se renombra después de bloquearlo: un worker que arranca nunca
+    puede tomar por huérfano un diario recién creado.
+    """
+    descriptor, temporal = tempfile.mkstemp(prefix=".mensajes-", suffix=".creando", dir=os.path.dirname(ruta))
+    archivo = os.fdopen(descriptor, "a+", encoding="utf-8")
+    try:
+        fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        if contenido:
+            archivo.write(contenido)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        archivo.close()
+        os.remove(temporal)
+        raise
+    return archivo
+
+
+def _otros_diarios_con_entradas() -> bool:
+    # Un diario vacío es de un worker sin nada pendiente (se trunca tras cada vaciado)
+    for ruta in glob.glob(os.path.join(settings.MENSAJES_WAL_DIR, "mensajes-*.wal")):
+        if ruta == _ruta_diario:
+            continue
+        try:
+            if os.path.getsize(ruta) > 0:
+                return True
+        except FileNotFoundError:
+            continue  # Recortado o recuperado entre el glob y el stat
+    return False
+
+
+def _recuperar_huerfanos():
+    """
+    Reinserta diarios que ningún proceso vivo tiene bloqueados
+
+    Los temporales .mensajes-*.creando no se recorren: uno en creación aún no
+    tiene el bloqueo, y uno abandonado por una caída está vacío o repite
+    entradas que siguen en el diario al que iba a reemplazar.
+    """
+    for ruta in sorted(glob.glob(os.path.join(settings.MENSAJES_WAL_DIR, "mensajes-*.wal*"))):
+        with open(ruta, "r+", encoding="utf-8") as archivo:
+            try:
+                fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # Diario de otro worker activo
+
+            filas = []
+            for linea in archivo:
+                try:
+                    fila = json.loads(linea)
+                except ValueError:
+                    continue  # Última línea a medio escribir (caída durante la escritura)
+                fila["timestamp"] = datetime.fromisoformat(fila["timestamp"])
+                filas.append(fila)
+
+            nuevas = _filtrar_existentes(filas)
+            insertadas = _insertar_tolerante(nuevas) if nuevas else 0
+            _metricas["recuperados"] += insertadas
+
+        os.remove(ruta)
+        logger.info(f"♻️ Diario de mensajes recuperado ({os.path.basename(ruta)}): {insertadas} de {len(filas)} filas")
+
+
+def _filtrar_existentes(filas: List[dict]) -> List[dict]:
+    # Un proceso pudo morir después de insertar y antes de recortar el diario:
+    # (caso_id, timestamp, remitente) identifica al mensaje ya insertado
+    if not filas:
+        return []
+
+    with engine.connect() as conexion:
+        existentes = set(conexion.execute(
+            select(Mensaje.caso_id, Mensaje.timestamp, Mensaje.remitente).where(
+                and_(
+                    Mensaje.caso_id.in_(list({fila["caso_id"] for fila in filas})),
+                    Mensaje.timestamp >= min(fila["timestamp"] for fila in filas),
+                )
+            )
+        ).all())
+
+    return [fila for fila in filas if (fila["caso_id"], fila["timestamp"], fila["remitente"]) not in existentes]
@@ -4,9 +4,13 @@ Servicio para gestión de niveles de usuario
 
 from datetime import datetime, timedelta, date
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, case, func, select, update
 
+from ..core.niveles import NIVELES, limites_nivel
 from ..models import User, Pago, EstadoPago
+from . import cache_usuarios_service
+
+NIVEL_MAXIMO = max(NIVELES)  # ORO
 
 
 def calcular_nivel_usuario(user_id: int, db: Session) -> int:
@@ -26,49 +30,88 @@ def calcular_nivel_usuario(user_id: int, db: Session) -> int:
     Returns:
         int: 0=FREE, 1=BRONCE, 2=PLATA, 3=ORO
     """
-    hace_7_dias = datetime.utcnow() - timedelta(days=7)
+    return nivel_por_pagos(_contar_pagos_semana(user_id, db))
 
-    # Contar pagos exitosos en últimos 7 días
-    pagos_semana = db.query(Pago).filter(
-        Pago.user_id == user_id,
-        Pago.estado == EstadoPago.EXITOSO,
-        Pago.fecha_pago >= hace_7_dias
-    ).count()
 
-    # Determinar nivel según cantidad de pagos
-    if pagos_semana == 0:
-        return 0  # FREE
-    elif pagos_semana == 1:
-        return 1  # BRONCE
-    elif pagos_semana == 2:
-        return 2  # PLATA
-    else:  # 3 o más
-        return 3  # ORO
+def nivel_por_pagos(pagos_semana: int) -> int:
+    """
+    Nivel que corresponde a N pagos exitosos en la última semana (un nivel por pago, tope ORO)
+    """
+    return min(pagos_semana, NIVEL_MAXIMO)
 
 
-def recalcular_todos_los_niveles(db: Session):
+def recalcular_todos_los_niveles(db: Session, lote: int = 5000) -> dict:
     """
     Recalcula niveles de todos los usuarios (CRON diario)
 
-    Actualiza el nivel basado en pagos de la última semana (7 días)
+    Actualiza el nivel basado en pagos de la última semana (7 días) con
+    sentencias por conjunto: por cada rango de LOTE ids de usuario, un SELECT
+    que cuenta los cambios de nivel y un UPDATE users ... FROM (usuarios LEFT
+    JOIN pagos agrupado por usuario). Cada lote se confirma por separado para
+    no bloquear la tabla users durante todo el recálculo.
+
+    El UPDATE no pasa por el ORM, así que tras confirmar cada lote se vacía el
+    caché de usuarios: si no, get_current_user seguiría sirviendo el nivel
+    anterior hasta vencer el TTL.
 
     Args:
         db: Sesión de base de datos
-    """
-    usuarios = db.query(User).all()
+        lote: Usuarios por rango de ids
 
-    for usuario in usuarios:
-        nivel_nuevo = calcular_nivel_usuario(usuario.id, db)
+    Returns:
+        dict: {"usuarios": recalculados, "cambios_nivel": usuarios cuyo nivel cambió}
+    """
+    ahora = datetime.utcnow()
+    hace_7_dias = ahora - timedelta(days=7)
+    totales = {"usuarios": 0, "cambios_nivel": 0}
+
+    id_min, id_max = db.query(func.min(User.id), func.max(User.id)).one()
+    if id_min is None:
+        return totales
+
+    for desde in range(id_min, id_max + 1, lote):
+        hasta = desde + lote - 1
+
+        # Pagos de la semana por usuario del rango (0 para quien no tiene)
+        conteos = select(
+            User.id.label("user_id"),
+            User.nivel_usuario.label("nivel_anterior"),
+            func.count(Pago.id).label("pagos_semana")
+        ).outerjoin(
+            Pago,
+            and_(
+                Pago.user_id == User.id,
+                Pago.estado == EstadoPago.EXITOSO,
+                Pago.fecha_pago >= hace_7_dias
+            )
+        ).where(
+            User.id.between(desde, hasta)
+        ).group_by(User.id, User.nivel_usuario).subquery()
+
+        nivel_nuevo = case(
+            (conteos.c.pagos_semana >= NIVEL_MAXIMO, NIVEL_MAXIMO),
+            else_=conteos.c.pagos_semana
+        )
+
+        totales["cambios_nivel"] += db.execute(
+            select(func.count()).select_from(conteos).where(conteos.c.nivel_anterior != nivel_nuevo)
+        ).scalar()
 
-        # Actualizar campos del usuario
         # Nota: campo se llama 'pagos_ultimo_mes' en BD pero contiene pagos de última semana
-        usuario.nivel_usuario = nivel_nuevo
-        usuario.pagos_ultimo_mes = _contar_pagos_semana(usuario.id, db)
-        usuario.ultimo_recalculo_nivel = datetime.utcnow()
-
-    db.commit()
-
-    return len(usuarios)
+        totales["usuarios"] += db.execute(
+            update(User)
+            .where(User.id == conteos.c.user_id)
+            .values(
+                nivel_usuario=nivel_nuevo,
+                pagos_ultimo_mes=conteos.c.pagos_semana,
+                ultimo_recalculo_nivel=ahora
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        cache_usuarios_service.invalidar_todo()
+
+    return totales
 
 
 def obtener_limites_usuario(user_id: int, db: Session) -> dict:
@@ -88,48 +131,12 @@ def obtener_limites_usuario(user_id: int, db: Session) -> dict:
             "min_totales": int or None
         }
     """
-    usuario = db.query(User).filter(User.id == user_id).first()
+    nivel = db.query(User.nivel_usuario).filter(User.id == user_id).scalar()
 
-    if not usuario:
+    if nivel is None:
         raise ValueError(f"Usuario {user_id} no encontrado")
 
-    limites_por_nivel = {
-        0: {  # FREE
-            "sesiones_dia": 3,
-            "min_sesion": 10,
-            "min_totales": 30
-        },
-        1: {  # BRONCE
-            "sesiones_dia": 5,
-            "min_sesion": 10,
-            "min_totales": 50
-        },
-        2: {  # PLATA
-            "sesiones_dia": 7,
-            "min_sesion": 10,
-            "min_totales": 70
-        },
-        3: {  # ORO
-            "sesiones_dia": 10,
-            "min_sesion": 15,
-            "min_totales": None  # Sin límite total
-        }
-    }
-
-    nombres_nivel = {
-        0: "FREE",
-        1: "BRONCE",
-        2: "PLATA",
-        3: "ORO"
-    }
-
-    limites = limites_por_nivel.get(usuario.nivel_usuario, limites_por_nivel[0])
-
-    return {
-        "nivel": usuario.nivel_usuario,
-        "nombre_nivel": nombres_nivel.get(usuario.nivel_usuario, "FREE"),
-        **limites
-    }
+    return limites_nivel(nivel)
 
 
 def actualizar_nivel_post_pago(user_id: int, db: Session):
@@ -147,9 +154,9 @@ def actualizar_nivel_post_pago(user_id: int, db: Session):
     if not usuario:
         raise ValueError(f"Usuario {user_id} no encontrado")
 
-    # Recalcular nivel
-    nivel_nuevo = calcular_nivel_usuario(user_id, db)
+    # Recalcular nivel (un solo conteo de pagos)
     pagos_semana = _contar_pagos_semana(user_id, db)
+    nivel_nuevo = nivel_por_pagos(pagos_semana)
 
     # Actualizar usuario
     usuario.nivel_usuario = nivel_nuevo
@@ -1,13 +1,19 @@
-from openai import OpenAI
 from ..core.config import settings
+from ..core import openai_client
+from . import transcripcion_service
 import json
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+MODELO = "gpt-5.1-2025-11-13"
 
+# Versión de las plantillas de prompt de generación (tutela / derecho de petición).
+# Subirla cada vez que cambien los prompts: forma parte de la clave del caché de
+# generaciones, así los documentos viejos no se reutilizan con prompts nuevos.
+PROMPT_VERSION = "2025-11-1"
 
-def generar_tutela(datos_caso: dict) -> str:
+
+def _mensajes_tutela(datos_caso: dict) -> list:
     """
-    Genera un documento de tutela completo usando GPT-4
+    Construye los mensajes (system + user) para generar una acción de tutela
     """
 
     prompt = f"""Eres un abogado experto en derecho constitucional colombiano especializado en acciones de tutela.
@@ -146,21 +152,30 @@ IMPORTANTE SOBRE JURISPRUDENCIA:
 
 El documento debe estar completo, profesional y listo para ser presentado ante un juez de la República de Colombia."""
 
+    return [
+        {
+            "role": "system",
+            "content": "Eres un abogado constitucionalista experto en Colombia. Generas documentos legales formales, completos y profesionales."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+
+async def generar_tutela(datos_caso: dict) -> str:
+    """
+    Genera un documento de tutela completo usando GPT-4
+    """
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-5.1-2025-11-13",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Eres un abogado constitucionalista experto en Colombia. Generas documentos legales formales, completos y profesionales."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+        response = await openai_client.crear_chat_completion(
+            model=MODELO,
+            messages=_mensajes_tutela(datos_caso),
             temperature=0.3,  # Temperatura baja para máxima estabilidad en documentos jurídicos
-            max_completion_tokens=4000
+            max_completion_tokens=4000,
+            timeout=settings.OPENAI_TIMEOUT_GENERACION
         )
 
         documento_generado = response.choices[0].message.content
@@ -170,9 +185,9 @@ El documento debe estar completo, profesional y listo para ser presentado ante u
         raise Exception(f"Error generando tutela con OpenAI: {str(e)}")
 
 
-def generar_derecho_peticion(datos_caso: dict) -> str:
+def _mensajes_derecho_peticion(datos_caso: dict) -> list:
     """
-    Genera un documento de derecho de petición usando GPT-4
+    Construye los mensajes (system + user) para generar un derecho de petición
     """
 
     prompt = f"""Eres un abogado experto en derecho administrativo colombiano especializado en derechos de petición.
@@ -291,21 +306,30 @@ INSTRUCCIONES PARA FORMATO PROFESIONAL:
 
 El documento debe estar listo para ser presentado ante la entidad correspondiente en Colombia."""
 
+    return [
+        {
+            "role": "system",
+            "content": "Eres un abogado experto en derecho administrativo en Colombia. Generas documentos legales formales, completos y profesionales."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+
+async def generar_derecho_peticion(datos_caso: dict) -> str:
+    """
+    Genera un documento de derecho de petición usando GPT-4
+    """
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-5.1-2025-11-13",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Eres un abogado experto en derecho administrativo en Colombia. Generas documentos legales formales, completos y profesionales."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+        response = await openai_client.crear_chat_completion(
+            model=MODELO,
+            messages=_mensajes_derecho_peticion(datos_caso),
             temperature=0.3,  # Temperatura baja para máxima estabilidad en documentos jurídicos
-            max_completion_tokens=3000
+            max_completion_tokens=3000,
+            timeout=settings.OPENAI_TIMEOUT_GENERACION
         )
 
         documento_generado = response.choices[0].message.content
@@ -315,13 +339,52 @@ El documento debe estar listo para ser presentado ante la entidad correspondient
         raise Exception(f"Error generando derecho de petición con OpenAI: {str(e)}")
 
 
-def extraer_datos_conversacion(mensajes: list) -> dict:
+async def generar_documento_stream(tipo_documento: str, datos_caso: dict):
+    """
+    Genera una tutela o derecho de petición con stream=True
+
+    Args:
+        tipo_documento: "TUTELA" o "DERECHO_PETICION"
+        datos_caso: Datos del caso (mismo formato que generar_tutela)
+
+    Yields:
+        str: Fragmentos de texto a medida que OpenAI los produce
+    """
+    if tipo_documento == "TUTELA":
+        mensajes, max_tokens, nombre = _mensajes_tutela(datos_caso), 4000, "tutela"
+    else:
+        mensajes, max_tokens, nombre = _mensajes_derecho_peticion(datos_caso), 3000, "derecho de petición"
+
+    try:
+        stream = openai_client.crear_chat_completion_stream(
+            model=MODELO,
+            messages=mensajes,
+            temperature=0.3,  # Temperatura baja para máxima estabilidad en documentos jurídicos
+            max_completion_tokens=max_tokens,
+            timeout=settings.OPENAI_TIMEOUT_GENERACION
+        )
+
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    except Exception as e:
+        raise Exception(f"Error generando {nombre} con OpenAI: {str(e)}")
+
+
+async def extraer_datos_conversacion(mensajes: list, estado_previo: dict = None) -> dict:
     """
     Extrae información estructurada de una conversación entre usuario y asistente legal
 
+    Modo incremental: si se pasa estado_previo (el JSON de una extracción anterior),
+    `mensajes` debe contener solo los mensajes nuevos. GPT recibe el estado previo
+    más esos mensajes y devuelve el estado actualizado completo, sin reenviar toda
+    la conversación.
+
     Args:
         mensajes: Lista de diccionarios con formato:
                   [{"remitente": "usuario|asistente", "texto": "...", "timestamp": "..."}]
+        estado_previo: Datos extraídos previamente (None = extracción completa)
 
     Returns:
         dict con los campos extraídos: tipo_documento, razon_tipo_documento, hechos,
@@ -331,18 +394,38 @@ def extraer_datos_conversacion(mensajes: list) -> dict:
         detalle_derecho_peticion_previo
     """
 
+    estado_previo_texto = json.dumps(estado_previo, ensure_ascii=False, indent=2) if estado_previo else ""
+
+    # Ajustar la transcripción al presupuesto de tokens (resumen / ventana)
+    mensajes, preparacion = transcripcion_service.preparar_transcripcion(
+        mensajes,
+        tokens_reservados=transcripcion_service.contar_tokens(estado_previo_texto)
+    )
+
     # Construir la conversación en formato legible
-    conversacion_texto = ""
-    for msg in mensajes:
-        remitente = "ASISTENTE" if msg["remitente"] == "asistente" else "USUARIO"
-        conversacion_texto += f"{remitente}: {msg['texto']}\n\n"
+    conversacion_texto = "".join(transcripcion_service.formatear_turno(msg) for msg in mensajes)
+
+    if estado_previo:
+        seccion_conversacion = f"""DATOS YA EXTRAÍDOS DE LA PARTE ANTERIOR DE LA CONVERSACIÓN (JSON):
+{estado_previo_texto}
+
+NUEVOS MENSAJES (continúan la conversación anterior):
+{conversacion_texto}"""
+        instruccion_lectura = (
+            "- Parte de los DATOS YA EXTRAÍDOS y actualízalos solo con lo que aporten los NUEVOS MENSAJES: "
+            "conserva los valores previos que sigan vigentes, integra los hechos nuevos en la narrativa existente "
+            "y corrige lo que el usuario haya rectificado. Devuelve SIEMPRE el objeto completo"
+        )
+    else:
+        seccion_conversacion = f"""CONVERSACIÓN:
+{conversacion_texto}"""
+        instruccion_lectura = "- Lee TODA la conversación completa antes de extraer"
 
     prompt = f"""Eres un asistente legal experto en derecho constitucional y administrativo colombiano.
 
 Analiza la siguiente conversación entre un usuario y un asistente legal que está recopilando información para crear un documento legal.
 
-CONVERSACIÓN:
-{conversacion_texto}
+{seccion_conversacion}
 
 TAREA:
 Extrae y estructura la siguiente información en formato JSON. LEE CUIDADOSAMENTE toda la conversación y extrae los datos del caso.
@@ -488,7 +571,7 @@ Enfócate ÚNICAMENTE en extraer:
 
 INSTRUCCIONES IMPORTANTES:
 - ⚠️ RECUERDA: NO extraigas datos personales del solicitante (nombre, cédula, dirección, teléfono, email) - ya están en el perfil del usuario
-- Lee TODA la conversación completa antes de extraer
+{instruccion_lectura}
 - Si algún campo no tiene información suficiente en la conversación, devuélvelo como cadena vacía ""
 - Mantén lenguaje legal apropiado para Colombia
 - Redacta los hechos de forma coherente y cronológica
@@ -524,8 +607,8 @@ Devuelve ÚNICAMENTE un objeto JSON válido con esta estructura exacta, sin mark
 }}"""
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-5.1-2025-11-13",
+        response = await openai_client.crear_chat_completion(
+            model=MODELO,
             messages=[
                 {
                     "role": "system",
@@ -538,7 +621,15 @@ Devuelve ÚNICAMENTE un objeto JSON válido con esta estructura exacta, sin mark
             ],
             temperature=0.3,  # Baja temperatura para mayor precisión
             max_completion_tokens=2000,
-            response_format={"type": "json_object"}  # Forzar respuesta JSON
+            response_format={"type": "json_object"},  # Forzar respuesta JSON
+            timeout=settings.OPENAI_TIMEOUT_ANALISIS
+        )
+
+        uso = getattr(response, "usage", None)
+        transcripcion_service.registrar_llamada(
+            preparacion,
+            tokens_prompt_estimados=transcripcion_service.contar_tokens(prompt),
+            tokens_prompt_reales=getattr(uso, "prompt_tokens", None)
         )
 
         resultado_texto = response.choices[0].message.content
@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
 
 from ..models import Pago, Caso, User, EstadoPago, EstadoCaso, MetodoPago
+from ..models.caso import cargar_grupos, GRUPO_REEMBOLSOS
 from .nivel_service import actualizar_nivel_post_pago
 from .sesion_service import desbloquear_sesiones_extra
 
@@ -124,7 +125,7 @@ def solicitar_reembolso(caso_id: int, motivo: str, evidencia_url: str, db: Sessi
         evidencia_url: URL del documento de evidencia
         db: Sesión de base de datos
     """
-    caso = db.query(Caso).filter(Caso.id == caso_id).first()
+    caso = db.query(Caso).options(*cargar_grupos(GRUPO_REEMBOLSOS)).filter(Caso.id == caso_id).first()
 
     if not caso:
         raise ValueError(f"Caso {caso_id} no encontrado")
@@ -189,7 +190,7 @@ def procesar_reembolso(caso_id: int, aprobar: bool, comentario_admin: str, db: S
         comentario_admin: Comentario del administrador
         db: Sesión de base de datos
     """
-    caso = db.query(Caso).filter(Caso.id == caso_id).first()
+    caso = db.query(Caso).options(*cargar_grupos(GRUPO_REEMBOLSOS)).filter(Caso.id == caso_id).first()
 
     if not caso:
         raise ValueError(f"Caso {caso_id} no encontrado")
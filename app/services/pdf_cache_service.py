@@ -0,0 +1,177 @@
+"""
+Caché en disco de PDFs renderizados
+
+Los usuarios descargan el mismo documento desbloqueado muchas veces; en lugar de
+volver a correr ReportLab, el PDF se guarda en PDF_CACHE_DIR direccionado por
+contenido: sha256(versión del renderizador + documento_generado). Las descargas
+repetidas se sirven como archivo (FileResponse, con soporte de Range) y el hash
+también sirve de ETag. Los misses se renderizan en pdf_render_service.
+
+Si el texto del documento cambia, la clave cambia sola; invalidar() borra el
+archivo del texto anterior para no acumular PDFs huérfanos, y purgar_antiguos()
+(tarea de limpieza diaria) elimina los que llevan días sin descargarse.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from typing import Optional, Tuple
+
+from ..core.config import settings
+from .document_service import RenderizadorPDF, generar_pdf
+from . import pdf_render_service
+
+logger = logging.getLogger(__name__)
+
+_renders_en_vuelo = {}  # clave -> asyncio.Future (un solo render por documento a la vez)
+
+
+def calcular_clave(documento: str) -> str:
+    """
+    Hash del documento + versión del renderizador (cambia si cambia cualquiera de los dos)
+    """
+    contenido = f"{RenderizadorPDF.VERSION}\0{documento}".encode("utf-8")
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def calcular_etag(documento: str) -> str:
+    """
+    ETag fuerte del PDF de un documento (no requiere renderizar ni tocar disco)
+    """
+    return f'"{calcular_clave(documento)}"'
+
+
+def obtener_pdf(documento: str) -> Tuple[str, str]:
+    """
+    Retorna la ruta del PDF cacheado del documento, renderizándolo si no existe
+
+    Returns:
+        tuple: (ruta del archivo, etag)
+    """
+    clave = calcular_clave(documento)
+    ruta = _ruta(clave)
+
+    if os.path.exists(ruta):
+        _marcar_uso(ruta)
+        logger.info(f"♻️ PDF servido desde caché ({clave[:12]})")
+        return ruta, f'"{clave}"'
+
+    _escribir(ruta, generar_pdf(documento).getvalue())
+    return ruta, f'"{clave}"'
+
+
+async def obtener_pdf_async(documento: str) -> Tuple[str, str]:
+    """
+    Igual que obtener_pdf, pero un miss se renderiza con pdf_render_service
+    (pool de procesos) sin bloquear el event loop
+
+    Si varias peticiones piden a la vez el mismo documento sin cachear, se
+    renderiza una sola vez y todas esperan ese mismo resultado.
+
+    Raises:
+        pdf_render_service.ColaRenderLlenaError / TimeoutRenderError
+    """
+    clave = calcular_clave(documento)
+    ruta = _ruta(clave)
+
+    if os.path.exists(ruta):
+        _marcar_uso(ruta)
+        logger.info(f"♻️ PDF servido desde caché ({clave[:12]})")
+        return ruta, f'"{clave}"'
+
+    en_vuelo = _renders_en_vuelo.get(clave)
+    if en_vuelo is not None:
+        await asyncio.shield(en_vuelo)
+        return ruta, f'"{clave}"'
+
+    futuro = asyncio.get_running_loop().create_future()
+    _renders_en_vuelo[clave] = futuro
+    try:
+        pdf = await pdf_render_service.renderizar_pdf(documento)
+        await asyncio.to_thread(_escribir, ruta, pdf)
+        futuro.set_result(ruta)
+    except BaseException as e:
+        futuro.set_exception(e)
+        futuro.exception()  # Marcar como consultada si nadie más la esperaba
+        raise
+    finally:
+        del _renders_en_vuelo[clave]
+
+    return ruta, f'"{clave}"'
+
+
+def invalidar(documento: Optional[str]):
+    """
+    Borra el PDF cacheado de un texto de documento (llamar cuando el texto cambia)
+    """
+    if not documento:
+        return
+
+    ruta = _ruta(calcular_clave(documento))
+    try:
+        os.remove(ruta)
+        logger.info(f"🗑️ PDF cacheado invalidado ({os.path.basename(ruta)[:12]})")
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudo invalidar PDF cacheado {ruta}: {str(e)}")
+
+
+def purgar_antiguos(dias: int = None) -> int:
+    """
+    Elimina PDFs cacheados que no se han descargado en N días
+
+    Returns:
+        int: Cantidad de archivos eliminados
+    """
+    dias = settings.PDF_CACHE_TTL_DIAS if dias is None else dias
+    limite = time.time() - dias * 86400
+    eliminados = 0
+
+    if not os.path.isdir(settings.PDF_CACHE_DIR):
+        return 0
+
+    for raiz, _, archivos in os.walk(settings.PDF_CACHE_DIR):
+        for nombre in archivos:
+            ruta = os.path.join(raiz, nombre)
+            try:
+                if os.path.getmtime(ruta) < limite:
+                    os.remove(ruta)
+                    eliminados += 1
+            except OSError:
+                continue
+
+    return eliminados
+
+
+def _escribir(ruta: str, pdf: bytes):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+    # Escritura atómica: otro worker nunca ve un PDF a medio escribir
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as archivo:
+            archivo.write(pdf)
+        os.replace(temporal, ruta)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+    logger.info(f"📄 PDF renderizado y cacheado ({os.path.basename(ruta)[:12]}, {len(pdf) / 1024:.1f} KB)")
+
+
+def _ruta(clave: str) -> str:
+    # Subdirectorio por los dos primeros caracteres para no llenar un solo directorio
+    return os.path.join(settings.PDF_CACHE_DIR, clave[:2], f"{clave}.pdf")
+
+
+def _marcar_uso(ruta: str):
+    # mtime = última descarga (base de purgar_antiguos)
+    try:
+        os.utime(ruta, None)
+    except OSError:
+        pass
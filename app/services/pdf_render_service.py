@@ -0,0 +1,142 @@
+"""
+Renderizado de PDFs fuera del proceso que atiende peticiones
+
+ReportLab es Python puro y CPU-bound: renderizar en el worker de uvicorn compite
+por el GIL y frena endpoints ajenos (/health, /mensajes/) durante ráfagas de
+descargas. Con PDF_RENDER_BACKEND="proceso" el render corre en un
+ProcessPoolExecutor:
+
+- PDF_RENDER_PROCESOS procesos (contexto "spawn", sin heredar sockets ni hilos)
+- Cola acotada: si hay PDF_RENDER_MAX_COLA renders pendientes o en curso, se
+  rechaza con ColaRenderLlenaError (la ruta responde 503)
+- Timeout por trabajo (PDF_RENDER_TIMEOUT segundos): la petición responde 504,
+  pero el render sigue en su proceso y ocupa su lugar en la cola hasta terminar
+- Cada proceso se recicla tras PDF_RENDER_MAX_TAREAS_POR_PROCESO renders, para
+  acotar la memoria que ReportLab va acumulando
+
+Con PDF_RENDER_BACKEND="local" se renderiza en un hilo (útil en desarrollo).
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from ..core.config import settings
+from . import document_service
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pendientes = 0  # Renders encolados o en curso (solo se toca desde el event loop)
+
+
+class ColaRenderLlenaError(Exception):
+    """
+    La cola de renderizado alcanzó PDF_RENDER_MAX_COLA
+    """
+
+
+class TimeoutRenderError(Exception):
+    """
+    El render superó PDF_RENDER_TIMEOUT
+    """
+
+
+async def renderizar_pdf(documento_texto: str) -> bytes:
+    """
+    Renderiza el documento a PDF sin bloquear el event loop
+
+    Raises:
+        ColaRenderLlenaError: Demasiados renders pendientes
+        TimeoutRenderError: El render tardó más de PDF_RENDER_TIMEOUT
+    """
+    global _pendientes
+
+    if _pendientes >= settings.PDF_RENDER_MAX_COLA:
+        raise ColaRenderLlenaError(f"Cola de renderizado llena ({_pendientes} pendientes)")
+
+    _pendientes += 1
+    try:
+        if settings.PDF_RENDER_BACKEND.lower() == "proceso":
+            futuro = asyncio.wrap_future(_obtener_pool().submit(renderizar_bytes, documento_texto))
+        else:
+            futuro = asyncio.get_running_loop().run_in_executor(None, renderizar_bytes, documento_texto)
+    except Exception:
+        _pendientes -= 1
+        raise
+
+    # El lugar en la cola se libera cuando el render termina de verdad, no cuando
+    # la petición deja de esperarlo (shield: el timeout no cancela el trabajo)
+    futuro.add_done_callback(_liberar_turno)
+
+    try:
+        return await asyncio.wait_for(asyncio.shield(futuro), timeout=settings.PDF_RENDER_TIMEOUT)
+
+    except asyncio.TimeoutError:
+        logger.error(f"❌ Render de PDF superó {settings.PDF_RENDER_TIMEOUT}s")
+        raise TimeoutRenderError(f"El render del PDF superó {settings.PDF_RENDER_TIMEOUT} segundos")
+
+    except BrokenProcessPool:
+        # Un proceso murió (p. ej. OOM): descartar el pool, el siguiente render crea uno nuevo
+        logger.error("❌ Pool de render de PDF roto, se recreará")
+        _descartar_pool()
+        raise
+
+
+def _liberar_turno(futuro: asyncio.Future):
+    global _pendientes
+    _pendientes -= 1
+    if not futuro.cancelled():
+        futuro.exception()  # Marca como leído el error de un render que nadie espera ya
+
+
+def renderizar_bytes(documento_texto: str) -> bytes:
+    """
+    Función que ejecuta cada proceso del pool (debe ser importable a nivel de módulo)
+    """
+    return document_service.generar_pdf(documento_texto).getvalue()
+
+
+def obtener_estado() -> dict:
+    """
+    Estado del backend de renderizado (para métricas)
+    """
+    return {
+        "backend": settings.PDF_RENDER_BACKEND,
+        "procesos": settings.PDF_RENDER_PROCESOS,
+        "pendientes": _pendientes,
+        "max_cola": settings.PDF_RENDER_MAX_COLA,
+        "pool_iniciado": _pool is not None,
+    }
+
+
+def cerrar_pool():
+    """
+    Detiene los procesos del pool (los renders en curso terminan primero)
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def _descartar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _obtener_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=max(1, settings.PDF_RENDER_PROCESOS),
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=max(1, settings.PDF_RENDER_MAX_TAREAS_POR_PROCESO),
+        )
+        logger.info(f"⚙️ Pool de render de PDF iniciado con {settings.PDF_RENDER_PROCESOS} procesos")
+    return _pool
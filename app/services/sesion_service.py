@@ -3,11 +3,48 @@ Servicio para validación de límites de sesiones
 """
 
 from datetime import datetime, date, timedelta
+from typing import Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, case, literal, select, update
 
+from ..core.niveles import MINUTOS_SIN_LIMITE, NIVELES, limites_nivel
 from ..models import User, SesionDiaria, Caso
-from .nivel_service import obtener_limites_usuario
+
+
+def evaluar_limites(user_id: int, db: Session, fecha: Optional[date] = None) -> Optional[dict]:
+    """
+    Foto completa de límites y uso del usuario en una sola consulta
+
+    Nivel, sesiones extra y el registro de sesiones_diarias de la fecha salen de
+    un solo SELECT (users LEFT JOIN sesiones_diarias); los límites del nivel
+    salen de la tabla de core/niveles.
+
+    Args:
+        user_id: ID del usuario
+        db: Sesión de base de datos
+        fecha: Día a evaluar (default: hoy)
+
+    Returns:
+        dict: {
+            "limites": límites del nivel (ver niveles.limites_nivel),
+            "uso": uso del día (formato de obtener_uso_diario),
+            "validacion": si puede crear sesión (formato de puede_crear_sesion)
+        }
+        o None si el usuario no existe
+    """
+    fecha = fecha or date.today()
+    fila = _nivel_y_uso(user_id, fecha, db)
+    if fila is None:
+        return None
+
+    nivel, sesiones_extra_hoy, sesion_diaria = fila
+    limites = limites_nivel(nivel)
+
+    return {
+        "limites": limites,
+        "uso": _uso(fecha, limites, sesiones_extra_hoy, sesion_diaria),
+        "validacion": _validacion(limites, sesiones_extra_hoy, sesion_diaria),
+    }
 
 
 def puede_crear_sesion(user_id: int, db: Session) -> dict:
@@ -27,9 +64,9 @@ def puede_crear_sesion(user_id: int, db: Session) -> dict:
             "limite_minutos_sesion": int
         }
     """
-    usuario = db.query(User).filter(User.id == user_id).first()
+    evaluacion = evaluar_limites(user_id, db)
 
-    if not usuario:
+    if evaluacion is None:
         return {
             "permitido": False,
             "razon": "Usuario no encontrado",
@@ -38,28 +75,35 @@ def puede_crear_sesion(user_id: int, db: Session) -> dict:
             "limite_minutos_sesion": 0
         }
 
-    # Obtener límites del usuario según su nivel
-    limites = obtener_limites_usuario(user_id, db)
+    return evaluacion["validacion"]
 
-    # Obtener o crear registro de uso diario
-    hoy = date.today()
-    sesion_diaria = db.query(SesionDiaria).filter(
-        SesionDiaria.user_id == user_id,
-        SesionDiaria.fecha == hoy
-    ).first()
 
+def _nivel_y_uso(user_id: int, fecha: date, db: Session) -> Optional[tuple]:
+    """
+    (nivel_usuario, sesiones_extra_hoy, SesionDiaria de la fecha o None), o None si el usuario no existe
+
+    Columnas sueltas del usuario: siempre vienen de la BD aunque el User de la
+    petición haya salido del caché de autenticación.
+    """
+    return db.query(User.nivel_usuario, User.sesiones_extra_hoy, SesionDiaria).outerjoin(
+        SesionDiaria,
+        and_(SesionDiaria.user_id == User.id, SesionDiaria.fecha == fecha)
+    ).filter(User.id == user_id).first()
+
+
+def _validacion(limites: dict, sesiones_extra_hoy: int, sesion_diaria: Optional[SesionDiaria]) -> dict:
     if not sesion_diaria:
         # Primera sesión del día - permitir
         return {
             "permitido": True,
             "razon": "Primera sesión del día",
-            "sesiones_disponibles": limites["sesiones_dia"] + usuario.sesiones_extra_hoy,
-            "minutos_disponibles": limites["min_totales"] if limites["min_totales"] else 999999,
+            "sesiones_disponibles": limites["sesiones_dia"] + sesiones_extra_hoy,
+            "minutos_disponibles": limites["min_totales"] if limites["min_totales"] else MINUTOS_SIN_LIMITE,
             "limite_minutos_sesion": limites["min_sesion"]
         }
 
     # Calcular sesiones disponibles (base + extra - usadas)
-    total_permitidas = limites["sesiones_dia"] + usuario.sesiones_extra_hoy
+    total_permitidas = limites["sesiones_dia"] + sesiones_extra_hoy
     sesiones_disponibles = total_permitidas - sesion_diaria.sesiones_creadas
 
     # Validar límite de sesiones por día
@@ -73,7 +117,7 @@ def puede_crear_sesion(user_id: int, db: Session) -> dict:
         }
 
     # Validar límite de minutos totales del día (si aplica)
-    minutos_disponibles = 999999  # Sin límite por defecto
+    minutos_disponibles = MINUTOS_SIN_LIMITE
 
     if limites["min_totales"] is not None:
         minutos_disponibles = limites["min_totales"] - sesion_diaria.minutos_consumidos
@@ -97,46 +141,79 @@ def puede_crear_sesion(user_id: int, db: Session) -> dict:
     }
 
 
+def _uso(fecha: date, limites: dict, sesiones_extra_hoy: int, sesion_diaria: Optional[SesionDiaria]) -> dict:
+    if not sesion_diaria:
+        # No hay uso para esta fecha - retornar valores en cero
+        extra = sesiones_extra_hoy if fecha == date.today() else 0
+        return {
+            "fecha": str(fecha),
+            "sesiones_creadas": 0,
+            "minutos_consumidos": 0,
+            "sesiones_base_permitidas": limites["sesiones_dia"],
+            "sesiones_extra_bonus": extra,
+            "sesiones_disponibles": limites["sesiones_dia"] + extra
+        }
+
+    return {
+        "fecha": str(sesion_diaria.fecha),
+        "sesiones_creadas": sesion_diaria.sesiones_creadas,
+        "minutos_consumidos": sesion_diaria.minutos_consumidos,
+        "sesiones_base_permitidas": sesion_diaria.sesiones_base_permitidas,
+        "sesiones_extra_bonus": sesion_diaria.sesiones_extra_bonus,
+        "sesiones_disponibles": sesion_diaria.sesiones_disponibles()
+    }
+
+
+def calcular_tiempo_restante(caso_id: int, db: Session) -> Optional[dict]:
+    """
+    Minutos que le quedan a la sesión en curso de un caso
+
+    Toma el menor entre el límite por sesión del nivel y los minutos diarios
+    disponibles (descontando lo ya transcurrido de esta sesión).
+
+    Returns:
+        dict: {"minutos_transcurridos", "minutos_restantes", "limite_minutos_sesion"}
+        o None si el caso no existe o la sesión no ha empezado
+    """
+    caso = db.query(Caso).filter(Caso.id == caso_id).first()
+    if not caso or not caso.fecha_inicio_sesion:
+        return None
+
+    nivel, _, sesion_diaria = _nivel_y_uso(caso.user_id, date.today(), db)
+    limites = limites_nivel(nivel)
+    transcurridos = (datetime.utcnow() - caso.fecha_inicio_sesion).total_seconds() / 60
+    restantes = limites["min_sesion"] - transcurridos
+
+    if limites["min_totales"] is not None:
+        consumidos = sesion_diaria.minutos_consumidos if sesion_diaria else 0
+        restantes = min(restantes, limites["min_totales"] - consumidos - transcurridos)
+
+    return {
+        "minutos_transcurridos": round(transcurridos, 1),
+        "minutos_restantes": max(0.0, round(restantes, 1)),
+        "limite_minutos_sesion": limites["min_sesion"]
+    }
+
+
 def registrar_inicio_sesion(user_id: int, caso_id: int, db: Session):
     """
     Registra que el usuario inició una sesión
-    Actualiza contador en sesiones_diarias
+    Actualiza contador en sesiones_diarias (upsert atómico, ver _sumar_uso_diario)
 
     Args:
         user_id: ID del usuario
         caso_id: ID del caso/sesión iniciada
         db: Sesión de base de datos
     """
-    hoy = date.today()
-    limites = obtener_limites_usuario(user_id, db)
-    usuario = db.query(User).filter(User.id == user_id).first()
-
-    # Obtener o crear registro de uso diario
-    sesion_diaria = db.query(SesionDiaria).filter(
-        SesionDiaria.user_id == user_id,
-        SesionDiaria.fecha == hoy
-    ).first()
-
-    if not sesion_diaria:
-        # Crear nuevo registro
-        sesion_diaria = SesionDiaria(
-            user_id=user_id,
-            fecha=hoy,
-            sesiones_creadas=1,
-            minutos_consumidos=0,
-            sesiones_base_permitidas=limites["sesiones_dia"],
-            sesiones_extra_bonus=usuario.sesiones_extra_hoy
-        )
-        db.add(sesion_diaria)
-    else:
-        # Incrementar contador
-        sesion_diaria.sesiones_creadas += 1
+    fila = _sumar_uso_diario(user_id, date.today(), sesiones=1, minutos=0, db=db)
+    if fila is None:
+        raise ValueError(f"Usuario {user_id} no encontrado")
 
     db.commit()
 
     return {
-        "sesiones_creadas_hoy": sesion_diaria.sesiones_creadas,
-        "minutos_consumidos_hoy": sesion_diaria.minutos_consumidos
+        "sesiones_creadas_hoy": fila.sesiones_creadas,
+        "minutos_consumidos_hoy": fila.minutos_consumidos
     }
 
 
@@ -151,57 +228,123 @@ def registrar_fin_sesion(caso_id: int, duracion_minutos: int, db: Session, ya_fu
         db: Sesión de base de datos
         ya_fue_finalizada: True si es la primera vez que se finaliza esta sesión
     """
-    caso = db.query(Caso).filter(Caso.id == caso_id).first()
+    user_id = db.query(Caso.user_id).filter(Caso.id == caso_id).scalar()
 
-    if not caso:
+    if user_id is None:
         raise ValueError(f"Caso {caso_id} no encontrado")
 
     hoy = date.today()
-    limites = obtener_limites_usuario(caso.user_id, db)
-    usuario = db.query(User).filter(User.id == caso.user_id).first()
 
     # Solo contar la sesión si:
     # 1. Es la primera vez que se finaliza (ya_fue_finalizada = False)
     # 2. Sin importar la duración (se cuenta aunque dure menos de 1 minuto)
     debe_contar_sesion = not ya_fue_finalizada
 
-    # Buscar o crear registro de uso diario
-    sesion_diaria = db.query(SesionDiaria).filter(
-        SesionDiaria.user_id == caso.user_id,
-        SesionDiaria.fecha == hoy
-    ).first()
-
-    if not sesion_diaria:
-        # Crear nuevo registro solo si debe contar la sesión
-        if debe_contar_sesion:
-            sesion_diaria = SesionDiaria(
-                user_id=caso.user_id,
-                fecha=hoy,
-                sesiones_creadas=1,
-                minutos_consumidos=duracion_minutos,
-                sesiones_base_permitidas=limites["sesiones_dia"],
-                sesiones_extra_bonus=usuario.sesiones_extra_hoy
-            )
-            db.add(sesion_diaria)
+    if debe_contar_sesion:
+        # Crea el registro del día o suma sobre el existente
+        fila = _sumar_uso_diario(user_id, hoy, sesiones=1, minutos=duracion_minutos, db=db)
     else:
-        # Actualizar minutos consumidos
-        sesion_diaria.minutos_consumidos += duracion_minutos
-
-        # Incrementar contador de sesiones solo si debe contar
-        if debe_contar_sesion:
-            sesion_diaria.sesiones_creadas += 1
-
-        sesion_diaria.updated_at = datetime.utcnow()
+        # Solo suma minutos si ya hay registro del día (no lo crea)
+        fila = db.execute(
+            update(SesionDiaria)
+            .where(SesionDiaria.user_id == user_id, SesionDiaria.fecha == hoy)
+            .values(
+                minutos_consumidos=SesionDiaria.minutos_consumidos + duracion_minutos,
+                updated_at=datetime.utcnow()
+            )
+            .returning(SesionDiaria.sesiones_creadas, SesionDiaria.minutos_consumidos)
+            .execution_options(synchronize_session=False)
+        ).first()
 
     db.commit()
 
     return {
-        "minutos_consumidos_hoy": sesion_diaria.minutos_consumidos if sesion_diaria else 0,
+        "minutos_consumidos_hoy": fila.minutos_consumidos if fila else 0,
         "duracion_sesion": duracion_minutos,
         "sesion_contada": debe_contar_sesion
     }
 
 
+def _sumar_uso_diario(user_id: int, fecha: date, sesiones: int, minutos: int, db: Session):
+    """
+    Suma sesiones y minutos al registro del día en una sola sentencia atómica
+
+    INSERT ... SELECT FROM users ... ON CONFLICT (user_id, fecha) DO UPDATE:
+    si el registro no existe se crea con el límite base del nivel y las sesiones
+    extra del usuario; si existe (o lo crea otra petición al mismo tiempo) se
+    incrementan los contadores en la BD, así que dos finalizaciones simultáneas
+    no pierden incrementos ni duplican la fila.
+
+    Returns:
+        Row: (sesiones_creadas, minutos_consumidos) ya actualizados, o None si el usuario no existe
+    """
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+    elif dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+    else:
+        return _sumar_uso_diario_sin_upsert(user_id, fecha, sesiones, minutos, db)
+
+    ahora = datetime.utcnow()
+    sesiones_base = case(
+        {nivel: datos["sesiones_dia"] for nivel, datos in NIVELES.items()},
+        value=User.nivel_usuario,
+        else_=NIVELES[0]["sesiones_dia"]
+    )
+    sentencia = insert_dialecto(SesionDiaria).from_select(
+        ["user_id", "fecha", "sesiones_creadas", "minutos_consumidos",
+         "sesiones_base_permitidas", "sesiones_extra_bonus", "created_at", "updated_at"],
+        select(
+            User.id, literal(fecha), literal(sesiones), literal(minutos),
+            sesiones_base, User.sesiones_extra_hoy, literal(ahora), literal(ahora)
+        ).where(User.id == user_id)
+    )
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=["user_id", "fecha"],
+        set_={
+            "sesiones_creadas": SesionDiaria.sesiones_creadas + sentencia.excluded.sesiones_creadas,
+            "minutos_consumidos": SesionDiaria.minutos_consumidos + sentencia.excluded.minutos_consumidos,
+            "updated_at": sentencia.excluded.updated_at,
+        }
+    ).returning(SesionDiaria.sesiones_creadas, SesionDiaria.minutos_consumidos)
+
+    return db.execute(sentencia, execution_options={"synchronize_session": False}).first()
+
+
+def _sumar_uso_diario_sin_upsert(user_id: int, fecha: date, sesiones: int, minutos: int, db: Session):
+    # Otras BD (sin ON CONFLICT / RETURNING): incremento en la BD y, si no había registro, crearlo
+    filtro = (SesionDiaria.user_id == user_id, SesionDiaria.fecha == fecha)
+    actualizadas = db.execute(
+        update(SesionDiaria)
+        .where(*filtro)
+        .values(
+            sesiones_creadas=SesionDiaria.sesiones_creadas + sesiones,
+            minutos_consumidos=SesionDiaria.minutos_consumidos + minutos,
+            updated_at=datetime.utcnow()
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if actualizadas:
+        return db.query(SesionDiaria.sesiones_creadas, SesionDiaria.minutos_consumidos).filter(*filtro).first()
+
+    usuario = db.query(User.nivel_usuario, User.sesiones_extra_hoy).filter(User.id == user_id).first()
+    if usuario is None:
+        return None
+
+    sesion_diaria = SesionDiaria(
+        user_id=user_id,
+        fecha=fecha,
+        sesiones_creadas=sesiones,
+        minutos_consumidos=minutos,
+        sesiones_base_permitidas=limites_nivel(usuario.nivel_usuario)["sesiones_dia"],
+        sesiones_extra_bonus=usuario.sesiones_extra_hoy
+    )
+    db.add(sesion_diaria)
+    db.flush()
+    return sesion_diaria
+
+
 def obtener_uso_diario(user_id: int, fecha: date, db: Session) -> dict:
     """
     Obtiene el uso de sesiones del usuario para una fecha específica
@@ -221,37 +364,12 @@ def obtener_uso_diario(user_id: int, fecha: date, db: Session) -> dict:
             "sesiones_disponibles": int
         }
     """
-    sesion_diaria = db.query(SesionDiaria).filter(
-        SesionDiaria.user_id == user_id,
-        SesionDiaria.fecha == fecha
-    ).first()
-
-    usuario = db.query(User).filter(User.id == user_id).first()
-    limites = obtener_limites_usuario(user_id, db)
+    evaluacion = evaluar_limites(user_id, db, fecha)
 
-    if not sesion_diaria:
-        # No hay uso para esta fecha - retornar valores en cero
-        return {
-            "fecha": str(fecha),
-            "sesiones_creadas": 0,
-            "minutos_consumidos": 0,
-            "sesiones_base_permitidas": limites["sesiones_dia"],
-            "sesiones_extra_bonus": usuario.sesiones_extra_hoy if fecha == date.today() else 0,
-            "sesiones_disponibles": limites["sesiones_dia"] + (usuario.sesiones_extra_hoy if fecha == date.today() else 0)
-        }
-
-    # Calcular sesiones disponibles
-    total_permitidas = sesion_diaria.sesiones_base_permitidas + sesion_diaria.sesiones_extra_bonus
-    sesiones_disponibles = max(0, total_permitidas - sesion_diaria.sesiones_creadas)
+    if evaluacion is None:
+        raise ValueError(f"Usuario {user_id} no encontrado")
 
-    return {
-        "fecha": str(sesion_diaria.fecha),
-        "sesiones_creadas": sesion_diaria.sesiones_creadas,
-        "minutos_consumidos": sesion_diaria.minutos_consumidos,
-        "sesiones_base_permitidas": sesion_diaria.sesiones_base_permitidas,
-        "sesiones_extra_bonus": sesion_diaria.sesiones_extra_bonus,
-        "sesiones_disponibles": sesiones_disponibles
-    }
+    return evaluacion["uso"]
 
 
 def desbloquear_sesiones_extra(user_id: int, cantidad: int, db: Session):
@@ -263,7 +381,10 @@ def desbloquear_sesiones_extra(user_id: int, cantidad: int, db: Session):
         cantidad: Cantidad de sesiones extra a desbloquear
         db: Sesión de base de datos
     """
-    usuario = db.query(User).filter(User.id == user_id).first()
+    # FOR UPDATE + populate_existing: el contador se relee de la BD (aunque el
+    # usuario haya salido del caché de autenticación) y dos pagos simultáneos
+    # no pierden incrementos
+    usuario = db.query(User).populate_existing().with_for_update().filter(User.id == user_id).first()
 
     if not usuario:
         raise ValueError(f"Usuario {user_id} no encontrado")
@@ -273,13 +394,12 @@ def desbloquear_sesiones_extra(user_id: int, cantidad: int, db: Session):
 
     # Actualizar también el registro de sesiones_diarias si existe
     hoy = date.today()
-    sesion_diaria = db.query(SesionDiaria).filter(
-        SesionDiaria.user_id == user_id,
-        SesionDiaria.fecha == hoy
-    ).first()
-
-    if sesion_diaria:
-        sesion_diaria.sesiones_extra_bonus = usuario.sesiones_extra_hoy
+    db.execute(
+        update(SesionDiaria)
+        .where(SesionDiaria.user_id == user_id, SesionDiaria.fecha == hoy)
+        .values(sesiones_extra_bonus=usuario.sesiones_extra_hoy)
+        .execution_options(synchronize_session=False)
+    )
 
     db.commit()
 
@@ -0,0 +1,260 @@
+"""
+Preparación de la transcripción antes de enviarla a GPT para extracción
+
+Una sesión larga con el avatar (60 min en nivel ORO) puede superar el contexto del
+modelo o disparar la latencia. Esta etapa cuenta tokens localmente y, si la
+conversación supera TRANSCRIPCION_PRESUPUESTO_TOKENS, la recorta conservando los
+turnos más informativos:
+
+- Los últimos TRANSCRIPCION_TURNOS_RECIENTES turnos se conservan intactos.
+- Los turnos antiguos del usuario entran por orden de informatividad mientras quepan.
+- Estrategia "resumen": los turnos antiguos del asistente (casi siempre preguntas)
+  se comprimen en un resumen acumulado con el presupuesto restante.
+- Estrategia "ventana": los turnos antiguos del asistente se descartan.
+- Estrategia "ninguna": se envía todo.
+
+El conteo usa tiktoken si está instalado; si no, una estimación de ~4 caracteres
+por token (suficiente para decidir si hay que recortar).
+"""
+
+import logging
+import re
+import threading
+from collections import deque
+
+from ..core.config import settings
+
+try:
+    import tiktoken
+except ImportError:  # Dependencia opcional: sin ella se estima por caracteres
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+ESTRATEGIAS = ("resumen", "ventana", "ninguna")
+
+# Caracteres máximos por pregunta del asistente dentro del resumen
+_MAX_CARACTERES_RESUMEN = 160
+
+# Señales de que un turno del usuario trae datos útiles para el caso
+_PATRON_DATOS = re.compile(
+    r"\d|eps|entidad|derecho de petici|tutela|m[eé]dic|diagn[oó]stic|radiqu|respuesta|"
+    r"f[oó]rmula|cirug|medicament|hijo|hija|madre|padre|represent",
+    re.IGNORECASE,
+)
+_PATRON_ORACION = re.compile(r"(?<=[.?!])\s+")
+
+_codificador = None
+_metricas_lock = threading.Lock()
+_historial_llamadas = deque(maxlen=200)  # Últimas llamadas de extracción
+
+
+def contar_tokens(texto: str) -> int:
+    """
+    Cuenta los tokens de un texto (tiktoken si está disponible, si no ~4 caracteres/token)
+    """
+    if not texto:
+        return 0
+
+    codificador = _obtener_codificador()
+    if codificador is not None:
+        return len(codificador.encode(texto, disallowed_special=()))
+    return len(texto) // 4 + 1
+
+
+def formatear_turno(msg: dict) -> str:
+    """
+    Formato de un mensaje dentro del prompt de extracción
+    """
+    remitente = "ASISTENTE" if msg["remitente"] == "asistente" else "USUARIO"
+    return f"{remitente}: {msg['texto']}\n\n"
+
+
+def preparar_transcripcion(mensajes: list, tokens_reservados: int = 0) -> tuple:
+    """
+    Ajusta la transcripción al presupuesto de tokens configurado
+
+    Args:
+        mensajes: Lista de {"remitente", "texto", ...} en orden cronológico
+        tokens_reservados: Tokens ya ocupados por otras partes variables del prompt
+                           (p. ej. el estado previo en extracción incremental)
+
+    Returns:
+        tuple: (mensajes_preparados, info) donde info incluye estrategia,
+               tokens_originales, tokens_finales, turnos_originales, turnos_finales
+               y turnos_resumidos / turnos_descartados
+    """
+    estrategia = settings.TRANSCRIPCION_ESTRATEGIA.lower()
+    if estrategia not in ESTRATEGIAS:
+        estrategia = "resumen"
+
+    presupuesto = max(0, settings.TRANSCRIPCION_PRESUPUESTO_TOKENS - tokens_reservados)
+    tokens = [contar_tokens(formatear_turno(msg)) for msg in mensajes]
+    total = sum(tokens)
+
+    info = {
+        "estrategia": "ninguna",
+        "presupuesto": presupuesto,
+        "tokens_originales": total,
+        "tokens_finales": total,
+        "turnos_originales": len(mensajes),
+        "turnos_finales": len(mensajes),
+        "turnos_resumidos": 0,
+        "turnos_descartados": 0,
+    }
+
+    if estrategia == "ninguna" or total <= presupuesto:
+        return list(mensajes), info
+
+    info["estrategia"] = estrategia
+
+    corte = max(0, len(mensajes) - max(0, settings.TRANSCRIPCION_TURNOS_RECIENTES))
+    recientes = list(range(corte, len(mensajes)))
+    antiguos = list(range(corte))
+
+    antiguos_asistente = [i for i in antiguos if mensajes[i]["remitente"] == "asistente"]
+    antiguos_usuario = [i for i in antiguos if mensajes[i]["remitente"] != "asistente"]
+    total = sum(tokens[i] for i in recientes)
+
+    # Parte del presupuesto queda reservada para el resumen del asistente
+    reserva_resumen = presupuesto // 6 if estrategia == "resumen" and antiguos_asistente else 0
+
+    # 1. Turnos antiguos del usuario: entran primero los más informativos mientras quepan
+    conservados = set()
+    for i in sorted(antiguos_usuario, key=lambda i: (-_puntaje_informativo(mensajes[i]), -i)):
+        if total + tokens[i] <= presupuesto - reserva_resumen:
+            conservados.add(i)
+            total += tokens[i]
+    info["turnos_descartados"] += len(antiguos_usuario) - len(conservados)
+
+    # 2. Turnos antiguos del asistente: resumen acumulado con lo que quede de presupuesto
+    #    (de los más recientes hacia atrás) o se descartan en la estrategia "ventana"
+    resumen = None
+    if estrategia == "resumen" and antiguos_asistente:
+        resumen, resumidos = _resumir_turnos_asistente(
+            [mensajes[i] for i in antiguos_asistente], presupuesto - total
+        )
+        if resumen:
+            total += contar_tokens(formatear_turno(resumen))
+        info["turnos_resumidos"] = resumidos
+        info["turnos_descartados"] += len(antiguos_asistente) - resumidos
+    else:
+        info["turnos_descartados"] += len(antiguos_asistente)
+
+    preparados = []
+    if resumen:
+        preparados.append(resumen)
+    preparados.extend(mensajes[i] for i in sorted(conservados) + recientes)
+
+    info["tokens_finales"] = total
+    info["turnos_finales"] = len(preparados)
+
+    if total > presupuesto:
+        logger.warning(
+            f"⚠️ Transcripción sigue sobre el presupuesto tras recortar "
+            f"({total} > {presupuesto} tokens); solo quedan los turnos recientes"
+        )
+
+    logger.info(
+        f"✂️ Transcripción recortada ({estrategia}): {info['tokens_originales']} → {total} tokens, "
+        f"{info['turnos_originales']} → {info['turnos_finales']} turnos "
+        f"({info['turnos_resumidos']} resumidos, {info['turnos_descartados']} descartados)"
+    )
+
+    return preparados, info
+
+
+def registrar_llamada(info: dict, tokens_prompt_estimados: int, tokens_prompt_reales: int = None):
+    """
+    Registra los tokens de prompt de una llamada de extracción (para métricas)
+    """
+    registro = {
+        "estrategia": info.get("estrategia"),
+        "tokens_prompt_estimados": tokens_prompt_estimados,
+        "tokens_prompt": tokens_prompt_reales if tokens_prompt_reales is not None else tokens_prompt_estimados,
+        "turnos_originales": info.get("turnos_originales"),
+        "turnos_finales": info.get("turnos_finales"),
+    }
+    with _metricas_lock:
+        _historial_llamadas.append(registro)
+
+    logger.info(
+        f"🔢 Tokens de prompt (extracción): {registro['tokens_prompt']} "
+        f"(estimados: {tokens_prompt_estimados}, estrategia: {registro['estrategia']})"
+    )
+
+
+def obtener_metricas() -> dict:
+    """
+    Resumen de tokens de prompt de las últimas llamadas de extracción
+    """
+    with _metricas_lock:
+        llamadas = list(_historial_llamadas)
+
+    tokens = [llamada["tokens_prompt"] for llamada in llamadas]
+    return {
+        "presupuesto_tokens": settings.TRANSCRIPCION_PRESUPUESTO_TOKENS,
+        "estrategia": settings.TRANSCRIPCION_ESTRATEGIA,
+        "contador": "tiktoken" if _obtener_codificador() is not None else "estimado",
+        "llamadas": len(llamadas),
+        "tokens_prompt_promedio": round(sum(tokens) / len(tokens)) if tokens else 0,
+        "tokens_prompt_max": max(tokens) if tokens else 0,
+        "recortadas": sum(1 for llamada in llamadas if llamada["estrategia"] != "ninguna"),
+        "ultimas": llamadas[-10:],
+    }
+
+
+def _resumir_turnos_asistente(turnos: list, presupuesto: int) -> tuple:
+    """
+    Comprime turnos del asistente en un solo turno: primera oración de cada uno, truncada
+
+    Se llena desde el turno más reciente hacia atrás hasta agotar el presupuesto.
+
+    Returns:
+        tuple: (turno_resumen o None, cantidad de turnos incluidos)
+    """
+    encabezado = "[Resumen de intervenciones anteriores del asistente] "
+    usados = contar_tokens(formatear_turno({"remitente": "asistente", "texto": encabezado}))
+
+    lineas = []
+    incluidos = 0
+    for turno in reversed(turnos):
+        texto = " ".join(turno["texto"].split())
+        primera = _PATRON_ORACION.split(texto, maxsplit=1)[0]
+        if len(primera) > _MAX_CARACTERES_RESUMEN:
+            primera = primera[:_MAX_CARACTERES_RESUMEN].rstrip() + "…"
+        if not primera:
+            continue
+
+        costo = contar_tokens(primera + " | ")
+        if usados + costo > presupuesto:
+            break
+        usados += costo
+        incluidos += 1
+        lineas.append(primera)
+
+    if not lineas:
+        return None, 0
+
+    lineas.reverse()
+    return {"remitente": "asistente", "texto": encabezado + " | ".join(lineas)}, incluidos
+
+
+def _puntaje_informativo(msg: dict) -> int:
+    """
+    Heurística de cuánta información del caso aporta un turno del usuario
+    """
+    texto = msg["texto"]
+    return len(_PATRON_DATOS.findall(texto)) * 20 + min(len(texto), 400) // 20
+
+
+def _obtener_codificador():
+    global _codificador
+    if _codificador is None:
+        _codificador = False  # False = no disponible, no reintentar
+        if tiktoken is not None:
+            try:
+                _codificador = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo cargar tiktoken, se estimarán tokens: {str(e)}")
+    return _codificador or None
@@ -0,0 +1,138 @@
+"""
+Versiones de documentos generados y de sus análisis de IA
+
+El texto de cada documento vive en la tabla documentos, una fila por versión:
+regenerar o editar agrega una versión nueva (nunca sobrescribe) y
+Caso.documento_version apunta a la vigente. Los análisis de IA van en la tabla
+analisis, uno por (caso, versión del documento). Así la fila de casos queda
+angosta y las versiones anteriores se pueden listar y comparar.
+"""
+
+import difflib
+import hashlib
+import logging
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..models import Analisis, Caso, Documento
+from .document_service import RenderizadorDOCX, RenderizadorPDF
+
+logger = logging.getLogger(__name__)
+
+
+def calcular_hash(contenido: str) -> str:
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def metadatos_render() -> dict:
+    """
+    Versiones de los renderizadores vigentes al guardar una versión del documento
+    """
+    return {"pdf": RenderizadorPDF.VERSION, "docx": RenderizadorDOCX.VERSION}
+
+
+def guardar_documento(db: Session, caso: Caso, contenido: Optional[str], origen: str = "generacion") -> Optional[Documento]:
+    """
+    Agrega una versión del documento del caso y la deja vigente
+
+    Si el texto es igual al de la versión vigente no crea otra. Un texto vacío
+    deja el caso sin documento (las versiones anteriores se conservan).
+
+    Para numerar la versión bloquea la fila del caso (SELECT ... FOR UPDATE)
+    hasta el commit del llamador: una generación y una edición simultáneas del
+    mismo caso se ordenan en lugar de chocar en uq_documentos_caso_version.
+
+    Args:
+        db: Sesión de base de datos (el llamador hace commit)
+        caso: Caso ya persistido
+        contenido: Texto del documento
+        origen: "generacion", "edicion" o "migracion"
+
+    Returns:
+        Documento: La versión vigente, o None si el caso quedó sin documento
+    """
+    if not contenido:
+        caso.documento_version = None
+        set_committed_value(caso, "documento_actual", None)
+        set_committed_value(caso, "analisis_actual", None)
+        return None
+
+    hash_contenido = calcular_hash(contenido)
+    actual = caso.documento_actual if caso.documento_version is not None else None
+    if actual is not None and actual.hash_contenido == hash_contenido:
+        return actual
+
+    db.query(Caso.id).filter(Caso.id == caso.id).with_for_update().scalar()
+    ultima = db.query(func.max(Documento.version)).filter(Documento.caso_id == caso.id).scalar() or 0
+    documento = Documento(
+        caso_id=caso.id,
+        version=ultima + 1,
+        contenido=contenido,
+        hash_contenido=hash_contenido,
+        origen=origen,
+        metadatos_render=metadatos_render(),
+    )
+    db.add(documento)
+
+    caso.documento_version = documento.version
+    set_committed_value(caso, "documento_actual", documento)
+    set_committed_value(caso, "analisis_actual", None)  # La versión nueva aún no tiene análisis
+
+    logger.info(f"📄 Caso {caso.id}: documento versión {documento.version} ({origen})")
+    return documento
+
+
+def guardar_analisis(db: Session, caso_id: int, documento_version: int, resultado: dict) -> Analisis:
+    """
+    Guarda (o reemplaza) el análisis de IA de una versión del documento
+
+    Args:
+        resultado: Campos fortaleza, calidad, jurisprudencia y sugerencias
+    """
+    analisis = db.query(Analisis).filter(
+        Analisis.caso_id == caso_id,
+        Analisis.documento_version == documento_version
+    ).first()
+
+    if analisis is None:
+        analisis = Analisis(caso_id=caso_id, documento_version=documento_version)
+        db.add(analisis)
+
+    analisis.fortaleza = resultado.get("fortaleza")
+    analisis.calidad = resultado.get("calidad")
+    analisis.jurisprudencia = resultado.get("jurisprudencia")
+    analisis.sugerencias = resultado.get("sugerencias")
+    return analisis
+
+
+def listar_versiones(db: Session, caso_id: int) -> List[Documento]:
+    """
+    Versiones del documento del caso, sin cargar el texto
+    """
+    return db.query(Documento).options(
+        load_only(Documento.id, Documento.caso_id, Documento.version, Documento.hash_contenido,
+                  Documento.origen, Documento.metadatos_render, Documento.created_at)
+    ).filter(Documento.caso_id == caso_id).order_by(Documento.version).all()
+
+
+def obtener_version(db: Session, caso_id: int, version: int) -> Optional[Documento]:
+    return db.query(Documento).filter(Documento.caso_id == caso_id, Documento.version == version).first()
+
+
+def diferencia(anterior: Documento, nuevo: Documento) -> List[str]:
+    """
+    Diff unificado (por líneas) entre dos versiones del documento
+    """
+    if anterior.hash_contenido == nuevo.hash_contenido:
+        return []
+
+    return list(difflib.unified_diff(
+        anterior.contenido.splitlines(),
+        nuevo.contenido.splitlines(),
+        fromfile=f"v{anterior.version}",
+        tofile=f"v{nuevo.version}",
+        lineterm="",
+    ))
@@ -0,0 +1,102 @@
+"""
+Micro-benchmark del render de PDF (document_service)
+
+Compara, para tutelas sintéticas de 3 a 6 páginas:
+- "en frío": un RenderizadorPDF nuevo por documento (equivale al comportamiento
+  anterior: hoja de estilos y regex reconstruidos en cada llamada)
+- "reutilizado": el renderizador compartido de generar_pdf
+
+Uso (desde la raíz del repo, con las variables de entorno de la app cargadas):
+    python -m benchmarks.bench_pdf
+    python -m benchmarks.bench_pdf --repeticiones 50
+"""
+
+import argparse
+import re
+import statistics
+import time
+
+from app.services.document_service import RenderizadorPDF, generar_pdf
+
+PARRAFO_HECHOS = (
+    "El día {n} de marzo de 2025 el accionante radicó ante la EPS la orden médica expedida por su "
+    "médico tratante para el suministro del medicamento requerido para el manejo de su enfermedad "
+    "crónica, sin que a la fecha la entidad haya autorizado ni entregado el mismo, pese a los "
+    "reiterados requerimientos verbales y escritos presentados en la sede de atención al usuario."
+)
+
+
+def construir_tutela(hechos: int) -> str:
+    """
+    Tutela sintética con el formato que produce openai_service (≈ 1 página cada 7-8 hechos)
+    """
+    lineas = [
+        "**ACCIÓN DE TUTELA**",
+        "",
+        "Señor",
+        "**JUEZ CONSTITUCIONAL DE BOGOTÁ (REPARTO)**",
+        "E. S. D.",
+        "",
+        "**I. HECHOS**",
+        "",
+    ]
+    for n in range(1, hechos + 1):
+        lineas += [f"{n}. " + PARRAFO_HECHOS.format(n=n), ""]
+
+    lineas += [
+        "**II. DERECHOS VULNERADOS**",
+        "",
+        "Derecho a la Salud (Art. 49 C.P.), Derecho a la Vida (Art. 11 C.P.)",
+        "",
+        "**III. PRETENSIONES**",
+        "",
+        "1. Que se ordene a la EPS autorizar y entregar el medicamento en un término de 48 horas.",
+        "",
+        "**IV. FUNDAMENTOS DE DERECHO**",
+        "",
+        "Artículo 86 de la Constitución Política, Decreto 2591 de 1991, Sentencia T-760/2008.",
+        "",
+        "**V. JURAMENTO**",
+        "",
+        "Manifiesto bajo la gravedad del juramento que no he presentado otra acción de tutela por los mismos hechos.",
+        "",
+        "___________________________",
+        "Ana Díaz",
+        "C.C. 1.020.304.050",
+    ]
+    return "\n".join(lineas)
+
+
+def medir(funcion, texto: str, repeticiones: int) -> list:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(texto)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del render de PDF")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    generar_pdf("calentamiento")  # Crear el renderizador compartido y cargar fuentes
+
+    print(f"\n{'páginas':>8} {'KB':>6} {'en frío (ms)':>14} {'reutilizado (ms)':>17} {'mejora':>7}")
+    for hechos in (14, 21, 28, 35):
+        texto = construir_tutela(hechos)
+        pdf = generar_pdf(texto).getvalue()
+        paginas = len(re.findall(rb"/Type /Page\b(?!s)", pdf))
+
+        frio = statistics.median(medir(lambda t: RenderizadorPDF().renderizar(t), texto, args.repeticiones))
+        reutilizado = statistics.median(medir(generar_pdf, texto, args.repeticiones))
+
+        print(
+            f"{paginas:>8} {len(pdf) / 1024:>6.1f} {frio:>14.2f} {reutilizado:>17.2f} "
+            f"{(1 - reutilizado / frio) * 100:>6.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
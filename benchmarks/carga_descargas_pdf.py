@@ -0,0 +1,195 @@
+"""
+Prueba de carga: latencia de otros endpoints durante una ráfaga de descargas de PDF
+
+Levanta la API con uvicorn en un subproceso (SQLite temporal), crea N casos
+desbloqueados con documentos distintos (todas las descargas son misses del caché
+de PDFs) y lanza N descargas concurrentes de /casos/{id}/descargar/pdf mientras
+mide continuamente GET /health y GET /mensajes/caso/{id}.
+
+Se ejecuta una vez por backend (local = render en el proceso de la API,
+proceso = pool de procesos) y reporta p50/p99 de cada endpoint.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.carga_descargas_pdf
+    python -m benchmarks.carga_descargas_pdf --descargas 50 --backends local proceso
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def preparar_datos(descargas: int) -> tuple:
+    """
+    Crea un usuario y `descargas` casos desbloqueados con textos distintos
+
+    Returns:
+        tuple: (token, [caso_id, ...])
+    """
+    # Imports diferidos: la configuración de la app se lee del entorno del subproceso
+    from app.core.database import Base, SessionLocal, engine
+    from app.core.security import create_access_token, get_password_hash
+    from app.models import Caso, Mensaje, User
+    from app.services import versiones_service
+    from benchmarks.bench_pdf import construir_tutela
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        usuario = User(email="carga@abogadai.co", nombre="Carga", apellido="Prueba",
+                       hashed_password=get_password_hash("carga"))
+        db.add(usuario)
+        db.commit()
+
+        casos = []
+        for n in range(descargas):
+            caso = Caso(user_id=usuario.id, nombre_solicitante=f"Solicitante {n}", documento_desbloqueado=True)
+            db.add(caso)
+            casos.append(caso)
+        db.flush()
+
+        for n, caso in enumerate(casos):
+            versiones_service.guardar_documento(db, caso, construir_tutela(21 + n % 14) + f"\n\nRadicado {n}")
+        db.commit()
+
+        for caso in casos[:1]:
+            db.add(Mensaje(caso_id=caso.id, remitente="usuario", texto="Hola"))
+        db.commit()
+
+        return create_access_token({"sub": usuario.email}), [caso.id for caso in casos]
+    finally:
+        db.close()
+
+
+async def sondear(cliente, url: str, headers: dict, tiempos: list, detener: asyncio.Event):
+    while not detener.is_set():
+        inicio = time.perf_counter()
+        await cliente.get(url, headers=headers)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        await asyncio.sleep(0.02)
+
+
+async def rafaga(base: str, token: str, casos: list) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    tiempos = {"health": [], "mensajes": [], "descarga": []}
+    errores = 0
+
+    limites = httpx.Limits(max_connections=len(casos) + 10)
+    async with httpx.AsyncClient(base_url=base, timeout=120, limits=limites) as cliente:
+        detener = asyncio.Event()
+        sondas = [
+            asyncio.create_task(sondear(cliente, "/health", {}, tiempos["health"], detener)),
+            asyncio.create_task(sondear(cliente, f"/mensajes/caso/{casos[0]}", headers, tiempos["mensajes"], detener)),
+        ]
+        await asyncio.sleep(0.5)  # Línea base antes de la ráfaga
+
+        async def descargar(caso_id):
+            nonlocal errores
+            inicio = time.perf_counter()
+            respuesta = await cliente.get(f"/casos/{caso_id}/descargar/pdf", headers=headers)
+            tiempos["descarga"].append((time.perf_counter() - inicio) * 1000)
+            if respuesta.status_code != 200:
+                errores += 1
+
+        await asyncio.gather(*(descargar(caso_id) for caso_id in casos))
+        detener.set()
+        await asyncio.gather(*sondas)
+
+    return {"tiempos": tiempos, "errores": errores}
+
+
+def ejecutar_backend(backend: str, descargas: int, procesos: int) -> dict:
+    directorio = tempfile.mkdtemp(prefix="carga_pdf_")
+    puerto = puerto_libre()
+    entorno = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{directorio}/carga.db",
+        "PDF_CACHE_DIR": os.path.join(directorio, "cache"),
+        "PDF_RENDER_BACKEND": backend,
+        "PDF_RENDER_PROCESOS": str(procesos),
+        "PDF_RENDER_MAX_COLA": str(descargas * 2),
+    }
+    entorno.setdefault("SECRET_KEY", "carga")
+    for variable in ("LIVEKIT_API_KEY", "LIVEKIT_API_SECRET", "LIVEKIT_URL", "OPENAI_API_KEY"):
+        entorno.setdefault(variable, "carga")
+
+    # Los datos se crean con la misma configuración que usará el servidor
+    preparacion = subprocess.run(
+        [sys.executable, "-c",
+         "import json, sys; from benchmarks.carga_descargas_pdf import preparar_datos; "
+         f"print(json.dumps(preparar_datos({descargas})))"],
+        env=entorno, capture_output=True, text=True, check=True,
+    )
+    token, casos = json.loads(preparacion.stdout.strip().splitlines()[-1])
+
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(puerto), "--log-level", "warning"],
+        env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{puerto}"
+    try:
+        for _ in range(100):
+            try:
+                if httpx.get(f"{base}/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+
+        # Calentar el pool de procesos (spawn + imports) fuera de la medición
+        httpx.get(f"{base}/casos/{casos[-1]}/descargar/pdf",
+                  headers={"Authorization": f"Bearer {token}"}, timeout=60)
+
+        return asyncio.run(rafaga(base, token, casos[:-1]))
+    finally:
+        servidor.terminate()
+        servidor.wait()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de otros endpoints durante una ráfaga de descargas de PDF")
+    parser.add_argument("--descargas", type=int, default=50)
+    parser.add_argument("--procesos", type=int, default=2)
+    parser.add_argument("--backends", nargs="+", default=["local", "proceso"])
+    args = parser.parse_args()
+
+    print(f"\nRáfaga de {args.descargas} descargas concurrentes (documentos distintos, caché frío)\n")
+    print(f"{'backend':>8} {'endpoint':>10} {'n':>5} {'p50 (ms)':>10} {'p99 (ms)':>10} {'max (ms)':>10}")
+
+    for backend in args.backends:
+        resultado = ejecutar_backend(backend, args.descargas + 1, args.procesos)
+        for endpoint, tiempos in resultado["tiempos"].items():
+            print(
+                f"{backend:>8} {endpoint:>10} {len(tiempos):>5} {statistics.median(tiempos) if tiempos else 0:>10.1f} "
+                f"{percentil(tiempos, 99):>10.1f} {max(tiempos, default=0):>10.1f}"
+            )
+        if resultado["errores"]:
+            print(f"{backend:>8} {'errores':>10} {resultado['errores']:>5}")
+
+
+if __name__ == "__main__":
+    main()
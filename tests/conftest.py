@@ -0,0 +1,49 @@
+"""
+Configuración mínima para correr la app contra un SQLite temporal
+
+Se define antes de importar app.*: Settings lee el entorno al importarse.
+"""
+
+import os
+import tempfile
+
+_directorio = tempfile.mkdtemp(prefix="abogadai-tests-")
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_directorio, 'tests.db')}")
+os.environ.setdefault("SECRET_KEY", "tests")
+os.environ.setdefault("OPENAI_API_KEY", "tests")
+os.environ.setdefault("LIVEKIT_API_KEY", "tests")
+os.environ.setdefault("LIVEKIT_API_SECRET", "tests")
+os.environ.setdefault("LIVEKIT_URL", "ws://localhost")
+os.environ.setdefault("MENSAJES_WAL_DIR", os.path.join(_directorio, "wal"))
+
+import pytest
+
+from app.core.database import Base, SessionLocal, engine
+from app.models.caso import Caso
+from app.models.user import User
+from app.services import cache_usuarios_service
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine)
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+        Base.metadata.drop_all(engine)
+        cache_usuarios_service.invalidar_todo()  # Los ids se reutilizan en la siguiente prueba
+
+
+@pytest.fixture
+def caso(db):
+    usuario = User(email="tests@abogadai.co", hashed_password="x", nombre="Test", apellido="Tests")
+    db.add(usuario)
+    db.commit()
+
+    caso = Caso(user_id=usuario.id)
+    db.add(caso)
+    db.commit()
+    return caso
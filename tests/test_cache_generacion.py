@@ -0,0 +1,52 @@
+import pytest
+
+from app.services import cache_generacion_service, openai_service
+
+DATOS = {
+    "nombre_solicitante": "Ana Gómez",
+    "entidad_accionada": "EPS Salud",
+    "hechos": "Primero: solicité la cita.\n\nSegundo: me la negaron.",
+    "pretensiones": "Que se autorice la cita.",
+    "pruebas": None,
+}
+
+
+def _clave(datos, tipo="TUTELA"):
+    return cache_generacion_service.calcular_clave(tipo, datos)
+
+
+@pytest.mark.parametrize("cambio", [
+    {"hechos": "  " + DATOS["hechos"] + "\n"},  # Espacios al inicio y al final
+    {"hechos": DATOS["hechos"].replace("\n", "\r\n")},  # Finales de línea de Windows
+    {"pruebas": ""},  # Vacío equivale a None
+    {"pruebas": "   "},
+])
+def test_cambios_que_no_alteran_el_prompt_dan_la_misma_clave(cambio):
+    assert _clave({**DATOS, **cambio}) == _clave(DATOS)
+
+
+def test_el_orden_de_las_claves_no_importa():
+    assert _clave(dict(reversed(list(DATOS.items())))) == _clave(DATOS)
+
+
+@pytest.mark.parametrize("cambio", [
+    {"hechos": "Primero: solicité la cita.\nSegundo: me la negaron."},  # Un párrafo menos
+    {"hechos": "Primero: solicité la cita. Segundo: me la negaron."},  # Sin saltos de línea
+    {"hechos": "Primero:  solicité la cita.\n\nSegundo: me la negaron."},  # Espacios internos
+    {"pretensiones": "Que se autorice la cita de inmediato."},
+    {"pruebas": "Historia clínica"},
+])
+def test_cambios_en_el_texto_cambian_la_clave(cambio):
+    assert _clave({**DATOS, **cambio}) != _clave(DATOS)
+
+
+def test_tipo_prompt_y_modelo_cambian_la_clave(monkeypatch):
+    clave = _clave(DATOS)
+    assert _clave(DATOS, tipo="DERECHO_PETICION") != clave
+
+    monkeypatch.setattr(openai_service, "PROMPT_VERSION", openai_service.PROMPT_VERSION + "-b")
+    assert _clave(DATOS) != clave
+    monkeypatch.undo()
+
+    monkeypatch.setattr(openai_service, "MODELO", openai_service.MODELO + "-b")
+    assert _clave(DATOS) != clave
@@ -0,0 +1,60 @@
+import asyncio
+import json
+from datetime import datetime
+
+from fastapi import WebSocketDisconnect
+from sqlalchemy import select
+
+from app.models.mensaje import Mensaje
+from app.services.canal_mensajes_service import CanalMensajes
+
+
+class _WebSocketAgente:
+    """
+    Extremo del agente: lo que se pone en `entradas` lo recibe el canal y lo que
+    el canal envía aparece en `salidas` (None en entradas = desconexión)
+    """
+
+    def __init__(self):
+        self.entradas = asyncio.Queue()
+        self.salidas = asyncio.Queue()
+
+    async def receive_text(self):
+        datos = await self.entradas.get()
+        if datos is None:
+            raise WebSocketDisconnect()
+        return json.dumps(datos)
+
+    async def send_json(self, datos):
+        await self.salidas.put(datos)
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+
+def test_canal_valida_mensajes_y_normaliza_timestamp(db, caso):
+    async def conversacion():
+        ws = _WebSocketAgente()
+        canal = asyncio.create_task(CanalMensajes(ws, caso.id).ejecutar())
+        assert await ws.salidas.get() == {"tipo": "hola", "caso_id": caso.id, "ultimo_seq": 0}
+
+        await ws.entradas.put({"seq": 1, "remitente": "usuario", "texto": "hola", "confianza": 93.5})
+        error = await ws.salidas.get()
+        assert (error["codigo"], error["seq"]) == ("mensaje_invalido", 1)
+
+        # El mismo seq, corregido; "1200" se convierte a entero
+        await ws.entradas.put({
+            "seq": 1, "remitente": "usuario", "texto": "hola",
+            "duracion_audio": "1200", "timestamp": "2025-03-01T10:00:00+05:00"
+        })
+        assert await asyncio.wait_for(ws.salidas.get(), timeout=5) == {"tipo": "ack", "seq": 1}
+
+        await ws.entradas.put(None)
+        await canal
+
+    asyncio.run(conversacion())
+
+    db.expire_all()
+    mensaje = db.scalars(select(Mensaje).where(Mensaje.caso_id == caso.id)).one()
+    assert (mensaje.seq, mensaje.duracion_audio) == (1, 1200)
+    assert mensaje.timestamp == datetime(2025, 3, 1, 5, 0, 0)
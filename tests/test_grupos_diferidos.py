@@ -0,0 +1,97 @@
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, inspect
+
+from app.core.database import engine
+from app.core.security import create_access_token
+from app.main import app
+from app.models.caso import Caso, GRUPO_RELATO, cargar_grupos
+from app.services import versiones_service
+
+
+@pytest.fixture
+def caso_completo(db, caso):
+    caso.hechos = "La EPS negó la cita."
+    caso.fundamentos_derecho = "Artículo 49 de la Constitución."
+    caso.historial_reembolsos = [{"accion": "solicitud"}]
+    caso.extraccion_estado = {"hechos": "La EPS negó la cita."}
+    versiones_service.guardar_documento(db, caso, "ACCIÓN DE TUTELA\n\nHechos...")
+    db.commit()
+    return caso
+
+
+@pytest.fixture
+def cliente(caso):
+    token = create_access_token(data={"sub": "tests@abogadai.co", "uid": caso.user_id})
+    cliente = TestClient(app, headers={"Authorization": f"Bearer {token}"})
+    cliente.get("/casos/prellenar-datos")  # Deja al usuario en caché: solo se cuentan las consultas del caso
+    return cliente
+
+
+@contextmanager
+def _consultas():
+    sentencias = []
+
+    def registrar(conexion, cursor, sentencia, parametros, contexto, executemany):
+        sentencias.append(" ".join(sentencia.split()))
+
+    event.listen(engine, "before_cursor_execute", registrar)
+    try:
+        yield sentencias
+    finally:
+        event.remove(engine, "before_cursor_execute", registrar)
+
+
+def _selects_de(sentencias, tabla):
+    # Un acceso a un grupo no cargado aparece como otro SELECT ... FROM <tabla>
+    return [s for s in sentencias if s.startswith("SELECT") and f"FROM {tabla}" in s]
+
+
+def test_consulta_por_defecto_no_trae_grupos_pesados(db, caso_completo):
+    caso_id = caso_completo.id
+    db.expunge_all()
+    caso = db.query(Caso).filter(Caso.id == caso_id).one()
+
+    sin_cargar = inspect(caso).unloaded
+    assert {"hechos", "fundamentos_derecho", "historial_reembolsos", "extraccion_estado",
+            "documento_actual", "analisis_actual"} <= sin_cargar
+    assert "nombre_solicitante" not in sin_cargar
+
+
+def test_cargar_grupos_trae_solo_lo_pedido(db, caso_completo):
+    caso_id = caso_completo.id
+    db.expunge_all()
+    caso = db.query(Caso).options(*cargar_grupos(GRUPO_RELATO)).filter(Caso.id == caso_id).one()
+
+    sin_cargar = inspect(caso).unloaded
+    assert "hechos" not in sin_cargar and "fundamentos_derecho" not in sin_cargar
+    assert {"historial_reembolsos", "extraccion_estado", "documento_actual"} <= sin_cargar
+
+
+@pytest.mark.parametrize("metodo, ruta, lecturas", [
+    ("get", "/casos/{id}", 1),  # CasoResponse: documento, relato y análisis
+    ("put", "/casos/{id}", 2),  # Y otra vez tras el commit, con los mismos grupos
+    ("post", "/casos/{id}/validar", 1),  # Relato
+    ("get", "/casos/{id}/documento", 1),  # Documento
+])
+def test_cada_ruta_trae_sus_grupos_sin_consultas_extra(caso_completo, cliente, metodo, ruta, lecturas):
+    argumentos = {"json": {}} if metodo == "put" else {}
+
+    with _consultas() as sentencias:
+        respuesta = getattr(cliente, metodo)(ruta.format(id=caso_completo.id), **argumentos)
+
+    assert respuesta.status_code == 200, respuesta.text
+    assert len(_selects_de(sentencias, "casos")) == lecturas, sentencias
+    assert _selects_de(sentencias, "documentos") == [], sentencias
+    assert _selects_de(sentencias, "analisis") == [], sentencias
+
+
+@pytest.mark.parametrize("metodo", ["get", "put"])
+def test_respuesta_del_caso_incluye_los_grupos(caso_completo, cliente, metodo):
+    argumentos = {"json": {"nombre_solicitante": "Ana"}} if metodo == "put" else {}
+    cuerpo = getattr(cliente, metodo)(f"/casos/{caso_completo.id}", **argumentos).json()
+
+    assert cuerpo["hechos"] == "La EPS negó la cita."
+    assert cuerpo["documento_generado"].startswith("ACCIÓN DE TUTELA")
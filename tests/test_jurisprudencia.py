@@ -0,0 +1,99 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import openai_client
+from app.services import ai_analysis_service, jurisprudencia_service
+
+
+@pytest.fixture
+def indice(tmp_path, monkeypatch):
+    origen = tmp_path / "semilla.csv"
+    origen.write_text(
+        "tipo,numero,anio,tema,etiquetas\n"
+        "T,760,2008,Derecho a la salud,salud;eps\n"
+        "C,355,2006,Interrupción voluntaria del embarazo,\n",
+        encoding="utf-8",
+    )
+    destino = str(tmp_path / "indice.json.gz")
+    jurisprudencia_service.construir_indice(str(origen), destino)
+    monkeypatch.setattr(jurisprudencia_service, "_indice", jurisprudencia_service.cargar_indice(destino))
+
+
+@pytest.fixture
+def gpt(monkeypatch):
+    """
+    Respuestas fijas de OpenAI; `prompts` guarda lo que se le pidió
+    """
+    prompts = []
+
+    async def crear_chat_completion(timeout=None, **kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        prompts.append(prompt)
+        if "sentencias citadas" in prompt:
+            respuesta = {"sentencias": [{"referencia": "Sentencia T-999/2021", "riesgo_alucinacion": "alto"}]}
+        else:
+            respuesta = {"puntuacion_total": 85, "listo_para_radicar": True, "fortaleza_total": 80}
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(respuesta)))])
+
+    monkeypatch.setattr(openai_client, "crear_chat_completion", crear_chat_completion)
+    return prompts
+
+
+def _cita(tipo, numero, anio):
+    return {"referencia": f"Sentencia {tipo}-{numero}/{anio}", "tipo": tipo, "numero": numero, "año": anio}
+
+
+def test_resolver_citas_separa_indexadas(indice):
+    todas = [_cita("T", "0760", "2008"), _cita("c", "355", "2006")]
+    ninguna = [_cita("T", "999", "2021")]
+
+    assert [c["tema"] for c in jurisprudencia_service.resolver_citas(todas)[0]] == [
+        "Derecho a la salud", "Interrupción voluntaria del embarazo"
+    ]
+    assert jurisprudencia_service.resolver_citas(todas)[1] == []
+    assert jurisprudencia_service.resolver_citas(ninguna) == ([], ninguna)
+
+    conocidas, desconocidas = jurisprudencia_service.resolver_citas(todas[:1] + ninguna)
+    assert [c["referencia"] for c in conocidas] == ["Sentencia T-0760/2008"]
+    assert conocidas[0]["etiquetas"] == ["salud", "eps"]
+    assert desconocidas == ninguna
+
+
+def test_todas_indexadas_no_llama_a_gpt_y_el_analisis_completo_termina(indice, gpt):
+    documento = "Según la Sentencia T-760/2008 y la Sentencia C-355/2006, procede la acción."
+
+    resultado = asyncio.run(ai_analysis_service.analisis_completo_documento(documento, {"hechos": "H"}, "TUTELA"))
+
+    jurisprudencia = resultado["jurisprudencia"]
+    assert jurisprudencia["sentencias_no_indexadas"] == []
+    assert len(jurisprudencia["sentencias_verificadas"]) == 2
+    assert not any("sentencias citadas" in prompt for prompt in gpt)  # Solo calidad y fortaleza
+    assert resultado["sugerencias"]["prioridad_critica"] == 0
+    assert resultado["listo_para_radicar"] is True
+
+
+def test_ninguna_indexada_valida_todas_con_gpt(indice, gpt):
+    documento = "Como dijo la Sentencia T-999/2021, procede la acción."
+
+    jurisprudencia = asyncio.run(ai_analysis_service.validar_jurisprudencia(documento))
+
+    assert jurisprudencia["sentencias_verificadas"] == []
+    assert jurisprudencia["sentencias_no_indexadas"] == ["Sentencia T-999/2021"]
+    assert jurisprudencia["validacion_ia"]["sentencias"][0]["riesgo_alucinacion"] == "alto"
+
+
+def test_citas_mixtas_solo_envian_a_gpt_las_no_indexadas(indice, gpt):
+    documento = "Ver Sentencia T-760/2008 y Sentencia T-999/2021."
+
+    resultado = asyncio.run(ai_analysis_service.analisis_completo_documento(documento, {"hechos": "H"}, "TUTELA"))
+
+    jurisprudencia = resultado["jurisprudencia"]
+    assert [c["referencia"] for c in jurisprudencia["sentencias_verificadas"]] == ["Sentencia T-760/2008"]
+    assert jurisprudencia["sentencias_no_indexadas"] == ["Sentencia T-999/2021"]
+    prompt_citas = next(prompt for prompt in gpt if "sentencias citadas" in prompt)
+    assert "T-999/2021" in prompt_citas and "T-760/2008" not in prompt_citas
+    assert resultado["sugerencias"]["prioridad_critica"] == 1
+    assert resultado["listo_para_radicar"] is False
@@ -0,0 +1,73 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.models import Analisis, Caso, Documento, EstadoCaso, EstadoPago, Mensaje, Pago, SesionDiaria
+from app.services import limpieza_service, versiones_service
+
+
+@pytest.fixture
+def commits(db):
+    confirmados = []
+
+    def registrar(sesion):
+        confirmados.append(sesion)
+
+    event.listen(db, "after_commit", registrar)
+    yield confirmados
+    event.remove(db, "after_commit", registrar)
+
+
+def _caso_con_hijos(db, user_id, vencido=True, desbloqueado=False):
+    caso = Caso(
+        user_id=user_id,
+        estado=EstadoCaso.GENERADO,
+        documento_desbloqueado=desbloqueado,
+        fecha_vencimiento=datetime.utcnow() + timedelta(days=-1 if vencido else 7),
+    )
+    db.add(caso)
+    db.flush()
+
+    db.add(Mensaje(caso_id=caso.id, remitente="usuario", texto="Hola"))
+    db.add(Pago(user_id=user_id, caso_id=caso.id, monto=50000, estado=EstadoPago.FALLIDO))
+    versiones_service.guardar_documento(db, caso, f"Documento {caso.id}")
+    versiones_service.guardar_analisis(db, caso.id, 1, {"fortaleza": {"puntuacion": 50}})
+    db.commit()
+    return caso.id
+
+
+def _hijos(db, caso_id):
+    return [db.query(modelo).filter(modelo.caso_id == caso_id).count() for modelo in (Mensaje, Pago, Documento, Analisis)]
+
+
+def test_documentos_vencidos_se_borran_con_sus_hijos_por_lotes(db, caso, commits):
+    vencidos = [_caso_con_hijos(db, caso.user_id) for _ in range(5)]
+    pagado = _caso_con_hijos(db, caso.user_id, desbloqueado=True)
+    vigente = _caso_con_hijos(db, caso.user_id, vencido=False)
+    commits.clear()
+
+    eliminados = limpieza_service.eliminar_documentos_vencidos(db, lote=2)
+
+    assert eliminados == 5
+    assert len(commits) == 3  # Lotes de 2, 2 y 1
+    restantes = {caso_id for (caso_id,) in db.query(Caso.id)}
+    assert restantes == {caso.id, pagado, vigente}
+    for caso_id in vencidos:
+        assert _hijos(db, caso_id) == [0, 0, 0, 0]
+    for caso_id in (pagado, vigente):
+        assert _hijos(db, caso_id) == [1, 1, 1, 1]
+
+
+def test_sesiones_diarias_antiguas_por_lotes(db, caso, commits):
+    hoy = date.today()
+    for dias in (100, 95, 91, 120, 200, 10, 0):
+        db.add(SesionDiaria(user_id=caso.user_id, fecha=hoy - timedelta(days=dias), sesiones_base_permitidas=3))
+    db.commit()
+    commits.clear()
+
+    eliminadas = limpieza_service.limpiar_sesiones_diarias_antiguas(db, dias_antiguedad=90, lote=2)
+
+    assert eliminadas == 5
+    assert len(commits) == 4  # Lotes de 2, 2 y 1, más el que confirma que no queda nada
+    assert sorted((hoy - s.fecha).days for s in db.query(SesionDiaria)) == [0, 10]
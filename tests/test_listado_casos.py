@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.security import create_access_token
+from app.main import app
+from app.models.caso import Caso, EstadoCaso, TipoDocumento
+
+
+@pytest.fixture
+def cliente(caso):
+    token = create_access_token(data={"sub": "tests@abogadai.co", "uid": caso.user_id})
+    return TestClient(app, headers={"Authorization": f"Bearer {token}"})
+
+
+@pytest.fixture
+def casos(db, caso):
+    # Siete casos más; tres comparten updated_at para probar el desempate por id
+    base = datetime(2025, 1, 10, 12, 0)
+    fechas = [base, base, base, base - timedelta(hours=1), base - timedelta(hours=2), base + timedelta(hours=1), base - timedelta(days=1)]
+    nuevos = []
+    for i, fecha in enumerate(fechas):
+        nuevo = Caso(
+            user_id=caso.user_id,
+            estado=EstadoCaso.PAGADO if i % 2 else EstadoCaso.GENERADO,
+            tipo_documento=TipoDocumento.DERECHO_PETICION if i % 3 == 0 else TipoDocumento.TUTELA,
+            updated_at=fecha,
+        )
+        db.add(nuevo)
+        nuevos.append(nuevo)
+
+    caso.updated_at = base - timedelta(days=2)
+    db.commit()
+    todos = nuevos + [caso]
+    return sorted(todos, key=lambda c: (-c.updated_at.timestamp(), c.id))
+
+
+def _paginar(cliente, **params):
+    ids, cursor, paginas = [], None, 0
+    while True:
+        respuesta = cliente.get("/casos/", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert respuesta.status_code == 200, respuesta.text
+        ids += [c["id"] for c in respuesta.json()]
+        paginas += 1
+        cursor = respuesta.headers.get("X-Siguiente-Cursor")
+        if cursor is None:
+            return ids, paginas
+
+
+def test_cursor_recorre_todos_los_casos_sin_repetir_ni_saltar(cliente, casos):
+    ids, paginas = _paginar(cliente, limite=3)
+
+    assert ids == [c.id for c in casos]
+    assert paginas == 3
+
+
+def test_ultima_pagina_exacta_no_trae_cursor(cliente, casos):
+    respuesta = cliente.get("/casos/", params={"limite": len(casos)})
+
+    assert len(respuesta.json()) == len(casos)
+    assert "X-Siguiente-Cursor" not in respuesta.headers
+
+
+@pytest.mark.parametrize("filtro", [
+    {"estado": "PAGADO"},
+    {"tipo_documento": "DERECHO_PETICION"},
+    {"estado": "GENERADO", "tipo_documento": "TUTELA"},
+])
+def test_filtros_se_mantienen_entre_paginas(cliente, casos, filtro):
+    ids, _ = _paginar(cliente, limite=2, **filtro)
+
+    esperados = [
+        c.id for c in casos
+        if c.estado.value == filtro.get("estado", c.estado.value)
+        and c.tipo_documento.value == filtro.get("tipo_documento", c.tipo_documento.value)
+    ]
+    assert esperados and ids == esperados
+
+
+def test_cursor_invalido_responde_400(cliente, casos):
+    assert cliente.get("/casos/", params={"cursor": "no-es-un-cursor"}).status_code == 400
@@ -0,0 +1,85 @@
+import fcntl
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.main import app
+from app.models.mensaje import Mensaje
+from app.services import mensajes_buffer_service
+
+
+def _guardados(db, caso_id):
+    db.expire_all()
+    return db.scalars(select(Mensaje).where(Mensaje.caso_id == caso_id).order_by(Mensaje.id)).all()
+
+
+def test_lote_con_campos_opcionales_distintos(db, caso):
+    cliente = TestClient(app)
+    mensajes = [
+        {"caso_id": caso.id, "remitente": "usuario", "texto": "uno", "duracion_audio": 1200},
+        {"caso_id": caso.id, "remitente": "asistente", "texto": "dos"},
+        {"caso_id": caso.id, "remitente": "usuario", "texto": "tres", "duracion_audio": 800, "confianza": 91},
+    ]
+
+    respuesta = cliente.post("/mensajes/lote", json={"mensajes": mensajes})
+
+    assert respuesta.status_code == 200, respuesta.text
+    guardados = _guardados(db, caso.id)
+    assert [(m.texto, m.duracion_audio, m.confianza) for m in guardados] == [
+        ("uno", 1200, None),
+        ("dos", None, None),
+        ("tres", 800, 91),
+    ]
+
+
+def test_vaciado_aparta_filas_invalidas(db, caso):
+    os.makedirs(settings.MENSAJES_WAL_DIR, exist_ok=True)
+    filas = [
+        {"caso_id": caso.id, "remitente": "usuario", "texto": "válido", "confianza": 90},
+        {"caso_id": caso.id, "remitente": "usuario", "texto": None},  # texto es NOT NULL
+        {"caso_id": caso.id, "remitente": "asistente", "texto": "también válido"},
+    ]
+
+    insertadas = mensajes_buffer_service._insertar_tolerante(filas)
+
+    assert insertadas == 2
+    assert filas == []  # Nada queda para reintentar
+    assert [m.texto for m in _guardados(db, caso.id)] == ["válido", "también válido"]
+    with open(os.path.join(settings.MENSAJES_WAL_DIR, "mensajes-descartados.jsonl"), encoding="utf-8") as archivo:
+        assert len(archivo.readlines()) == 1
+
+
+def test_diario_aparece_ya_bloqueado_y_la_recuperacion_no_lo_toca(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MENSAJES_WAL_DIR", str(tmp_path))
+    ruta = str(tmp_path / "mensajes-999999.wal")
+
+    diario = mensajes_buffer_service._crear_bloqueado(ruta, '{"texto": "pendiente"}\n')
+    try:
+        # Un worker que arranca no puede tomarlo: el bloqueo precede al nombre
+        with open(ruta) as otro:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(otro, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        # Temporal de otro worker a medio crear: aún sin bloqueo, pero fuera del glob
+        (tmp_path / ".mensajes-abc.creando").write_text("")
+
+        mensajes_buffer_service._recuperar_huerfanos()
+
+        assert sorted(os.listdir(tmp_path)) == [".mensajes-abc.creando", "mensajes-999999.wal"]
+    finally:
+        diario.close()
+
+
+def test_lectura_espera_solo_si_otro_worker_tiene_entradas(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MENSAJES_WAL_DIR", str(tmp_path))
+    monkeypatch.setattr(mensajes_buffer_service, "_ruta_diario", str(tmp_path / "mensajes-1.wal"))
+    (tmp_path / "mensajes-1.wal").write_text('{"propio": true}\n')
+    (tmp_path / "mensajes-2.wal").write_text("")
+
+    assert not mensajes_buffer_service._otros_diarios_con_entradas()
+
+    (tmp_path / "mensajes-2.wal").write_text('{"ajeno": true}\n')
+    assert mensajes_buffer_service._otros_diarios_con_entradas()
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+from app.models import Caso, EstadoPago, Pago, User
+from app.services import cache_usuarios_service, nivel_service
+
+
+def _pagar(db, caso, dias_atras=1, estado=EstadoPago.EXITOSO):
+    db.add(Pago(
+        user_id=caso.user_id,
+        caso_id=caso.id,
+        monto=50000,
+        estado=estado,
+        fecha_pago=datetime.utcnow() - timedelta(days=dias_atras),
+    ))
+    db.commit()
+
+
+def _usuario_con_caso(db, indice, nivel=0):
+    usuario = User(email=f"nivel{indice}@abogadai.co", hashed_password="x", nombre="Nivel", apellido=str(indice), nivel_usuario=nivel)
+    db.add(usuario)
+    db.commit()
+    caso = Caso(user_id=usuario.id)
+    db.add(caso)
+    db.commit()
+    return caso
+
+
+def test_recalcula_niveles_en_varios_lotes(db):
+    # (nivel actual, pagos exitosos de la semana, nivel esperado)
+    escenarios = [
+        (0, 0, 0),
+        (0, 1, 1),
+        (2, 2, 2),  # Sin cambio
+        (1, 0, 0),  # Bajó: la semana pasada sí pagó
+        (0, 5, nivel_service.NIVEL_MAXIMO),  # Tope en ORO
+        (3, 3, 3),
+        (0, 2, 2),
+    ]
+    casos = []
+    for indice, (nivel, pagos, _) in enumerate(escenarios):
+        caso = _usuario_con_caso(db, indice, nivel)
+        for _ in range(pagos):
+            _pagar(db, caso)
+        casos.append(caso)
+
+    # Pagos que no cuentan: viejos o no exitosos
+    _pagar(db, casos[0], dias_atras=8)
+    _pagar(db, casos[0], estado=EstadoPago.FALLIDO)
+    _pagar(db, casos[3], dias_atras=10)
+
+    ids = [caso.user_id for caso in casos]
+    totales = nivel_service.recalcular_todos_los_niveles(db, lote=2)  # Cuatro lotes, el último incompleto
+
+    assert totales == {"usuarios": len(escenarios), "cambios_nivel": 4}
+    db.expire_all()
+    niveles = {usuario.id: (usuario.nivel_usuario, usuario.pagos_ultimo_mes, usuario.ultimo_recalculo_nivel)
+               for usuario in db.query(User).filter(User.id.in_(ids))}
+    assert [niveles[user_id][0] for user_id in ids] == [esperado for _, _, esperado in escenarios]
+    assert [niveles[user_id][1] for user_id in ids] == [pagos for _, pagos, _ in escenarios]
+    assert all(recalculo is not None for _, _, recalculo in niveles.values())
+
+
+def test_sin_usuarios(db):
+    assert nivel_service.recalcular_todos_los_niveles(db) == {"usuarios": 0, "cambios_nivel": 0}
+
+
+def test_recalcular_vacia_el_cache_de_usuarios(db, caso):
+    # El usuario queda cacheado con el nivel anterior (como tras autenticarse)
+    assert cache_usuarios_service.obtener(db, caso.user_id).nivel_usuario == 0
+    db.close()
+
+    _pagar(db, caso)
+    nivel_service.recalcular_todos_los_niveles(db)
+    db.close()
+
+    assert cache_usuarios_service.obtener(db, caso.user_id).nivel_usuario == 1
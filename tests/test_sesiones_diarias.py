@@ -0,0 +1,49 @@
+from datetime import date
+
+import pytest
+
+from app.core.niveles import limites_nivel
+from app.models.sesion_diaria import SesionDiaria
+from app.services import sesion_service
+
+
+def _registros(db, user_id):
+    db.expire_all()
+    return db.query(SesionDiaria).filter(SesionDiaria.user_id == user_id).all()
+
+
+def test_dos_inicios_suman_sobre_un_solo_registro(db, caso):
+    primero = sesion_service.registrar_inicio_sesion(caso.user_id, caso.id, db)
+    segundo = sesion_service.registrar_inicio_sesion(caso.user_id, caso.id, db)
+
+    assert primero["sesiones_creadas_hoy"] == 1
+    assert segundo == {"sesiones_creadas_hoy": 2, "minutos_consumidos_hoy": 0}
+
+    (registro,) = _registros(db, caso.user_id)
+    assert (registro.fecha, registro.sesiones_creadas) == (date.today(), 2)
+    assert registro.sesiones_base_permitidas == limites_nivel(0)["sesiones_dia"]
+
+
+def test_fin_de_sesion_cuenta_una_vez_y_suma_minutos(db, caso):
+    sesion_service.registrar_fin_sesion(caso.id, 5, db)
+    resultado = sesion_service.registrar_fin_sesion(caso.id, 3, db, ya_fue_finalizada=True)
+
+    assert resultado["minutos_consumidos_hoy"] == 8
+    assert not resultado["sesion_contada"]
+    (registro,) = _registros(db, caso.user_id)
+    assert (registro.sesiones_creadas, registro.minutos_consumidos) == (1, 8)
+
+
+def test_sin_upsert_da_el_mismo_resultado(db, caso):
+    hoy = date.today()
+    sesion_service._sumar_uso_diario_sin_upsert(caso.user_id, hoy, 1, 0, db)
+    fila = sesion_service._sumar_uso_diario_sin_upsert(caso.user_id, hoy, 1, 4, db)
+    db.commit()
+
+    assert (fila.sesiones_creadas, fila.minutos_consumidos) == (2, 4)
+    assert len(_registros(db, caso.user_id)) == 1
+
+
+def test_usuario_inexistente(db):
+    with pytest.raises(ValueError):
+        sesion_service.registrar_inicio_sesion(999, 1, db)
@@ -0,0 +1,87 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.security import create_access_token
+from app.main import app
+from app.services import versiones_service
+
+
+@pytest.fixture
+def cliente(caso):
+    token = create_access_token(data={"sub": "tests@abogadai.co", "uid": caso.user_id})
+    return TestClient(app, headers={"Authorization": f"Bearer {token}"})
+
+
+def _guardar(db, caso, contenido, origen="generacion"):
+    documento = versiones_service.guardar_documento(db, caso, contenido, origen=origen)
+    db.commit()
+    return documento
+
+
+def test_cada_texto_nuevo_es_la_version_siguiente(db, caso):
+    assert _guardar(db, caso, "Primera").version == 1
+    assert _guardar(db, caso, "Segunda", origen="edicion").version == 2
+
+    # El mismo texto no crea otra versión
+    assert _guardar(db, caso, "Segunda").version == 2
+
+    # Vaciar deja el caso sin documento, pero conserva las versiones y su numeración
+    assert _guardar(db, caso, "") is None
+    assert caso.documento_version is None and caso.documento_generado is None
+    assert _guardar(db, caso, "Tercera").version == 3
+
+    assert [(d.version, d.origen) for d in versiones_service.listar_versiones(db, caso.id)] == [
+        (1, "generacion"), (2, "edicion"), (3, "generacion")
+    ]
+    assert caso.documento_generado == "Tercera"
+
+
+def test_version_nueva_empieza_sin_analisis(db, caso):
+    _guardar(db, caso, "Primera")
+    versiones_service.guardar_analisis(db, caso.id, 1, {"fortaleza": {"puntuacion": 70}})
+    db.commit()
+    db.expire(caso)
+    assert caso.analisis_fortaleza == {"puntuacion": 70}
+
+    _guardar(db, caso, "Segunda")
+    assert caso.analisis_fortaleza is None
+
+
+def test_listado_de_versiones_marca_la_vigente(db, caso, cliente):
+    _guardar(db, caso, "Primera")
+    _guardar(db, caso, "Segunda")
+
+    versiones = cliente.get(f"/casos/{caso.id}/documento/versiones").json()
+
+    assert [(v["version"], v["vigente"]) for v in versiones] == [(1, False), (2, True)]
+    assert "contenido" not in versiones[0]
+
+
+def test_diff_exige_documento_desbloqueado(db, caso, cliente):
+    _guardar(db, caso, "Primera")
+
+    assert cliente.get(f"/casos/{caso.id}/documento/diff", params={"desde": 1}).status_code == 403
+
+
+def test_diff_contra_la_vigente_y_entre_versiones(db, caso, cliente):
+    _guardar(db, caso, "HECHOS\nLa EPS negó la cita.\nPRETENSIONES")
+    _guardar(db, caso, "HECHOS\nLa EPS negó la cita el 3 de marzo.\nPRETENSIONES")
+    _guardar(db, caso, "HECHOS\nLa EPS negó la cita el 3 de marzo.\nPRETENSIONES\nPRUEBAS")
+    caso.documento_desbloqueado = True
+    db.commit()
+
+    cuerpo = cliente.get(f"/casos/{caso.id}/documento/diff", params={"desde": 1}).json()
+    assert (cuerpo["desde"], cuerpo["hasta"], cuerpo["sin_cambios"]) == (1, 3, False)
+    assert cuerpo["diff"].splitlines()[:2] == ["--- v1", "+++ v3"]
+    assert "-La EPS negó la cita." in cuerpo["diff"]
+    assert "+La EPS negó la cita el 3 de marzo." in cuerpo["diff"]
+    assert "+PRUEBAS" in cuerpo["diff"]
+
+    cuerpo = cliente.get(f"/casos/{caso.id}/documento/diff", params={"desde": 2, "hasta": 3}).json()
+    assert "-La EPS" not in cuerpo["diff"] and "+PRUEBAS" in cuerpo["diff"]
+
+    cuerpo = cliente.get(f"/casos/{caso.id}/documento/diff", params={"desde": 3}).json()
+    assert cuerpo["sin_cambios"] and cuerpo["diff"] == ""
+
+    assert cliente.get(f"/casos/{caso.id}/documento/diff", params={"desde": 9}).status_code == 404
+